@@ -28,6 +28,10 @@
 
 typedef jack_default_audio_sample_t sample_t;
 
+/* encoders and recorders are woken once this much input has built up, being
+ * the smallest block most of the encoders will take */
+static const size_t wake_bytes = 1024 * sizeof (sample_t);
+
 static struct audio_feed *audio_feed;
 
 int audio_feed_process_audio(jack_nframes_t n_frames, void *arg)
@@ -56,11 +60,14 @@ int audio_feed_process_audio(jack_nframes_t n_frames, void *arg)
                     
                 jack_ringbuffer_write(e->input_rb[0], (char *)input_port_buffer[0], n_frames * sizeof (sample_t));
                 jack_ringbuffer_write(e->input_rb[1], (char *)input_port_buffer[1], n_frames * sizeof (sample_t));
+                if (jack_ringbuffer_read_space(e->input_rb[1]) >= wake_bytes)
+                    wakeup_post_rt(&e->wakeup);
                 break;
             case JD_FLUSH:
                 jack_ringbuffer_reset(e->input_rb[0]);
                 jack_ringbuffer_reset(e->input_rb[1]);
                 e->jack_dataflow_control = JD_OFF;
+                wakeup_post_rt(&e->state_wakeup);
                 break;
             default:
                 fprintf(stderr, "jack_process_callback: unhandled jack_dataflow_control parameter\n");
@@ -80,11 +87,14 @@ int audio_feed_process_audio(jack_nframes_t n_frames, void *arg)
 
                 jack_ringbuffer_write(r->input_rb[0], (char *)input_port_buffer[0], n_frames * sizeof (sample_t));
                 jack_ringbuffer_write(r->input_rb[1], (char *)input_port_buffer[1], n_frames * sizeof (sample_t));
+                if (jack_ringbuffer_read_space(r->input_rb[1]) >= wake_bytes)
+                    wakeup_post_rt(&r->wakeup);
                 break;
             case JD_FLUSH:
                 jack_ringbuffer_reset(r->input_rb[0]);
                 jack_ringbuffer_reset(r->input_rb[1]);
                 r->jack_dataflow_control = JD_OFF;
+                wakeup_post_rt(&r->wakeup);
                 break;
             default:
                 fprintf(stderr, "jack_process_callback: unhandled jack_dataflow_control parameter\n");
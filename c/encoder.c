@@ -46,6 +46,9 @@
 
 typedef jack_default_audio_sample_t sample_t;
 
+/* how long the encoder thread sleeps waiting for input before checking anyway */
+#define ENCODER_IDLE_MS 100
+
 static const size_t rb_n_samples = 53000;       /* maximum number of samples to hold in the ring buffer */
 static uint32_t encoder_packet_magic_number = 'I' << 24 | 'D' << 16 | 'J' << 8 | 'C';
 static const float fade_floor = 0.0003f;
@@ -143,12 +146,10 @@ static int encoder_get_resample_mode(char *rm_string)
 
 static void encoder_free_input_ringbuffers(struct encoder *self)
     {
-    struct timespec ms10 = { 0, 10000000 };
-    
     if (self->jack_dataflow_control == JD_ON)
         self->jack_dataflow_control = JD_FLUSH;
     while (self->jack_dataflow_control != JD_OFF)
-        nanosleep(&ms10, NULL);
+        wakeup_wait(&self->state_wakeup, 100);
     
     if (self->input_rb[0])
         jack_ringbuffer_free(self->input_rb[0]);
@@ -171,13 +172,12 @@ static void encoder_free_resampler(struct encoder *self)
 
 static void encoder_plugin_terminate(struct encoder *self)
     {
-    struct timespec ms10 = { 0, 10000000 };
-        
     self->run_request_f = FALSE;
+    wakeup_post(&self->wakeup);
     if (self->encoder_state != ES_STOPPED)
         fprintf(stderr, "encoder_plugin_terminate: waiting for encoder to finish\n");
     while (self->encoder_state != ES_STOPPED)
-        nanosleep(&ms10, NULL);
+        wakeup_wait(&self->state_wakeup, 100);
     }
 
 static void encoder_unlink(struct encoder *self)
@@ -364,115 +364,229 @@ void encoder_ip_data_free(struct encoder_ip_data *id)
     free(id);
     }
 
-/* note encoder.mutex must be locked before helper threads can safely traverse 
-    encoder.output_chain to find the op structure to pass to this function */
-size_t encoder_write_packet(struct encoder_op *op, struct encoder_op_packet *packet)
+/* a packet written once by the encoder and read by reference by every client */
+struct encoder_shared_packet
     {
-    size_t packet_size, written;
-     
-    packet->header.magic = encoder_packet_magic_number;
-    packet->header.serial = op->encoder->oggserial;
-    packet_size = sizeof packet->header + packet->header.data_size;
-    while (packet_size > jack_ringbuffer_write_space(op->packet_rb))
+    struct encoder_op_packet packet;     /* must come first as clients are handed a pointer to it */
+    struct encoder *encoder;             /* the owner of the pool it goes back to */
+    struct encoder_shared_packet *next;  /* next in the pool */
+    size_t capacity;                     /* space allocated to packet.data */
+    int refs;                            /* clients yet to free it */
+    };
+
+#define ENCODER_POOL_MAX 64
+
+/* take a pool packet and copy packet into it, the encoder mutex is held */
+static struct encoder_shared_packet *shared_packet_new(struct encoder *encoder, struct encoder_op_packet *packet, int refs)
+    {
+    struct encoder_shared_packet *sp;
+    size_t data_size = packet->header.data_size;
+    void *data;
+
+    pthread_mutex_lock(&encoder->pool_mutex);
+    if ((sp = encoder->packet_pool))
+        {
+        encoder->packet_pool = sp->next;
+        encoder->pool_size--;
+        }
+    pthread_mutex_unlock(&encoder->pool_mutex);
+
+    if (!sp && !(sp = calloc(1, sizeof (struct encoder_shared_packet))))
         {
-        if (jack_ringbuffer_read_space(op->packet_rb) == 0)
+        fprintf(stderr, "shared_packet_new: malloc failure\n");
+        return NULL;
+        }
+    if (data_size > sp->capacity)
+        {
+        if (!(data = realloc(sp->packet.data, data_size)))
             {
-            fprintf(stderr, "encoder_write_packet: packet too big to fit in the ringbuffer\n");
-            return 0;
+            fprintf(stderr, "shared_packet_new: malloc failure for data buffer\n");
+            free(sp->packet.data);
+            free(sp);
+            return NULL;
             }
-        encoder_client_free_packet(encoder_client_get_packet(op)); /* flush stale packets */
-        op->performance_warning_indicator = PW_AUDIO_DATA_DROPPED;
+        sp->packet.data = data;
+        sp->capacity = data_size;
+        }
+    sp->packet.header = packet->header;
+    if (data_size)
+        memcpy(sp->packet.data, packet->data, data_size);
+    sp->encoder = encoder;
+    sp->refs = refs;
+    return sp;
+    }
+
+/* drop one reference, the last one returns the packet to the pool */
+static void shared_packet_release(struct encoder_op_packet *packet)
+    {
+    struct encoder_shared_packet *sp = (struct encoder_shared_packet *)packet;
+    struct encoder *encoder = sp->encoder;
+
+    pthread_mutex_lock(&encoder->pool_mutex);
+    if (--sp->refs == 0)
+        {
+        if (encoder->pool_size < ENCODER_POOL_MAX)
+            {
+            sp->next = encoder->packet_pool;
+            encoder->packet_pool = sp;
+            encoder->pool_size++;
+            sp = NULL;
+            }
+        }
+    else
+        sp = NULL;
+    pthread_mutex_unlock(&encoder->pool_mutex);
+
+    if (sp)
+        {
+        free(sp->packet.data);
+        free(sp);
+        }
+    }
+
+/* the queue functions that follow require op.mutex to be locked */
+static struct encoder_op_packet *op_queue_pop(struct encoder_op *op)
+    {
+    struct encoder_op_packet *packet;
+
+    if (op->queue_count == 0)
+        return NULL;
+    packet = op->queue[op->queue_head];
+    op->queue_head = (op->queue_head + 1) % ENCODER_OP_QUEUE_SLOTS;
+    op->queue_count--;
+    op->queue_bytes -= packet->header.data_size;
+    return packet;
+    }
+
+static void op_queue_push(struct encoder_op *op, struct encoder_op_packet *packet)
+    {
+    op->queue[(op->queue_head + op->queue_count++) % ENCODER_OP_QUEUE_SLOTS] = packet;
+    op->queue_bytes += packet->header.data_size;
+    }
+
+static int op_queue_has_room(struct encoder_op *op, size_t data_size)
+    {
+    return op->queue_count < ENCODER_OP_QUEUE_SLOTS && op->queue_bytes + data_size <= ENCODER_OP_BACKLOG_BYTES;
+    }
+
+/* discard queued audio but keep the packets that delimit and describe the stream */
+static void op_queue_skip(struct encoder_op *op)
+    {
+    struct encoder_op_packet *packet;
+    unsigned n = op->queue_count;
+
+    while (n--)
+        {
+        packet = op_queue_pop(op);
+        if (packet->header.flags & (PF_INITIAL | PF_FINAL | PF_HEADER | PF_METADATA))
+            op_queue_push(op, packet);
+        else
+            shared_packet_release(packet);
         }
+    }
+
+/* hand a reference to the client, applying its lag policy if it has fallen behind */
+static void encoder_queue_packet(struct encoder_op *op, struct encoder_op_packet *packet)
+    {
+    struct encoder_op_packet *stale;
+    size_t data_size = packet->header.data_size;
+
     pthread_mutex_lock(&op->mutex);
-    written = jack_ringbuffer_write(op->packet_rb, (char *)&packet->header, sizeof packet->header);
-    written += jack_ringbuffer_write(op->packet_rb, (char *)packet->data, packet->header.data_size);
+    if (!op->overrun && !op_queue_has_room(op, data_size))
+        {
+        op->performance_warning_indicator = PW_AUDIO_DATA_DROPPED;
+        switch (op->lag_policy)
+            {
+            case ENCODER_LAG_DISCONNECT:
+                fprintf(stderr, "encoder_queue_packet: client of encoder %d fell behind, dropping it\n", op->encoder->numeric_id);
+                op->overrun = TRUE;
+                while ((stale = op_queue_pop(op)))
+                    shared_packet_release(stale);
+                break;
+            case ENCODER_LAG_SKIP:
+                op_queue_skip(op);
+                /* fall through */
+            case ENCODER_LAG_DROP:
+                while (!op_queue_has_room(op, data_size) && (stale = op_queue_pop(op)))
+                    shared_packet_release(stale); /* flush stale packets */
+            }
+        }
+    if (op->overrun)
+        shared_packet_release(packet);
+    else
+        op_queue_push(op, packet);
     pthread_mutex_unlock(&op->mutex);
-    return written;
+    if (op->client_wakeup)
+        wakeup_post(op->client_wakeup);
     }
-    
+
+/* the packet data is copied once and shared by all the clients */
 void encoder_write_packet_all(struct encoder *encoder, struct encoder_op_packet *packet)
     {
+    struct encoder_shared_packet *sp;
     struct encoder_op *iter;
-    struct timespec ms10 = { 0, 10000000 };
     
-    while (pthread_mutex_trylock(&encoder->mutex))
-        nanosleep(&ms10, NULL);
-    for (iter = encoder->output_chain; iter; iter = iter->next)
-        encoder_write_packet(iter, packet);
+    packet->header.magic = encoder_packet_magic_number;
+    packet->header.serial = encoder->oggserial;
+    if (packet->header.data_size > ENCODER_OP_BACKLOG_BYTES)
+        {
+        fprintf(stderr, "encoder_write_packet_all: packet too big to queue\n");
+        return;
+        }
+    pthread_mutex_lock(&encoder->mutex);
+    if (encoder->client_count && (sp = shared_packet_new(encoder, packet, encoder->client_count)))
+        for (iter = encoder->output_chain; iter; iter = iter->next)
+            encoder_queue_packet(iter, &sp->packet);
     pthread_mutex_unlock(&encoder->mutex);
     }
 
+/* the packet returned is shared with other clients so its data must not be modified */
 struct encoder_op_packet *encoder_client_get_packet(struct encoder_op *op)
     {
     struct encoder_op_packet *packet;
     
     pthread_mutex_lock(&op->mutex);
-    if (jack_ringbuffer_read_space(op->packet_rb) >= sizeof (struct encoder_op_packet_header))
-        {
-        if (!(packet = calloc(1, sizeof (struct encoder_op_packet))))
-            {
-            fprintf(stderr, "encoder_client_get_packet: malloc failure\n");
-            goto unlock;
-            }
-        jack_ringbuffer_read(op->packet_rb, (char *)packet, sizeof (struct encoder_op_packet_header));
-        if (packet->header.magic != encoder_packet_magic_number)
-            {
-            fprintf(stderr, "encoder_client_get_packet: magic number missing\n");
-            free(packet);
-            goto unlock;
-            }
-        if (jack_ringbuffer_read_space(op->packet_rb) < packet->header.data_size)
-            {
-            fprintf(stderr, "encoder_client_get_packet: packet header specifying more data than can fit in the buffer\n");
-            free(packet);
-            goto unlock;
-            }   
-        if (packet->header.data_size)
-            {
-            if (!(packet->data = malloc(packet->header.data_size)))
-                {
-                fprintf(stderr, "encoder_client_get_packet: malloc failure for data buffer\n");
-                free(packet);
-                goto unlock;
-                }
-            jack_ringbuffer_read(op->packet_rb, packet->data, packet->header.data_size);
-            }
-        pthread_mutex_unlock(&op->mutex);
-        return packet;
-        }
-    unlock:
+    packet = op_queue_pop(op);
     pthread_mutex_unlock(&op->mutex);
-    return NULL;
+    return packet;
     }
     
 void encoder_client_free_packet(struct encoder_op_packet *packet)
     {
-    if (packet->data)
-        free(packet->data);
-    free(packet);
+    shared_packet_release(packet);
+    }
+
+/* true when the client fell behind and its lag policy is ENCODER_LAG_DISCONNECT */
+int encoder_client_overrun(struct encoder_op *op)
+    {
+    int overrun;
+
+    pthread_mutex_lock(&op->mutex);
+    overrun = op->overrun;
+    pthread_mutex_unlock(&op->mutex);
+    return overrun;
     }
 
 int encoder_client_set_flush(struct encoder_op *op)
     {
     struct encoder *encoder = op->encoder;
-    struct timespec ns1 = { 0, 1 };
     int serial;
     
-    while (pthread_mutex_trylock(&encoder->flush_mutex))
-        nanosleep(&ns1, NULL);
+    pthread_mutex_lock(&encoder->flush_mutex);
     serial = encoder->oggserial;
     encoder->flush = TRUE;
     pthread_mutex_unlock(&encoder->flush_mutex);
+    wakeup_post(&encoder->wakeup);
     return serial;
     }
 
 /* this is called from a recipient thread to obtain a handle for getting data */ 
-/* the numeric_id is the encoder that is requested */
-struct encoder_op *encoder_register_client(struct threads_info *ti, int numeric_id)
+/* the numeric_id is the encoder that is requested, client_wakeup is posted on each new packet */
+/* lag_policy says what happens to the queue of packets when the client falls behind */
+struct encoder_op *encoder_register_client(struct threads_info *ti, int numeric_id, struct wakeup *client_wakeup, enum encoder_lag_policy lag_policy)
     {
     struct encoder *enc;
     struct encoder_op *op;
-    struct timespec ms10 = { 0, 10000000 };
     
     if (numeric_id >= ti->n_encoders || numeric_id < 0)
         {
@@ -484,17 +598,12 @@ struct encoder_op *encoder_register_client(struct threads_info *ti, int numeric_
         fprintf(stderr, "encoder_register_client: malloc failure\n");
         return NULL;
         }
-    if (!(op->packet_rb = jack_ringbuffer_create(65536)))
-        {
-        fprintf(stderr, "encoder_register_client: malloc failure\n");
-        free(op);
-        return NULL;
-        }
     enc = ti->encoder[numeric_id];
     op->encoder = enc;
+    op->client_wakeup = client_wakeup;
+    op->lag_policy = lag_policy;
     pthread_mutex_init(&op->mutex, NULL);
-    while (pthread_mutex_trylock(&op->encoder->mutex))
-        nanosleep(&ms10, NULL);
+    pthread_mutex_lock(&op->encoder->mutex);
     op->next = enc->output_chain;
     enc->output_chain = op;
     enc->client_count++;
@@ -505,11 +614,10 @@ struct encoder_op *encoder_register_client(struct threads_info *ti, int numeric_
 void encoder_unregister_client(struct encoder_op *op)
     {
     struct encoder_op *iter;
-    struct timespec ms10 = { 0, 10000000 };      /* ten milliseconds */
+    struct encoder_op_packet *packet;
     
     fprintf(stderr, "encoder_unregister_client called\n");
-    while (pthread_mutex_trylock(&op->encoder->mutex))
-        nanosleep(&ms10, NULL);
+    pthread_mutex_lock(&op->encoder->mutex);
     if ((iter = op->encoder->output_chain) == op)
         op->encoder->output_chain = op->next;
     else
@@ -520,22 +628,35 @@ void encoder_unregister_client(struct encoder_op *op)
         }
     op->encoder->client_count--;
     pthread_mutex_unlock(&op->encoder->mutex);
+    while ((packet = op_queue_pop(op)))
+        shared_packet_release(packet);
     pthread_mutex_destroy(&op->mutex);
-    jack_ringbuffer_free(op->packet_rb);
     free(op);
     fprintf(stderr, "encoder_unregister_client finished\n");
     }
 
+/* encoder_input_space: how much input awaits the encoder, for telling if it made progress */
+static size_t encoder_input_space(struct encoder *self)
+    {
+    if (self->encoder_state == ES_STOPPED || !self->input_rb[1])
+        return 0;
+    return jack_ringbuffer_read_space(self->input_rb[1]);
+    }
+
 void *encoder_main(void *args)
     {
     struct encoder *self = args;
-    struct timespec ms10 = { 0, 10000000 };      /* ten milliseconds */
+    enum encoder_state state;
+    size_t input_before;
+    int progress;
 
     sig_mask_thread();
     while(!self->thread_terminate_f)
         {
         pthread_mutex_lock(&self->flush_mutex);
-        switch(self->encoder_state)
+        state = self->encoder_state;
+        input_before = encoder_input_space(self);
+        switch(state)
             {
             case ES_STOPPED:
                 break;
@@ -546,8 +667,13 @@ void *encoder_main(void *args)
                 self->run_encoder(self);
                 break;
             }
+        /* the plugins take at most one block at a time so go again while input is being used */
+        progress = self->encoder_state != state || (state != ES_STOPPED && encoder_input_space(self) < input_before);
         pthread_mutex_unlock(&self->flush_mutex);
-        nanosleep(&ms10, NULL);
+        if (self->encoder_state != state)
+            wakeup_post(&self->state_wakeup);
+        if (!progress)
+            wakeup_wait(&self->wakeup, self->encoder_state == ES_STOPPED ? -1 : ENCODER_IDLE_MS);
         }
     return NULL;
     }
@@ -556,7 +682,6 @@ int encoder_start(struct threads_info *ti, struct universal_vars *uv, void *othe
     {
     struct encoder *self = ti->encoder[uv->tab];
     struct encoder_vars *ev = other;
-    struct timespec ms10 = { 0, 10000000 };
     int (*encoder_init)(struct encoder *, struct encoder_vars *) = NULL;
     int i, resample_mode, error;
 
@@ -703,10 +828,9 @@ int encoder_start(struct threads_info *ti, struct universal_vars *uv, void *othe
 
         self->run_request_f = TRUE;
         self->encoder_state = ES_STARTING;
-        while (self->encoder_state == ES_STARTING)
-            nanosleep(&ms10, NULL);
-        while (self->encoder_state == ES_STOPPING)
-            nanosleep(&ms10, NULL);
+        wakeup_post(&self->wakeup);
+        while (self->encoder_state == ES_STARTING || self->encoder_state == ES_STOPPING)
+            wakeup_wait(&self->state_wakeup, 100);
         if (self->encoder_state == ES_STOPPED)
             {
             fprintf(stderr, "encoder_start: encoder failed during initialisation\n");
@@ -849,6 +973,9 @@ struct encoder *encoder_init(struct threads_info *ti, int numeric_id)
     pthread_mutex_init(&self->metadata_mutex, NULL);
     pthread_mutex_init(&self->flush_mutex, NULL);
     pthread_mutex_init(&self->fade_mutex, NULL);
+    pthread_mutex_init(&self->pool_mutex, NULL);
+    wakeup_init(&self->wakeup);
+    wakeup_init(&self->state_wakeup);
     if (pthread_create(&self->thread_h, NULL, encoder_main, self))
         {
         fprintf(stderr, "encoder_init: pthread_create call failed\n");
@@ -860,12 +987,24 @@ struct encoder *encoder_init(struct threads_info *ti, int numeric_id)
 
 void encoder_destroy(struct encoder *self)
     {
+    struct encoder_shared_packet *sp;
+
     self->thread_terminate_f = TRUE;
+    wakeup_post(&self->wakeup);
     pthread_join(self->thread_h, NULL);
+    wakeup_destroy(&self->wakeup);
+    wakeup_destroy(&self->state_wakeup);
     pthread_mutex_destroy(&self->mutex);
     pthread_mutex_destroy(&self->metadata_mutex);
     pthread_mutex_destroy(&self->flush_mutex);
     pthread_mutex_destroy(&self->fade_mutex);
+    pthread_mutex_destroy(&self->pool_mutex);
+    while ((sp = self->packet_pool))
+        {
+        self->packet_pool = sp->next;
+        free(sp->packet.data);
+        free(sp);
+        }
     if (self->rs_input[0])
         free(self->rs_input[0]);
     if (self->rs_input[1])
@@ -26,6 +26,7 @@
 #include <jack/ringbuffer.h>
 #include <pthread.h>
 #include "sourceclient.h"
+#include "wakeup.h"
 
 enum jack_dataflow { JD_OFF, JD_ON, JD_FLUSH };
 enum performance_warning { PW_OK, PW_AUDIO_DATA_DROPPED };
@@ -44,6 +45,10 @@ enum packet_flags {     PF_UNSET    = 0x00,
                                 PF_AAC      = 0x80,
                                 PF_AACP2    = 0x100,
                                 PF_WEBM     = 0x200 };
+enum encoder_lag_policy { ENCODER_LAG_DROP, ENCODER_LAG_SKIP, ENCODER_LAG_DISCONNECT };
+
+#define ENCODER_OP_QUEUE_SLOTS 256      /* most packets a client can fall behind by */
+#define ENCODER_OP_BACKLOG_BYTES 65536  /* most packet data a client can fall behind by */
 
 struct encoder_vars
     {
@@ -109,11 +114,19 @@ struct encoder_op                       /* encoder output object */
     {
     struct encoder *encoder;             /* parent encoder */
     struct encoder_op *next;             /* the next encoder output object */
-    jack_ringbuffer_t *packet_rb;        /* ringbuffer containing ogg or mp3 packets */
-    enum performance_warning performance_warning_indicator; /* indicates ringbuffer overflow condition */
+    struct encoder_op_packet *queue[ENCODER_OP_QUEUE_SLOTS]; /* shared packets not yet taken by the client */
+    unsigned queue_head;                 /* index of the oldest packet in queue */
+    unsigned queue_count;                /* number of packets in queue */
+    size_t queue_bytes;                  /* packet data in queue */
+    enum encoder_lag_policy lag_policy;  /* what to do with the queue when the client falls behind */
+    int overrun;                         /* the client fell behind under ENCODER_LAG_DISCONNECT */
+    enum performance_warning performance_warning_indicator; /* indicates queue overflow condition */
     pthread_mutex_t mutex;               /* this enables the encoder to expire old output packets safely */
+    struct wakeup *client_wakeup;        /* posted when a packet is written */
     };
 
+struct encoder_shared_packet;
+
 struct encoder_header_buffer
     {
     char *data;
@@ -149,7 +162,12 @@ struct encoder
     pthread_mutex_t mutex;/* for blocking encoder_unregister_client while the encoder is writing out data */
     pthread_mutex_t metadata_mutex;      /* used when metadata is read or written */
     pthread_mutex_t fade_mutex;     /* for blocking fade initiate while fade being processed */
-    struct encoder_op *output_chain;     /* one output buffer per client connection */
+    struct wakeup wakeup;           /* posted on new input data and requests to the encoder thread */
+    struct wakeup state_wakeup;     /* posted by the encoder thread on encoder_state changes */
+    struct encoder_op *output_chain;     /* one output queue per client connection */
+    pthread_mutex_t pool_mutex;          /* for the packet pool and packet reference counts */
+    struct encoder_shared_packet *packet_pool;   /* released packets kept for reuse */
+    int pool_size;                       /* number of packets in packet_pool */
     struct encoder_header_buffer *header_buffer; /* point to needed headers or NULL */
     enum performance_warning performance_warning_indicator; /* indicates ringbuffer overflow condition */
     char *custom_meta;           /* when this is set it is used for stream metadata - in the title tag of ogg streams */
@@ -171,9 +189,9 @@ void encoder_destroy(struct encoder *self);
 struct encoder_op_packet *encoder_client_get_packet(struct encoder_op *op);
 void encoder_client_free_packet(struct encoder_op_packet *packet);
 int encoder_client_set_flush(struct encoder_op *op);
-size_t encoder_write_packet(struct encoder_op *op, struct encoder_op_packet *packet);
+int encoder_client_overrun(struct encoder_op *op);
 void encoder_write_packet_all(struct encoder *enc, struct encoder_op_packet *packet);
-struct encoder_op *encoder_register_client(struct threads_info *ti, int numeric_id);
+struct encoder_op *encoder_register_client(struct threads_info *ti, int numeric_id, struct wakeup *client_wakeup, enum encoder_lag_policy lag_policy);
 void encoder_unregister_client(struct encoder_op *op);
 int encoder_start(struct threads_info *ti, struct universal_vars *uv, void *other);
 int encoder_stop(struct threads_info *ti, struct universal_vars *uv, void *other);
@@ -0,0 +1,110 @@
+/*
+#   keymap.c: hashed lookup of string keyed tables
+#   Copyright (C) 2026 Stephen Fairchild (s-fairchild@users.sourceforge.net)
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program in the file entitled COPYING.
+#   If not, see <http://www.gnu.org/licenses/>.
+*/
+
+#include <stdlib.h>
+#include <stdio.h>
+#include <stdint.h>
+#include <string.h>
+#include "keymap.h"
+
+struct keymap
+    {
+    size_t mask;
+    size_t key_offset;
+    void **slot;         /* open addressing with linear probing */
+    };
+
+static inline uint32_t keymap_hash(const char *key)
+    {
+    uint32_t h = 2166136261u;    /* FNV-1a */
+
+    while (*key)
+        {
+        h ^= (unsigned char)*key++;
+        h *= 16777619u;
+        }
+    return h;
+    }
+
+static inline const char *keymap_key(const struct keymap *self, void *entry)
+    {
+    return *(const char **)((char *)entry + self->key_offset);
+    }
+
+struct keymap *keymap_new(void *table, size_t stride, size_t key_offset)
+    {
+    struct keymap *self;
+    size_t n = 0, size = 8;
+    const char *key;
+    void *entry;
+
+    for (entry = table; (key = *(const char **)((char *)entry + key_offset)) && *key; entry = (char *)entry + stride)
+        ++n;
+    /* no more than half full keeps the probe sequences short */
+    while (size < n * 2)
+        size <<= 1;
+
+    if (!(self = malloc(sizeof (struct keymap))) || !(self->slot = calloc(size, sizeof (void *))))
+        {
+        fprintf(stderr, "keymap_new: malloc failure\n");
+        free(self);
+        return NULL;
+        }
+    self->mask = size - 1;
+    self->key_offset = key_offset;
+
+    for (entry = table; n--; entry = (char *)entry + stride)
+        {
+        size_t i = keymap_hash(key = keymap_key(self, entry));
+
+        for (;; ++i)
+            {
+            void **slot = &self->slot[i & self->mask];
+
+            if (!*slot)
+                {
+                *slot = entry;
+                break;
+                }
+            if (!strcmp(keymap_key(self, *slot), key))
+                break;
+            }
+        }
+
+    return self;
+    }
+
+void *keymap_lookup(const struct keymap *self, const char *key)
+    {
+    void *entry;
+
+    for (size_t i = keymap_hash(key); (entry = self->slot[i & self->mask]); ++i)
+        if (!strcmp(keymap_key(self, entry), key))
+            return entry;
+    return NULL;
+    }
+
+void keymap_free(struct keymap *self)
+    {
+    if (self)
+        {
+        free(self->slot);
+        free(self);
+        }
+    }
@@ -0,0 +1,38 @@
+/*
+#   keymap.h: hashed lookup of string keyed tables
+#   Copyright (C) 2026 Stephen Fairchild (s-fairchild@users.sourceforge.net)
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program in the file entitled COPYING.
+#   If not, see <http://www.gnu.org/licenses/>.
+*/
+
+#ifndef KEYMAP_H
+#define KEYMAP_H
+
+#include <stddef.h>
+
+struct keymap;
+
+/* keymap_new: index an array of structures that each hold a string key
+ * the table ends at the first entry whose key is NULL or empty
+ * where keys are repeated the first one is found, as with a linear search
+ * return value: NULL on failure */
+struct keymap *keymap_new(void *table, size_t stride, size_t key_offset);
+
+/* keymap_lookup: the table entry matching key or NULL */
+void *keymap_lookup(const struct keymap *self, const char *key);
+
+void keymap_free(struct keymap *self);
+
+#endif /* KEYMAP_H */
@@ -0,0 +1,166 @@
+/*
+#   kvpbench.c: command parsing throughput, linear search versus keymap
+#   Copyright (C) 2026 Stephen Fairchild (s-fairchild@users.sourceforge.net)
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program in the file entitled COPYING.
+#   If not, see <http://www.gnu.org/licenses/>.
+*/
+
+/* Build with "make kvpbench" in this directory. The message mix is the
+ * steady state traffic of the user interface with the line protocol meters. */
+
+#include "gnusource.h"
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <stddef.h>
+#include <time.h>
+#include "kvpdict.h"
+#include "bsdcompat.h"
+
+/* the mixer kvp keys */
+static char *keys[] = { "PLRP", "RGDB", "SEEK", "SIZE", "PLPL", "LOOP", "MIXR",
+    "COMP", "GATE", "MICS", "INDX", "NMIC", "MIC", "MIDI", "AUDL", "AUDR", "STRL",
+    "STRR", "DOL", "DOR", "DIL", "DIR", "VOL2", "FADE", "OGGP", "SPXP", "SNDP",
+    "AVFP", "SPXT", "SPXC", "RSQT", "AGCP", "HEAD", "FLAG", "CMOD", "JFIL", "JPRT",
+    "JPT2", "EFCT", "VPAN", "ACTN", "session_event", "session_command", "" };
+
+/* the mixer actions in the order they used to be tested */
+static char *actions[] = { "ping", "mp3_getstatus", "jackportread",
+    "freewheel_toggle", "freewheel_on", "freewheel_off", "jackconnect",
+    "jackdisconnect", "session_reply", "playeffect", "stopeffect", "mic_control",
+    "new_channel_mode_string", "headroom", "anymic", "fademode_left",
+    "fademode_right", "fademode_interlude", "playleft", "playright",
+    "playinterlude", "playnoflushleft", "playnoflushright",
+    "playnoflushinterlude", "stopleft", "stopright", "stopjingles",
+    "stopinterlude", "dither", "dontdither", "resamplequality", "ogginforequest",
+    "sndfileinforequest", "speexreadtagrequest", "speexwritetagrequest",
+    "voippan", "mixstats", "meterchannel", "requestaux", "requestlevels", "" };
+
+static const char messages[] =
+    "ACTN=requestlevels\nend\n"
+    "ACTN=requestlevels\nend\n"
+    "ACTN=requestlevels\nend\n"
+    "ACTN=requestlevels\nend\n"
+    "ACTN=requestlevels\nend\n"
+    "MIXR=:100:100:050:100:000:100:000:100:000:0:11111:00:0000:0:0:0:0:0:1.0:1.0:0:0.5:0:0:0:1:1:1:0.5:100:1.0:\nACTN=mixstats\nend\n"
+    "ACTN=requestaux\nend\n"
+    "FLAG=1\nACTN=anymic\nend\n";
+
+#define N_KEYS (sizeof keys / sizeof keys[0])
+#define N_ACTIONS (sizeof actions / sizeof actions[0])
+
+struct action
+    {
+    char *name;
+    int n;
+    };
+
+static char *values[N_KEYS];
+static struct kvpdict dict[N_KEYS];
+static struct action table[N_ACTIONS];
+
+static double now()
+    {
+    struct timespec ts;
+
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return ts.tv_sec + ts.tv_nsec / 1e9;
+    }
+
+static struct kvpdict *linear_dict(char *key)
+    {
+    for (struct kvpdict *dp = dict; dp->target; dp++)
+        if (!strcmp(key, dp->key))
+            return dp;
+    return NULL;
+    }
+
+static struct action *linear_action(char *name)
+    {
+    struct action *a = NULL;
+
+    /* every test was made whether or not one had already matched */
+    for (struct action *ap = table; ap->name[0]; ap++)
+        if (!strcmp(name, ap->name))
+            a = ap;
+    return a;
+    }
+
+static double run(int hashed, int iterations, struct keymap *dict_map, struct keymap *action_map)
+    {
+    char *line = NULL, **action = &values[N_KEYS - 4];
+    size_t n = 0;
+    unsigned long n_messages = 0;
+    double start = now();
+
+    for (int i = 0; i < iterations; ++i)
+        {
+        FILE *fp = fmemopen((void *)messages, sizeof messages - 1, "r");
+
+        while (getline(&line, &n, fp) > 0)
+            {
+            struct kvpdict *dp;
+            struct action *a;
+            char *value;
+
+            if (!strcmp(line, "end\n"))
+                {
+                if ((a = hashed ? keymap_lookup(action_map, *action) : linear_action(*action)))
+                    a->n++;
+                ++n_messages;
+                continue;
+                }
+            value = kvp_extract_value(line);
+            if ((dp = hashed ? keymap_lookup(dict_map, line) : linear_dict(line)))
+                {
+                free(*dp->target);
+                *dp->target = value;
+                }
+            else
+                free(value);
+            }
+        fclose(fp);
+        }
+
+    free(line);
+    return n_messages / (now() - start);
+    }
+
+int main(int argc, char **argv)
+    {
+    int iterations = argc > 1 ? atoi(argv[1]) : 200000;
+    struct keymap *dict_map, *action_map;
+
+    for (size_t i = 0; i < N_KEYS; ++i)
+        dict[i] = (struct kvpdict){ keys[i], keys[i][0] ? &values[i] : NULL, NULL };
+    for (size_t i = 0; i < N_ACTIONS; ++i)
+        table[i] = (struct action){ actions[i], 0 };
+
+    if (!(dict_map = kvp_index_dict(dict)) ||
+            !(action_map = keymap_new(table, sizeof (struct action), offsetof(struct action, name))))
+        return 5;
+
+    for (int pass = 0; pass < 2; ++pass)
+        {
+        printf("linear:  %.0f messages/s\n", run(0, iterations, dict_map, action_map));
+        printf("hashed:  %.0f messages/s\n", run(1, iterations, dict_map, action_map));
+        }
+
+    keymap_free(dict_map);
+    keymap_free(action_map);
+    for (size_t i = 0; i < N_KEYS; ++i)
+        free(values[i]);
+    return 0;
+    }
@@ -21,6 +21,7 @@
 #include <stdlib.h>
 #include <stdio.h>
 #include <string.h>
+#include <stddef.h>
 #include <assert.h>
 #include "kvpdict.h"
 #include "bsdcompat.h"
@@ -45,46 +46,49 @@ char *kvp_extract_value(char *pair)
     return value;
     }
 
+/* kvp_index_dict: a hashed index of the dictionary for use with kvp_apply_to_dict */
+struct keymap *kvp_index_dict(struct kvpdict *dp)
+    {
+    return keymap_new(dp, sizeof (struct kvpdict), offsetof(struct kvpdict, key));
+    }
+
 /* dict_apply_to_target: sets a pointers object listed in a kvpdict to point to target when its key matches the one supplied to the function.  Target is not made a member of the dictionary, but rather one of the dictionary members, which is itself a pointer is set to point to target.  The memory used by the old target is freed */
-int kvp_apply_to_dict(struct kvpdict *dp, char *key, char *target)
+int kvp_apply_to_dict(struct keymap *index, char *key, char *target)
     {
+    struct kvpdict *dp;
     int append;
     size_t origtext_siz, newtext_siz;
 
     if ((append = (key[0] == '+')))      /* If key starts with a plus we will not replace -- we will append */
         ++key;
 
-    for (; dp->target; dp++)             /* Iterate over NULL terminated dictionary */
+    if (!(dp = keymap_lookup(index, key)))
+        return 0;                        /* No matches */
+
+    if (dp->pm)                          /* If a pthread mutex is supplied then use it */
+        pthread_mutex_lock(dp->pm);
+    if (!append)
+        {
+        if (*(dp->target))                /* Conditionally free the old target buffer */
+            free(*(dp->target));
+        *(dp->target) = target;           /* Dictionary member's pointer gets a new target */
+        }
+    else
         {
-        if (!strcmp(key, dp->key))        /* If the key matches */
+        /* append mode -- multiple appends separated by a newline character */
+        *(dp->target) = realloc(*(dp->target), (origtext_siz = strlen(*(dp->target))) + (newtext_siz = strlen(target)) + 2);
+        if (!(*(dp->target)))
             {
-            if (dp->pm)                    /* If a pthread mutex is supplied then use it */
-                pthread_mutex_lock(dp->pm);
-            if (!append)
-                {
-                if (*(dp->target))          /* Conditionally free the old target buffer */
-                    free(*(dp->target));
-                *(dp->target) = target;     /* Dictionary member's pointer gets a new target */
-                }
-            else
-                {
-                /* append mode -- multiple appends separated by a newline character */
-                *(dp->target) = realloc(*(dp->target), (origtext_siz = strlen(*(dp->target))) + (newtext_siz = strlen(target)) + 2);
-                if (!(*(dp->target)))
-                    {
-                    fprintf(stderr, "malloc failure\n");
-                    exit(5);
-                    }
-                memcpy(*(dp->target) + origtext_siz, target, newtext_siz);
-                memcpy(*(dp->target) + origtext_siz + newtext_siz, "\n", 2);
-                free(target);
-                }
-            if (dp->pm)                    /* Unlock the pthread mutex if one was specified */
-                pthread_mutex_unlock(dp->pm);
-            return 1;                      /* We have a match so return 1 */
+            fprintf(stderr, "malloc failure\n");
+            exit(5);
             }
+        memcpy(*(dp->target) + origtext_siz, target, newtext_siz);
+        memcpy(*(dp->target) + origtext_siz + newtext_siz, "\n", 2);
+        free(target);
         }
-    return 0;                            /* No matches */
+    if (dp->pm)                          /* Unlock the pthread mutex if one was specified */
+        pthread_mutex_unlock(dp->pm);
+    return 1;                            /* We have a match so return 1 */
     }
 
 void kvp_free_dict(struct kvpdict *dp)
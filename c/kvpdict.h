@@ -20,6 +20,7 @@
 #define KVPDICT_H
 
 #include <pthread.h>
+#include "keymap.h"
 
 struct kvpdict
     {
@@ -30,7 +31,8 @@ struct kvpdict
     };
     
 char *kvp_extract_value(char *keyvaluepair);
-int kvp_apply_to_dict(struct kvpdict *kvpdict, char *key, char *newtarget);
+struct keymap *kvp_index_dict(struct kvpdict *kvpdict);
+int kvp_apply_to_dict(struct keymap *index, char *key, char *newtarget);
 void kvp_free_dict(struct kvpdict *dp);
 
 #endif
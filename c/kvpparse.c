@@ -32,7 +32,7 @@ static void kvp_cleanup()
         free(buffer);
     }
 
-int kvp_parse(struct kvpdict *kvpdict, FILE *fp)
+int kvp_parse(struct keymap *index, FILE *fp)
     {
     static size_t n = 5000;
     char *value;
@@ -53,7 +53,7 @@ int kvp_parse(struct kvpdict *kvpdict, FILE *fp)
         /* the following function is fed a key value pair e.g. key=value */
         value = kvp_extract_value(buffer); /* key is truncated at the = */
         /* value = a pointer to a copy of the value part after the '=' allocated on the heap */
-        if(!(kvp_apply_to_dict(kvpdict, buffer, value)))
+        if(!(kvp_apply_to_dict(index, buffer, value)))
             fprintf(stderr, "kvp_parse: %s=%s, key missing from dictionary\n", buffer, value);
         /* assuming the error message wasn't printed the associated pointer in the dictionary will have been updated */
         }
@@ -19,4 +19,5 @@
 
 #include "kvpdict.h"
 
-int kvp_parse(struct kvpdict *kvpdict, FILE *fp);
+/* kvp_parse: apply key=value lines up to "end" to the dictionary behind index */
+int kvp_parse(struct keymap *index, FILE *fp);
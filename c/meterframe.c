@@ -0,0 +1,157 @@
+/*
+#   meterframe.c: binary meter data channel to the user interface
+#   Copyright (C) 2026 Stephen Fairchild (s-fairchild@users.sourceforge.net)
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program in the file entitled COPYING.
+#   If not, see <http://www.gnu.org/licenses/>.
+*/
+
+#include "gnusource.h"
+#include <stdlib.h>
+#include <stdio.h>
+#include <string.h>
+#include <errno.h>
+#include <unistd.h>
+#include <fcntl.h>
+#include <limits.h>
+#include <time.h>
+#include "meterframe.h"
+#include "sig.h"
+
+struct meter_publisher
+    {
+    pthread_t thread_h;
+    int thread_exit;
+    int fd;
+    int interval_ms;
+    size_t size;
+    struct meter_frame *frame;
+    meter_fill_fn fill;
+    void *arg;
+    unsigned dropped;
+    };
+
+size_t meter_publisher_size(int n_mics)
+    {
+    return sizeof (struct meter_frame) + n_mics * sizeof (struct meter_mic);
+    }
+
+static void *meter_publisher_main(void *args)
+    {
+    struct meter_publisher *self = args;
+    struct meter_frame *frame = self->frame;
+    struct timespec next;
+    ssize_t rv;
+
+    sig_mask_thread();
+    clock_gettime(CLOCK_MONOTONIC, &next);
+
+    while (!self->thread_exit)
+        {
+        /* Absolute deadlines so the frame rate does not drift. */
+        next.tv_nsec += self->interval_ms * 1000000L;
+        while (next.tv_nsec >= 1000000000L)
+            {
+            next.tv_nsec -= 1000000000L;
+            ++next.tv_sec;
+            }
+        while (clock_nanosleep(CLOCK_MONOTONIC, TIMER_ABSTIME, &next, NULL) == EINTR);
+
+        ++frame->sequence;
+        frame->aux_flags = 0;
+        self->fill(frame, self->arg);
+
+        /* Writes no larger than PIPE_BUF are atomic so a frame is either
+         * delivered whole or not at all. A user interface that is not
+         * keeping up simply misses frames.
+         */
+        if ((rv = write(self->fd, frame, self->size)) < 0)
+            {
+            if (errno == EAGAIN)
+                ++self->dropped;
+            else
+                if (errno != EINTR)
+                    {
+                    perror("meter_publisher_main: write");
+                    break;
+                    }
+            }
+        }
+
+    return NULL;
+    }
+
+struct meter_publisher *meter_publisher_create(const char *pathname,
+                        int n_mics, int interval_ms, meter_fill_fn fill, void *arg)
+    {
+    struct meter_publisher *self;
+
+    if (meter_publisher_size(n_mics) > PIPE_BUF)
+        {
+        fprintf(stderr, "meter_publisher_create: too many mics for an atomic write\n");
+        return NULL;
+        }
+
+    if (!(self = calloc(1, sizeof (struct meter_publisher))))
+        {
+        fprintf(stderr, "meter_publisher_create: malloc failure\n");
+        return NULL;
+        }
+
+    self->size = meter_publisher_size(n_mics);
+    if (!(self->frame = calloc(1, self->size)))
+        {
+        fprintf(stderr, "meter_publisher_create: malloc failure\n");
+        free(self);
+        return NULL;
+        }
+
+    /* The user interface holds the read end open in advance. */
+    if ((self->fd = open(pathname, O_WRONLY | O_NONBLOCK)) < 0)
+        {
+        fprintf(stderr, "meter_publisher_create: failed to open %s: %s\n", pathname, strerror(errno));
+        free(self->frame);
+        free(self);
+        return NULL;
+        }
+
+    self->frame->magic = METER_FRAME_MAGIC;
+    self->frame->version = METER_FRAME_VERSION;
+    self->frame->n_mics = n_mics;
+    self->interval_ms = interval_ms;
+    self->fill = fill;
+    self->arg = arg;
+
+    if (pthread_create(&self->thread_h, NULL, meter_publisher_main, self))
+        {
+        fprintf(stderr, "meter_publisher_create: pthread_create call failed\n");
+        close(self->fd);
+        free(self->frame);
+        free(self);
+        return NULL;
+        }
+
+    return self;
+    }
+
+void meter_publisher_destroy(struct meter_publisher *self)
+    {
+    self->thread_exit = 1;
+    pthread_join(self->thread_h, NULL);
+    close(self->fd);
+    if (self->dropped)
+        fprintf(stderr, "meter_publisher_destroy: %u frames were dropped\n", self->dropped);
+    free(self->frame);
+    free(self);
+    }
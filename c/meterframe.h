@@ -0,0 +1,94 @@
+/*
+#   meterframe.h: binary meter data channel to the user interface
+#   Copyright (C) 2026 Stephen Fairchild (s-fairchild@users.sourceforge.net)
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program in the file entitled COPYING.
+#   If not, see <http://www.gnu.org/licenses/>.
+*/
+
+#ifndef METERFRAME_H
+#define METERFRAME_H
+
+#include <stdint.h>
+#include <pthread.h>
+
+/* The frame layout is mirrored in python/maingui.py (MeterFrameReader).
+ * Every field is four bytes wide so there is no padding and the frame
+ * can be unpacked in native byte order by the user interface.
+ */
+#define METER_FRAME_MAGIC 0x5254454D       /* "METR" little endian */
+#define METER_FRAME_VERSION 1
+
+/* Indices into the player array of the frame. */
+enum { METER_LEFT, METER_RIGHT, METER_INTERLUDE, METER_JINGLES, METER_PLAYERS };
+
+/* Bits of aux_flags: text data is waiting to be fetched with ACTN=requestaux. */
+#define METER_AUX_MIDI 0x1
+#define METER_AUX_SESSION 0x2
+#define METER_AUX_METADATA 0x4
+
+struct meter_player
+    {
+    int32_t elapsed;
+    int32_t playing;
+    int32_t signal;
+    int32_t cid;
+    int32_t audio_runout;
+    float silence;
+    };
+
+struct meter_mic
+    {
+    int32_t peak;
+    int32_t red;
+    int32_t yellow;
+    int32_t green;
+    };
+
+struct meter_frame
+    {
+    uint32_t magic;
+    uint16_t version;
+    uint16_t n_mics;
+    uint32_t sequence;
+    uint32_t aux_flags;
+    int32_t str_l_peak;
+    int32_t str_r_peak;
+    int32_t str_l_rms;
+    int32_t str_r_rms;
+    uint32_t port_connection_count;    /* cumulative -- compare with last */
+    int32_t effects_playing;           /* bitmask -- always reported */
+    int32_t freewheel_mode;
+    struct meter_player player[METER_PLAYERS];
+    struct meter_mic mic[];            /* n_mics entries */
+    };
+
+struct meter_publisher;
+
+/* Called from the publisher thread to fill in everything after the header. */
+typedef void (*meter_fill_fn)(struct meter_frame *frame, void *arg);
+
+/* meter_publisher_create: opens the fifo for non-blocking writes and starts
+ * a thread that pushes a frame every interval_ms milliseconds
+ * return value: NULL on failure */
+struct meter_publisher *meter_publisher_create(const char *pathname,
+                        int n_mics, int interval_ms, meter_fill_fn fill, void *arg);
+
+/* meter_publisher_destroy: stops the thread and closes the fifo */
+void meter_publisher_destroy(struct meter_publisher *self);
+
+/* meter_publisher_size: the size in bytes of each frame */
+size_t meter_publisher_size(int n_mics);
+
+#endif /* METERFRAME_H */
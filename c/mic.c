@@ -236,6 +236,15 @@ void mic_stats_all(struct mic **mics)
         mic_stats(*mics++);
     }
 
+void mic_meter_all(struct mic **mics, struct meter_mic *mm)
+    {
+    for (; *mics; ++mics, ++mm)
+        {
+        agc_get_meter_levels((*mics)->host->agc, &mm->red, &mm->yellow, &mm->green);
+        mm->peak = mic_getpeak(*mics);
+        }
+    }
+
 static void mic_set_role(struct mic *self, int role)
     {
     if (role == 'm')
@@ -19,6 +19,7 @@
 
 #include <jack/jack.h>
 #include "agc.h"
+#include "meterframe.h"
 
 struct mic
     {
@@ -92,6 +93,7 @@ struct mic
 void mic_process_start_all(struct mic **mics, jack_nframes_t nframes);
 float mic_process_all(struct mic **mics);
 void mic_stats_all(struct mic **mics);
+void mic_meter_all(struct mic **mics, struct meter_mic *mm);
 struct mic **mic_init_all(int n_mics, jack_client_t *client);
 void mic_free_all(struct mic **self);
 void mic_valueparse(struct mic *s, char *param);
@@ -31,6 +31,7 @@
 #include <jack/session.h>
 #include <getopt.h>
 #include <string.h>
+#include <stddef.h>
 #include <fcntl.h>
 #include <sys/types.h>
 #include <sys/stat.h>
@@ -50,6 +51,7 @@
 #include "mic.h"
 #include "bsdcompat.h"
 #include "peakfilter.h"
+#include "meterframe.h"
 #include "sig.h"
 #include "main.h"
 
@@ -106,6 +108,8 @@ static int using_dsp;
 static struct mic **mics;
 /* peakfilter handles for stream peak */
 static struct peakfilter *str_pf_l, *str_pf_r;
+/* binary meter channel -- NULL when the line protocol is in use */
+static struct meter_publisher *meter_publisher;
 /* counts the number of times port connections have changed */
 static unsigned int port_connection_count;
 /* counts the number of times port connection counts have been reported */
@@ -226,6 +230,8 @@ static struct kvpdict kvpdict[] = {
             { "session_command", &session_commandline, NULL },
             { "", NULL, NULL }};
 
+static struct keymap *kvpindex, *actionindex;
+
 static void custom_jack_port_connect_callback(jack_port_id_t a, jack_port_id_t b, int connect, void *arg)
     {
     ++port_connection_count;
@@ -1105,8 +1111,136 @@ static struct mixer {
     char *sc_client_name;
     } s;
 
+/* make logarithmic values for the peak levels and the rms values */
+static void mixer_stream_levels(int *l_peak, int *r_peak, int *l_rms, int *r_rms)
+    {
+    *l_peak = peak_to_log(peakfilter_read(str_pf_l));
+    *r_peak = peak_to_log(peakfilter_read(str_pf_r));
+    /* set reply values for a totally blank signal */
+    *l_rms = *r_rms = 120;
+    if (str_l_meansqrd)
+        *l_rms = (int) fabs(level2db(sqrt(str_l_meansqrd)));
+    if (str_r_meansqrd)
+        *r_rms = (int) fabs(level2db(sqrt(str_r_meansqrd)));
+    }
+
+/* forward any MIDI commands that have been queued since last time */
+static void mixer_collect_midi()
+    {
+    pthread_mutex_lock(&midi_mutex);
+    s.midi_output[0]= '\0';
+    if (midi_nqueued>0) /* exclude leading `,`, include trailing `\0` */
+        memcpy(s.midi_output, midi_queue+1, midi_nqueued*sizeof(char));
+    midi_queue[0]= '\0';
+    midi_nqueued= 0;
+    pthread_mutex_unlock(&midi_mutex);
+    }
+
+/* pick up a session event and print its particulars if there is one */
+static void mixer_collect_session_command()
+    {
+    jack_session_event_t *session_event;
+
+    if (sig_recent_usr1())
+        s.session_command = "save_L1";
+    else
+        {
+        if (g.session_event_rb && jack_ringbuffer_read_space(g.session_event_rb) >= sizeof session_event)
+            {
+            jack_ringbuffer_read(g.session_event_rb, (char *)&session_event, sizeof session_event);
+            switch (session_event->type) {
+                case JackSessionSave:
+                    s.session_command = "save_JACK";
+                    break;
+                case JackSessionSaveAndQuit:
+                    s.session_command = "saveandquit_JACK";
+                    break;
+                case JackSessionSaveTemplate:
+                    s.session_command = "savetemplate_JACK";
+                }
+
+            fprintf(g.out, "session_event=%p\n"
+                            "session_directory=%s\n"
+                            "session_uuid=%s\n",
+                             session_event,
+                             session_event->session_dir,
+                             session_event->client_uuid);
+            }
+        else
+            s.session_command = "";
+        }
+    }
+
+/* the effects bitmask is also what drives ducking in the audio thread */
+static int mixer_update_effects_active()
+    {
+    int effects = 0;
+
+    for (struct xlplayer **p = plr_j_roster; *p; ++p)
+        effects |= (*p)->id;
+    if (effects == effects_active)
+        return -1;
+    effects_active = effects;
+    return effects;
+    }
+
+/* meter_fill: runs in the meter publisher thread in place of requestlevels */
+static void meter_fill(struct meter_frame *frame, void *arg)
+    {
+    int l_peak, r_peak, l_rms, r_rms;
+
+    mixer_stream_levels(&l_peak, &r_peak, &l_rms, &r_rms);
+    frame->str_l_peak = l_peak;
+    frame->str_r_peak = r_peak;
+    frame->str_l_rms = l_rms;
+    frame->str_r_rms = r_rms;
+    mic_meter_all(mics, frame->mic);
+
+    xlplayer_meter(plr_l, &frame->player[METER_LEFT]);
+    xlplayer_meter(plr_r, &frame->player[METER_RIGHT]);
+    xlplayer_meter(plr_i, &frame->player[METER_INTERLUDE]);
+    /* like the line protocol the last of the jingles players has the final say */
+    for (struct xlplayer **p = plr_j; *p; ++p)
+        xlplayer_meter(*p, &frame->player[METER_JINGLES]);
+
+    mixer_update_effects_active();
+    frame->effects_playing = effects_active;
+    frame->port_connection_count = port_connection_count;
+    frame->freewheel_mode = g.freewheel;
+
+    if (midi_nqueued)
+        frame->aux_flags |= METER_AUX_MIDI;
+    if (sig_pending_usr1() || (g.session_event_rb && jack_ringbuffer_read_space(g.session_event_rb)))
+        frame->aux_flags |= METER_AUX_SESSION;
+    if (xlplayer_metadata_pending_all(players) || xlplayer_metadata_pending_all(plr_j))
+        frame->aux_flags |= METER_AUX_METADATA;
+
+    /* tell the jack mixer it can reset its vu stats now */
+    reset_vu_stats_f = TRUE;
+    }
+
+static void meter_channel_stop()
+    {
+    if (meter_publisher)
+        {
+        meter_publisher_destroy(meter_publisher);
+        meter_publisher = NULL;
+        }
+    }
+
+static void meter_channel_start()
+    {
+    char *pathname = getenv("be2ui_meter");
+    int n_mics = atoi(getenv("mic_qty"));
+
+    meter_channel_stop();
+    if (pathname)
+        meter_publisher = meter_publisher_create(pathname, n_mics, 50, meter_fill, NULL);
+    }
+
 static void mixer_cleanup()
     {
+    meter_channel_stop();
     free(eot_alarm_table);
     free_signallookup_table();
     free_dblookup_table();
@@ -1124,6 +1258,8 @@ static void mixer_cleanup()
         xlplayer_destroy(*p);
     free(plr_j);
     free(plr_j_roster);
+    keymap_free(kvpindex);
+    keymap_free(actionindex);
     }
 
 int mixer_new_buffer_size(jack_nframes_t n_frames)
@@ -1134,6 +1270,8 @@ int mixer_new_buffer_size(jack_nframes_t n_frames)
     return 0;
     }
 
+static void mixer_dispatch_init();
+
 void mixer_init(void)
     {
     sr = jack_get_sample_rate(g.client);
@@ -1224,411 +1362,520 @@ void mixer_init(void)
     mics = mic_init_all(atoi(getenv("mic_qty")), g.client);
         
     jack_set_port_connect_callback(g.client, custom_jack_port_connect_callback, NULL);
+
+    mixer_dispatch_init();
                 
     atexit(mixer_cleanup);
     g.mixer_up = TRUE;
     }
         
-int mixer_main()
+static void action_ping()
     {
-    unsigned int lead, ports_diff;
-    jack_session_event_t *session_event;
-    
-    if (!(kvp_parse(kvpdict, g.in)))
-        {
-        fprintf(stderr, "kvp_parse returned false\n");
-        return FALSE;
-        }
+    fprintf(g.out, "pong\n");
+    fflush(g.out);
+    }
 
-    if (!strcmp(action, "ping"))
-        {
-        fprintf(g.out, "pong\n");
-        fflush(g.out);
-        }
+static void action_mp3_getstatus()
+    {
+    xlplayer_mpg123_status();
+    }
 
-    if (!strcmp(action, "mp3_getstatus"))
-        xlplayer_mpg123_status();
+static void action_jackportread()
+    {
+    jackportread(jackport, jackfilter);
+    }
 
-    if (!strcmp(action, "jackportread"))
-        jackportread(jackport, jackfilter);
-        
-    if (!strcmp(action, "freewheel_toggle"))
-        jack_set_freewheel(g.client, !g.freewheel);
+static void action_freewheel_toggle()
+    {
+    jack_set_freewheel(g.client, !g.freewheel);
+    }
 
-    if (!strcmp(action, "freewheel_on"))
-        jack_set_freewheel(g.client, 1);
+static void action_freewheel_on()
+    {
+    jack_set_freewheel(g.client, 1);
+    }
+
+static void action_freewheel_off()
+    {
+    jack_set_freewheel(g.client, 0);
+    }
 
-    if (!strcmp(action, "freewheel_off"))
-        jack_set_freewheel(g.client, 0);
+static void dis_connect(int (*fn)(jack_client_t *, const char *, const char *))
+    {
+    const char **jackports, **jp;
+    jack_port_t *port;
 
-    void dis_connect(char *str, int (*fn)(jack_client_t *, const char *, const char *))
+    if (strlen(jackport2))
         {
-        const char **jackports, **jp;
-        jack_port_t *port;
-        
-        if (!strcmp(action, str))
+        if ((port = jack_port_by_name(g.client, jackport)))
             {
-            if (strlen(jackport2))
-                {
-                if ((port = jack_port_by_name(g.client, jackport)))
-                    {
-                    if (jack_port_flags(port) & JackPortIsOutput)
-                        fn(g.client, jackport, jackport2);
-	            else
-	                fn(g.client, jackport2, jackport);
-                    }
-                else
-                    fprintf(stderr, "port %s does not exist\n", jackport);
-                }
+            if (jack_port_flags(port) & JackPortIsOutput)
+                fn(g.client, jackport, jackport2);
             else
+                fn(g.client, jackport2, jackport);
+            }
+        else
+            fprintf(stderr, "port %s does not exist\n", jackport);
+        }
+    else
+        {
+        /* do regular expression lookup of ports then disconnect them */
+        if (fn == jack_disconnect)
+            {
+            if ((jackports = jack_get_ports(g.client, jackport, NULL, 0L)))
                 {
-                /* do regular expression lookup of ports then disconnect them */
-                if (!strcmp(str, "jackdisconnect"))
+                for (jp = jackports; *jp; ++jp)
                     {
-                    if ((jackports = jack_get_ports(g.client, jackport, NULL, 0L)))
-                        {
-                        for (jp = jackports; *jp; ++jp)
-                            {
-                            if ((port = jack_port_by_name(g.client, *jp)))
-                                jack_port_disconnect(g.client, port);
-                            else
-                                fprintf(stderr, "port %s does not exist\n", jackport);
-                            }
-
-                        jack_free(jackports);
-                        }
+                    if ((port = jack_port_by_name(g.client, *jp)))
+                        jack_port_disconnect(g.client, port);
+                    else
+                        fprintf(stderr, "port %s does not exist\n", jackport);
                     }
+
+                jack_free(jackports);
                 }
             }
         }
-    dis_connect("jackconnect", jack_connect);
-    dis_connect("jackdisconnect", jack_disconnect);
+    }
 
-    if (!strcmp(action, "session_reply"))
-        {
-        sscanf(session_event_string, "%p", &session_event);
-        session_event->command_line = session_commandline;
-        /* Transfer of ownership of heap allocated string. */
-        session_commandline = NULL;
-        jack_session_reply(g.client, session_event);
-        jack_session_event_free(session_event);
-        /* Unblock the user interface which is waiting on a reply. */
-        fprintf(g.out, "session event handled\n");
-        fflush(g.out);
-        }
+static void action_jackconnect()
+    {
+    dis_connect(jack_connect);
+    }
 
-    if (!strcmp(action, "playeffect"))
-        {
-        int i = atoi(effect_ix);
+static void action_jackdisconnect()
+    {
+    dis_connect(jack_disconnect);
+    }
 
-        xlplayer_play(plr_j[i], playerpathname, 0, 0, atoi(rg_db), i);
-        }
+static void action_session_reply()
+    {
+    jack_session_event_t *session_event;
 
-    if (!strcmp(action, "stopeffect"))
-        {
-        int i = atoi(effect_ix);
-        
-        if (1 << i == plr_j[i]->id)
-            xlplayer_eject(plr_j[i]);
-        }
+    sscanf(session_event_string, "%p", &session_event);
+    session_event->command_line = session_commandline;
+    /* Transfer of ownership of heap allocated string. */
+    session_commandline = NULL;
+    jack_session_reply(g.client, session_event);
+    jack_session_event_free(session_event);
+    /* Unblock the user interface which is waiting on a reply. */
+    fprintf(g.out, "session event handled\n");
+    fflush(g.out);
+    }
 
-    if (!strcmp(action, "mic_control"))
-        {
-        mic_valueparse(mics[atoi(item_index)], mic_param);
-        }
+static void action_playeffect()
+    {
+    int i = atoi(effect_ix);
 
-    if (!strcmp(action, "new_channel_mode_string"))
-        {
-        mic_set_role_all(mics, channel_mode_string);
-        }
+    xlplayer_play(plr_j[i], playerpathname, 0, 0, atoi(rg_db), i);
+    }
 
-    if (!strcmp(action, "headroom"))
-        {
-        headroom_db = strtof(headroom, NULL);
-        }
+static void action_stopeffect()
+    {
+    int i = atoi(effect_ix);
+    
+    if (1 << i == plr_j[i]->id)
+        xlplayer_eject(plr_j[i]);
+    }
 
-    if (!strcmp(action, "anymic"))
-        {
-        mic_on = (flag[0] == '1') ? 1 : 0;
-        }
+static void action_mic_control()
+    {
+    mic_valueparse(mics[atoi(item_index)], mic_param);
+    }
 
-    if (!strcmp(action, "fademode_left"))
-        plr_l->fade_mode = atoi(fade_mode);
-        
-    if (!strcmp(action, "fademode_right"))
-        plr_r->fade_mode = atoi(fade_mode);
+static void action_new_channel_mode_string()
+    {
+    mic_set_role_all(mics, channel_mode_string);
+    }
+
+static void action_headroom()
+    {
+    headroom_db = strtof(headroom, NULL);
+    }
 
-    if (!strcmp(action, "fademode_interlude"))
-        plr_i->fade_mode = atoi(fade_mode);
+static void action_anymic()
+    {
+    mic_on = (flag[0] == '1') ? 1 : 0;
+    }
 
-    if (!strcmp(action, "playleft"))
-        {
-        fprintf(g.out, "context_id=%d\n", xlplayer_play(plr_l, playerpathname, atoi(seek_s), atoi(size), atof(rg_db), 0));
-        fflush(g.out);
-        }
-    if (!strcmp(action, "playright"))
-        {
-        fprintf(g.out, "context_id=%d\n", xlplayer_play(plr_r, playerpathname, atoi(seek_s), atoi(size), atof(rg_db), 0));
-        fflush(g.out);
-        }
-    if (!strcmp(action, "playinterlude"))
-        {
-        fprintf(g.out, "context_id=%d\n", xlplayer_play(plr_i, playerpathname, atoi(seek_s), atoi(size), atof(rg_db), 0));
-        fflush(g.out);
-        }
-    if (!strcmp(action, "playnoflushleft"))
-        {
-        fprintf(g.out, "context_id=%d\n", xlplayer_play_noflush(plr_l, playerpathname, atoi(seek_s), atoi(size), atof(rg_db), 0));
-        fflush(g.out);
-        }
-    if (!strcmp(action, "playnoflushright"))
+static void action_fademode_left()
+    {
+    plr_l->fade_mode = atoi(fade_mode);
+    }
+
+static void action_fademode_right()
+    {
+    plr_r->fade_mode = atoi(fade_mode);
+    }
+
+static void action_fademode_interlude()
+    {
+    plr_i->fade_mode = atoi(fade_mode);
+    }
+
+static void action_playleft()
+    {
+    fprintf(g.out, "context_id=%d\n", xlplayer_play(plr_l, playerpathname, atoi(seek_s), atoi(size), atof(rg_db), 0));
+    fflush(g.out);
+    }
+
+static void action_playright()
+    {
+    fprintf(g.out, "context_id=%d\n", xlplayer_play(plr_r, playerpathname, atoi(seek_s), atoi(size), atof(rg_db), 0));
+    fflush(g.out);
+    }
+
+static void action_playinterlude()
+    {
+    fprintf(g.out, "context_id=%d\n", xlplayer_play(plr_i, playerpathname, atoi(seek_s), atoi(size), atof(rg_db), 0));
+    fflush(g.out);
+    }
+
+static void action_playnoflushleft()
+    {
+    fprintf(g.out, "context_id=%d\n", xlplayer_play_noflush(plr_l, playerpathname, atoi(seek_s), atoi(size), atof(rg_db), 0));
+    fflush(g.out);
+    }
+
+static void action_playnoflushright()
+    {
+    fprintf(g.out, "context_id=%d\n", xlplayer_play_noflush(plr_r, playerpathname, atoi(seek_s), atoi(size), atof(rg_db), 0));
+    fflush(g.out);
+    }
+
+static void action_playnoflushinterlude()
+    {
+    fprintf(g.out, "context_id=%d\n", xlplayer_play_noflush(plr_i, playerpathname, atoi(seek_s), atoi(size), atof(rg_db), 0));
+    fflush(g.out);
+    }
+
+static void action_preloadleft()
+    {
+    xlplayer_preload(plr_l, playerpathname);
+    }
+
+static void action_preloadright()
+    {
+    xlplayer_preload(plr_r, playerpathname);
+    }
+
+static void action_preloadinterlude()
+    {
+    xlplayer_preload(plr_i, playerpathname);
+    }
+
+#if 0
+static void action_playmanyjingles()
+    {
+    fprintf(g.out, "context_id=%d\n", xlplayer_playmany(plr_j, playerplaylist, loop[0]=='1'));
+    fflush(g.out);
+    }
+
+#endif
+static void action_stopleft()
+    {
+    xlplayer_eject(plr_l);
+    }
+
+static void action_stopright()
+    {
+    xlplayer_eject(plr_r);
+    }
+
+static void action_stopjingles()
+    {
+    xlplayer_eject(plr_j[atoi(effect_ix)]);
+    }
+
+static void action_stopinterlude()
+    {
+    xlplayer_eject(plr_i);
+    }
+
+static void action_dither()
+    {
+    xlplayer_dither(plr_l, TRUE);
+    xlplayer_dither(plr_r, TRUE);
+    for (struct xlplayer **p = plr_j; *p; ++p)
+        xlplayer_dither(*p, TRUE);
+    xlplayer_dither(plr_i, TRUE);
+    }
+
+static void action_dontdither()
+    {
+    xlplayer_dither(plr_l, FALSE);
+    xlplayer_dither(plr_r, FALSE);
+    for (struct xlplayer **p = plr_j; *p; ++p)
+        xlplayer_dither(*p, FALSE);
+    xlplayer_dither(plr_i, FALSE);
+    }
+
+static void action_resamplequality()
+    {
+    for (struct xlplayer **p = players; *p; ++p)
+        (*p)->rsqual = resamplequality[0] - '0';
+        
+    for (struct xlplayer **p = plr_j; *p; ++p)
+        (*p)->rsqual = resamplequality[0] - '0';
+    }
+
+static void action_ogginforequest()
+    {
+    if (oggdecode_get_metainfo(oggpathname, &s.artist, &s.title, &s.album, &s.length, &s.replaygain, &s.rgloudness))
         {
-        fprintf(g.out, "context_id=%d\n", xlplayer_play_noflush(plr_r, playerpathname, atoi(seek_s), atoi(size), atof(rg_db), 0));
+        fprintf(g.out, "OIR:ARTIST=%s\nOIR:TITLE=%s\nOIR:ALBUM=%s\nOIR:LENGTH=%f\nOIR:REPLAYGAIN_TRACK_GAIN=%s\nOIR:REPLAYGAIN_REFERENCE_LOUDNESS=%s\nOIR:end\n", s.artist, s.title, s.album, s.length, s.replaygain, s.rgloudness);
         fflush(g.out);
         }
-    if (!strcmp(action, "playnoflushinterlude"))
+    else
         {
-        fprintf(g.out, "context_id=%d\n", xlplayer_play_noflush(plr_i, playerpathname, atoi(seek_s), atoi(size), atof(rg_db), 0));
+        fprintf(g.out, "OIR:NOT VALID\n");
         fflush(g.out);
         }
+    }
 
-#if 0 
-    if (!strcmp(action, "playmanyjingles"))
-        {
-        fprintf(g.out, "context_id=%d\n", xlplayer_playmany(plr_j, playerplaylist, loop[0]=='1'));
-        fflush(g.out);
-        }
-#endif
+static void action_sndfileinforequest()
+    {
+    sndfileinfo(sndfilepathname);
+    }
 
-    if (!strcmp(action, "stopleft"))
-        xlplayer_eject(plr_l);
-    if (!strcmp(action, "stopright"))
-        xlplayer_eject(plr_r);
-    if (!strcmp(action, "stopjingles"))
-        xlplayer_eject(plr_j[atoi(effect_ix)]);
-    if (!strcmp(action, "stopinterlude"))
-        xlplayer_eject(plr_i);
+#ifdef HAVE_SPEEX
+static void action_speexreadtagrequest()
+    {
+    speex_tag_read(speexpathname);
+    }
 
-    if (!strcmp(action, "dither"))
-        {
-        xlplayer_dither(plr_l, TRUE);
-        xlplayer_dither(plr_r, TRUE);
-        for (struct xlplayer **p = plr_j; *p; ++p)
-            xlplayer_dither(*p, TRUE);
-        xlplayer_dither(plr_i, TRUE);
-        }
+static void action_speexwritetagrequest()
+    {
+    speex_tag_write(speexpathname, speexcreatedby, speextaglist);
+    }
 
-    if (!strcmp(action, "dontdither"))
-        {
-        xlplayer_dither(plr_l, FALSE);
-        xlplayer_dither(plr_r, FALSE);
-        for (struct xlplayer **p = plr_j; *p; ++p)
-            xlplayer_dither(*p, FALSE);
-        xlplayer_dither(plr_i, FALSE);
-        }
+#endif
+static void action_voippan()
+    {
+    int voippanval = atoi(voip_pan);
     
-    if (!strcmp(action, "resamplequality"))
+    if (voippanval == -1)
+        voip_pan_f = 0;
+    else
         {
-        for (struct xlplayer **p = players; *p; ++p)
-            (*p)->rsqual = resamplequality[0] - '0';
-            
-        for (struct xlplayer **p = plr_j; *p; ++p)
-            (*p)->rsqual = resamplequality[0] - '0';
+        double x = voippanval * M_PI_2 / 100.0;
+        
+        voip_pan_l = (float)cos(x);
+        voip_pan_r = (float)sin(x);
+        
+        voip_pan_f = 1;
         }
-    
-    if (!strcmp(action, "ogginforequest"))
+    }
+
+static void action_mixstats()
+    {
+    if(sscanf(mixer_string,
+             ":%03d:%03d:%03d:%03d:%03d:%03d:%03d:%03d:%03d:%d:%1d%1d%1d"
+             "%1d%1d:%1d%1d:%1d%1d%1d%1d:%1d:%1d:%1d:%1d:%1d:%f:%f:%1d:%f"
+             ":%d:%d:%d:%1d:%1d:%1d:%f:%03d:%f:",
+             &volume, &volume2, &crossfade, &jinglesvolume1, &jinglesheadroom1,
+             &jinglesvolume2, &jinglesheadroom2 ,&interludevol, &mixbackvol, &jingles_playing,
+             &left_stream, &left_audio, &right_stream, &right_audio, &stream_monitor,
+             &s.new_left_pause, &s.new_right_pause, &s.flush_left, &s.flush_right, &s.flush_jingles, &s.flush_interlude,
+             &simple_mixer, &eot_alarm_set, &mixermode, &s.fadeout_f, &main_play, &(plr_l->newpbspeed), &(plr_r->newpbspeed),
+             &speed_variance, &dj_audio_level, &crosspattern, &s.use_dsp, &s.new_inter_pause,
+             &inter_stream, &inter_audio, &inter_force, &alarm_audio_level, &voipvol, &(plr_i->newpbspeed)) !=39)
         {
-        if (oggdecode_get_metainfo(oggpathname, &s.artist, &s.title, &s.album, &s.length, &s.replaygain, &s.rgloudness))
-            {
-            fprintf(g.out, "OIR:ARTIST=%s\nOIR:TITLE=%s\nOIR:ALBUM=%s\nOIR:LENGTH=%f\nOIR:REPLAYGAIN_TRACK_GAIN=%s\nOIR:REPLAYGAIN_REFERENCE_LOUDNESS=%s\nOIR:end\n", s.artist, s.title, s.album, s.length, s.replaygain, s.rgloudness);
-            fflush(g.out);
-            }
-        else
-            {
-            fprintf(g.out, "OIR:NOT VALID\n");
-            fflush(g.out);
-            }
+        fprintf(stderr, "mixer got bad mixer string\n");
+        return;
         }
-    
-    if (!strcmp(action, "sndfileinforequest"))
-        sndfileinfo(sndfilepathname);
+    eot_alarm_f |= eot_alarm_set;
 
-#ifdef HAVE_SPEEX
-    if (!(strcmp(action, "speexreadtagrequest")))
-        speex_tag_read(speexpathname);
-    if (!(strcmp(action, "speexwritetagrequest")))
-        speex_tag_write(speexpathname, speexcreatedby, speextaglist);
-#endif
+    plr_l->fadeout_f = plr_r->fadeout_f = plr_i->fadeout_f = s.fadeout_f;
+    for (struct xlplayer **p = plr_j; *p; ++p)
+        (*p)->fadeout_f = s.fadeout_f;
+        
+    plr_l->use_sv = plr_r->use_sv = plr_i->use_sv = speed_variance;
 
-    if (!strcmp(action, "voippan"))
+    if (s.use_dsp != using_dsp)
+        using_dsp = s.use_dsp;
+
+    if (s.new_left_pause != plr_l->pause)
         {
-        int voippanval = atoi(voip_pan);
+        if (s.new_left_pause)
+            xlplayer_pause(plr_l);
+        else
+            xlplayer_unpause(plr_l);
+        }
         
-        if (voippanval == -1)
-            voip_pan_f = 0;
+    if (s.new_right_pause != plr_r->pause)
+        {
+        if (s.new_right_pause)
+            xlplayer_pause(plr_r);
         else
-            {
-            double x = voippanval * M_PI_2 / 100.0;
-            
-            voip_pan_l = (float)cos(x);
-            voip_pan_r = (float)sin(x);
-            
-            voip_pan_f = 1;
-            }
+            xlplayer_unpause(plr_r);
         }
 
-    if (!strcmp(action, "mixstats"))
+    if (s.new_inter_pause != plr_i->pause)
         {
-        if(sscanf(mixer_string,
-                 ":%03d:%03d:%03d:%03d:%03d:%03d:%03d:%03d:%03d:%d:%1d%1d%1d"
-                 "%1d%1d:%1d%1d:%1d%1d%1d%1d:%1d:%1d:%1d:%1d:%1d:%f:%f:%1d:%f"
-                 ":%d:%d:%d:%1d:%1d:%1d:%f:%03d:%f:",
-                 &volume, &volume2, &crossfade, &jinglesvolume1, &jinglesheadroom1,
-                 &jinglesvolume2, &jinglesheadroom2 ,&interludevol, &mixbackvol, &jingles_playing,
-                 &left_stream, &left_audio, &right_stream, &right_audio, &stream_monitor,
-                 &s.new_left_pause, &s.new_right_pause, &s.flush_left, &s.flush_right, &s.flush_jingles, &s.flush_interlude,
-                 &simple_mixer, &eot_alarm_set, &mixermode, &s.fadeout_f, &main_play, &(plr_l->newpbspeed), &(plr_r->newpbspeed),
-                 &speed_variance, &dj_audio_level, &crosspattern, &s.use_dsp, &s.new_inter_pause,
-                 &inter_stream, &inter_audio, &inter_force, &alarm_audio_level, &voipvol, &(plr_i->newpbspeed)) !=39)
-            {
-            fprintf(stderr, "mixer got bad mixer string\n");
-            return TRUE;
-            }
-        eot_alarm_f |= eot_alarm_set;
-
-        plr_l->fadeout_f = plr_r->fadeout_f = plr_i->fadeout_f = s.fadeout_f;
-        for (struct xlplayer **p = plr_j; *p; ++p)
-            (*p)->fadeout_f = s.fadeout_f;
-            
-        plr_l->use_sv = plr_r->use_sv = plr_i->use_sv = speed_variance;
+        if (s.new_inter_pause)
+            xlplayer_pause(plr_i);
+        else
+            xlplayer_unpause(plr_i);
+        }
+    }
 
-        if (s.use_dsp != using_dsp)
-            using_dsp = s.use_dsp;
+static void action_meterchannel()
+    {
+    if (flag[0] == '1')
+        meter_channel_start();
+    else
+        meter_channel_stop();
+    fprintf(g.out, "meterchannel=%d\n", meter_publisher != NULL);
+    fflush(g.out);
+    }
 
-        if (s.new_left_pause != plr_l->pause)
-            {
-            if (s.new_left_pause)
-                xlplayer_pause(plr_l);
-            else
-                xlplayer_unpause(plr_l);
-            }
-            
-        if (s.new_right_pause != plr_r->pause)
-            {
-            if (s.new_right_pause)
-                xlplayer_pause(plr_r);
-            else
-                xlplayer_unpause(plr_r);
-            }
+/* the text that the binary meter frames can't carry */
+static void action_requestaux()
+    {
+    mixer_collect_midi();
+    mixer_collect_session_command();
+    xlplayer_stats_metadata_all(players);
+    xlplayer_stats_metadata_all(plr_j);
+
+    fprintf(g.out, "midi=%s\n"
+                   "session_command=%s\n"
+                   "end\n",
+                   s.midi_output,
+                   s.session_command);
+    fflush(g.out);
+    }
 
-        if (s.new_inter_pause != plr_i->pause)
-            {
-            if (s.new_inter_pause)
-                xlplayer_pause(plr_i);
-            else
-                xlplayer_unpause(plr_i);
-            }
-        }
+static void action_requestlevels()
+    {
+    unsigned int lead, ports_diff;
 
-    if (!strcmp(action, "requestlevels"))
+    mixer_stream_levels(&s.str_l_peak_db, &s.str_r_peak_db, &s.str_l_rms_db, &s.str_r_rms_db);
+        
+    /* send the meter and other stats to the main app */
+    mic_stats_all(mics);
+    mixer_collect_midi();
+    mixer_collect_session_command();
+
+    lead = port_connection_count;
+    if (lead - port_reports > UINT_MAX << 1)
+        ports_diff = UINT_MAX - lead + port_reports + 1;    /* handle wrap */
+    else
+        ports_diff = lead - port_reports;
+
+    xlplayer_stats_all(players);
+    xlplayer_stats_all(plr_j);
+
+    int effects = mixer_update_effects_active();  // -1 for no change, UI can skip updating indicators
+
+    fprintf(g.out, 
+                "str_l_peak=%d\nstr_r_peak=%d\n"
+                "str_l_rms=%d\nstr_r_rms=%d\n"
+                "midi=%s\n"
+                "session_command=%s\n"
+                "ports_connections_changed=%d\n"
+                "effects_playing=%d\n"
+                "freewheel_mode=%d\n"
+                "end\n",
+                s.str_l_peak_db, s.str_r_peak_db,
+                s.str_l_rms_db, s.str_r_rms_db,
+                s.midi_output,
+                s.session_command,
+                ports_diff,
+                effects,
+                g.freewheel
+                );
+
+    if (ports_diff)
         {
-        /* make logarithmic values for the peak levels */
-        s.str_l_peak_db = peak_to_log(peakfilter_read(str_pf_l));
-        s.str_r_peak_db = peak_to_log(peakfilter_read(str_pf_r));
-        /* set reply values for a totally blank signal */
-        s.str_l_rms_db = s.str_r_rms_db = 120;
-        /* compute the rms values */
-        if (str_l_meansqrd)
-            s.str_l_rms_db = (int) fabs(level2db(sqrt(str_l_meansqrd)));
-        if (str_r_meansqrd)
-            s.str_r_rms_db = (int) fabs(level2db(sqrt(str_r_meansqrd)));
-            
-        /* send the meter and other stats to the main app */
-        mic_stats_all(mics);
-
-        /* forward any MIDI commands that have been queued since last time */
-        pthread_mutex_lock(&midi_mutex);
-        s.midi_output[0]= '\0';
-        if (midi_nqueued>0) /* exclude leading `,`, include trailing `\0` */
-            memcpy(s.midi_output, midi_queue+1, midi_nqueued*sizeof(char));
-        midi_queue[0]= '\0';
-        midi_nqueued= 0;
-        pthread_mutex_unlock(&midi_mutex);
+        port_reports += ports_diff;
+        fprintf(stderr, "%d JACK port connection(s) changed\n", ports_diff);
+        }
+        
+    /* tell the jack mixer it can reset its vu stats now */
+    reset_vu_stats_f = TRUE;
+    fflush(g.out);
+    }
 
-        if (sig_recent_usr1())
-            s.session_command = "save_L1";
-        else
-            {
-            if (g.session_event_rb && jack_ringbuffer_read_space(g.session_event_rb) >= sizeof session_event)
-                {
-                jack_ringbuffer_read(g.session_event_rb, (char *)&session_event, sizeof session_event);
-                switch (session_event->type) {
-                    case JackSessionSave:
-                        s.session_command = "save_JACK";
-                        break;
-                    case JackSessionSaveAndQuit:
-                        s.session_command = "saveandquit_JACK";
-                        break;
-                    case JackSessionSaveTemplate:
-                        s.session_command = "savetemplate_JACK";
-                    }
+/* the actions of the user interface by ACTN value */
+struct mixer_action
+    {
+    char *name;
+    void (*fn)();
+    };
 
-                fprintf(g.out, "session_event=%p\n"
-                                "session_directory=%s\n"
-                                "session_uuid=%s\n",
-                                 session_event,
-                                 session_event->session_dir,
-                                 session_event->client_uuid);
-                }
-            else
-                s.session_command = "";
-            }
+static struct mixer_action actions[] = {
+    { "ping", action_ping },
+    { "mp3_getstatus", action_mp3_getstatus },
+    { "jackportread", action_jackportread },
+    { "freewheel_toggle", action_freewheel_toggle },
+    { "freewheel_on", action_freewheel_on },
+    { "freewheel_off", action_freewheel_off },
+    { "jackconnect", action_jackconnect },
+    { "jackdisconnect", action_jackdisconnect },
+    { "session_reply", action_session_reply },
+    { "playeffect", action_playeffect },
+    { "stopeffect", action_stopeffect },
+    { "mic_control", action_mic_control },
+    { "new_channel_mode_string", action_new_channel_mode_string },
+    { "headroom", action_headroom },
+    { "anymic", action_anymic },
+    { "fademode_left", action_fademode_left },
+    { "fademode_right", action_fademode_right },
+    { "fademode_interlude", action_fademode_interlude },
+    { "playleft", action_playleft },
+    { "playright", action_playright },
+    { "playinterlude", action_playinterlude },
+    { "playnoflushleft", action_playnoflushleft },
+    { "playnoflushright", action_playnoflushright },
+    { "playnoflushinterlude", action_playnoflushinterlude },
+    { "preloadleft", action_preloadleft },
+    { "preloadright", action_preloadright },
+    { "preloadinterlude", action_preloadinterlude },
+#if 0
+    { "playmanyjingles", action_playmanyjingles },
+#endif
+    { "stopleft", action_stopleft },
+    { "stopright", action_stopright },
+    { "stopjingles", action_stopjingles },
+    { "stopinterlude", action_stopinterlude },
+    { "dither", action_dither },
+    { "dontdither", action_dontdither },
+    { "resamplequality", action_resamplequality },
+    { "ogginforequest", action_ogginforequest },
+    { "sndfileinforequest", action_sndfileinforequest },
+#ifdef HAVE_SPEEX
+    { "speexreadtagrequest", action_speexreadtagrequest },
+    { "speexwritetagrequest", action_speexwritetagrequest },
+#endif
+    { "voippan", action_voippan },
+    { "mixstats", action_mixstats },
+    { "meterchannel", action_meterchannel },
+    { "requestaux", action_requestaux },
+    { "requestlevels", action_requestlevels },
+    { NULL, NULL }};
+
+static void mixer_dispatch_init()
+    {
+    if (!(kvpindex = kvp_index_dict(kvpdict)) || !(actionindex = keymap_new(actions, sizeof (struct mixer_action), offsetof(struct mixer_action, name))))
+        {
+        fprintf(stderr, "failed to index the mixer command tables\n");
+        exit(5);
+        }
+    }
 
-        lead = port_connection_count;
-        if (lead - port_reports > UINT_MAX << 1)
-            ports_diff = UINT_MAX - lead + port_reports + 1;    /* handle wrap */
-        else
-            ports_diff = lead - port_reports;
+int mixer_main()
+    {
+    struct mixer_action *a;
 
-        xlplayer_stats_all(players);
-        xlplayer_stats_all(plr_j);
+    if (!(kvp_parse(kvpindex, g.in)))
+        {
+        fprintf(stderr, "kvp_parse returned false\n");
+        return FALSE;
+        }
 
-        int effects = 0;
-        for (struct xlplayer **p = plr_j_roster; *p; ++p)
-            effects |= (*p)->id;
-        if (effects == effects_active)
-            effects = -1;   // -1 for no change, UI can skip updating indicators
-        else
-            effects_active = effects;
-
-        fprintf(g.out, 
-                    "str_l_peak=%d\nstr_r_peak=%d\n"
-                    "str_l_rms=%d\nstr_r_rms=%d\n"
-                    "midi=%s\n"
-                    "session_command=%s\n"
-                    "ports_connections_changed=%d\n"
-                    "effects_playing=%d\n"
-                    "freewheel_mode=%d\n"
-                    "end\n",
-                    s.str_l_peak_db, s.str_r_peak_db,
-                    s.str_l_rms_db, s.str_r_rms_db,
-                    s.midi_output,
-                    s.session_command,
-                    ports_diff,
-                    effects,
-                    g.freewheel
-                    );
+    if ((a = keymap_lookup(actionindex, action)))
+        a->fn();
 
-        if (ports_diff)
-            {
-            port_reports += ports_diff;
-            fprintf(stderr, "%d JACK port connection(s) changed\n", ports_diff);
-            }
-            
-        /* tell the jack mixer it can reset its vu stats now */
-        reset_vu_stats_f = TRUE;
-        fflush(g.out);
-        }
-        
     return TRUE;
     }
@@ -0,0 +1,165 @@
+/*
+#   peakbench.c: stream meter peak filter cost, old window scan versus new
+#   Copyright (C) 2026 Stephen Fairchild (s-fairchild@users.sourceforge.net)
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program in the file entitled COPYING.
+#   If not, see <http://www.gnu.org/licenses/>.
+*/
+
+/* Build with "make peakbench" in this directory. Usage:
+ *     peakbench [window_seconds [period_frames [sample_rate]]]
+ * Each period both stream channels are filtered as in the mixer's process
+ * callback and the meters are read. The two filters must agree. The mixer
+ * uses a window of 115e-6 seconds. */
+
+#include "gnusource.h"
+#include <stdio.h>
+#include <stdlib.h>
+#include <math.h>
+#include <time.h>
+#include "peakfilter.h"
+
+#define PERIODS 20000
+
+/* the previous implementation which scans the whole window every sample */
+struct scanfilter
+    {
+    float *start;
+    float *end;
+    float *ptr;
+    float peak;
+    };
+
+static struct scanfilter *scanfilter_create(float window, int sample_rate)
+    {
+    struct scanfilter *self = malloc(sizeof (struct scanfilter));
+    int n_stages;
+
+    if ((n_stages = (int)(window * sample_rate)) < 1)
+        n_stages = 1;
+    self->ptr = self->start = calloc(n_stages, sizeof (float));
+    self->end = self->start + n_stages;
+    self->peak = 0.0f;
+    return self;
+    }
+
+static void scanfilter_process(struct scanfilter *self, float sample)
+    {
+    float least;
+    float *p;
+
+    *self->ptr++ = fabsf(sample);
+    if (self->ptr == self->end)
+        self->ptr = self->start;
+
+    for (p = self->start, least = HUGE_VALF; p < self->end; p++)
+        if (*p < least)
+            least = *p;
+
+    if (least > self->peak)
+        self->peak = least;
+    }
+
+static void scanfilter_destroy(struct scanfilter *self)
+    {
+    free(self->start);
+    free(self);
+    }
+
+static float scanfilter_read(struct scanfilter *self)
+    {
+    float ret = self->peak;
+
+    self->peak = 0.0f;
+    return ret;
+    }
+
+static double now()
+    {
+    struct timespec ts;
+
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return ts.tv_sec + ts.tv_nsec / 1e9;
+    }
+
+/* programme material stand-in: tones with bursts and silences */
+static void make_signal(float *l, float *r, int n, int sample_rate)
+    {
+    unsigned seed = 1;
+
+    for (int i = 0; i < n; ++i)
+        {
+        float env = (i / (sample_rate / 4)) % 5 == 4 ? 0.0f : 0.5f + 0.5f * sinf(i * 0.0003f);
+
+        seed = seed * 1103515245 + 12345;
+        l[i] = env * sinf(i * 0.0627f) + ((seed >> 16) & 0x7FFF) / 327680.0f - 0.05f;
+        r[i] = env * sinf(i * 0.0411f + 1.0f);
+        }
+    }
+
+int main(int argc, char **argv)
+    {
+    float window = argc > 1 ? atof(argv[1]) : 115e-6f;
+    int nframes = argc > 2 ? atoi(argv[2]) : 256;
+    int sample_rate = argc > 3 ? atoi(argv[3]) : 48000;
+    int n = nframes * PERIODS;
+    float *l = malloc(n * sizeof (float)), *r = malloc(n * sizeof (float));
+    struct scanfilter *sl = scanfilter_create(window, sample_rate);
+    struct scanfilter *sr = scanfilter_create(window, sample_rate);
+    struct peakfilter *dl = peakfilter_create(window, sample_rate);
+    struct peakfilter *dr = peakfilter_create(window, sample_rate);
+    double t, scan_time = 0.0, filter_time = 0.0;
+    long mismatches = 0;
+
+    if (!l || !r || nframes < 1)
+        return 5;
+    make_signal(l, r, n, sample_rate);
+
+    for (int p = 0; p < PERIODS; ++p)
+        {
+        float *lp = l + p * nframes, *rp = r + p * nframes;
+
+        t = now();
+        for (int i = 0; i < nframes; ++i)
+            {
+            scanfilter_process(sl, lp[i]);
+            scanfilter_process(sr, rp[i]);
+            }
+        scan_time += now() - t;
+
+        t = now();
+        for (int i = 0; i < nframes; ++i)
+            {
+            peakfilter_process(dl, lp[i]);
+            peakfilter_process(dr, rp[i]);
+            }
+        filter_time += now() - t;
+
+        if (scanfilter_read(sl) != peakfilter_read(dl) || scanfilter_read(sr) != peakfilter_read(dr))
+            ++mismatches;
+        }
+
+    printf("window %d samples, %d frame periods, stereo\n", (int)(window * sample_rate), nframes);
+    printf("window scan: %8.2f us per period\n", scan_time / PERIODS * 1e6);
+    printf("peakfilter:  %8.2f us per period\n", filter_time / PERIODS * 1e6);
+    printf("meter readings that differ: %ld\n", mismatches);
+
+    scanfilter_destroy(sl);
+    scanfilter_destroy(sr);
+    peakfilter_destroy(dl);
+    peakfilter_destroy(dr);
+    free(l);
+    free(r);
+    return mismatches != 0;
+    }
@@ -39,13 +39,21 @@ struct peakfilter *peakfilter_create(float window, int sample_rate)
     if ((n_stages = (int)(window * sample_rate)) < 1)
         n_stages = 1;
     
-    if (!(self->ptr = self->start = calloc(n_stages, sizeof (float))))
+    if (!(self->value = malloc(n_stages * sizeof (float))) ||
+                    !(self->stamp = malloc(n_stages * sizeof (unsigned))))
         {
         fprintf(stderr, "malloc failure\n");
         exit(-5);
         }
         
-    self->end = self->start + n_stages;   
+    self->n_stages = n_stages;
+    /* The window starts out full of silence, which as equal values is
+     * represented in the deque by the most recent alone. */
+    memset(self->value, 0, n_stages * sizeof (float));
+    self->stamp[0] = -1U;
+    self->head = 0;
+    self->count = 1;
+    self->t = 0;
     self->peak = 0.0f;
     
     return self;
@@ -53,23 +61,62 @@ struct peakfilter *peakfilter_create(float window, int sample_rate)
 
 void peakfilter_destroy(struct peakfilter *self)
     {
-    free(self->start);
+    free(self->value);
+    free(self->stamp);
     free(self);
     }
 
 void peakfilter_process(struct peakfilter *self, float sample)
     {
+    const unsigned n = self->n_stages;
+    unsigned tail;
     float least;
-    float *p;
+    float v = fabsf(sample);
     
-    *self->ptr++ = fabsf(sample);
-    if (self->ptr == self->end)
-        self->ptr = self->start;
+    if (n <= PEAKFILTER_SCAN_MAX)
+        {
+        self->value[self->head] = v;
+        if (++self->head == n)
+            self->head = 0;
+        for (tail = 0, least = HUGE_VALF; tail < n; ++tail)
+            if (self->value[tail] < least)
+                least = self->value[tail];
+        if (least > self->peak)
+            self->peak = least;
+        return;
+        }
+        
+    /* NaN never ranked as the least in a scan of the window. */
+    if (!(v <= HUGE_VALF))
+        v = HUGE_VALF;
+        
+    /* Only the oldest can have just left the window. Stamps wrap harmlessly. */
+    if (self->count && self->t - self->stamp[self->head] >= n)
+        {
+        if (++self->head == n)
+            self->head = 0;
+        --self->count;
+        }
+        
+    /* Values no less than the new one can never be the minimum again. */
+    while (self->count)
+        {
+        tail = self->head + self->count - 1;
+        if (tail >= n)
+            tail -= n;
+        if (self->value[tail] < v)
+            break;
+        --self->count;
+        }
         
-    for (p = self->start, least = HUGE_VALF; p < self->end; p++)
-        if (*p < least)
-            least = *p;
+    tail = self->head + self->count;
+    if (tail >= n)
+        tail -= n;
+    self->value[tail] = v;
+    self->stamp[tail] = self->t++;
+    ++self->count;
     
+    least = self->value[self->head];
     if (least > self->peak)
         self->peak = least;
     }
@@ -17,11 +17,22 @@
 #   If not, see <http://www.gnu.org/licenses/>.
 */
 
+/* Windows up to this many samples are scanned for their minimum which
+ * for so few values is the quicker method. */
+#define PEAKFILTER_SCAN_MAX 12
+
+/* Longer windows keep their minimum with a monotonic deque: a ring of
+ * samples in arrival order whose values rise from head to tail. The head
+ * is the minimum. When scanning, value is the window and head is where
+ * the next sample goes. */
 struct peakfilter
     {
-    float *start;
-    float *end;
-    float *ptr;
+    float *value;           /* deque ring of sample values */
+    unsigned *stamp;        /* and the sample count at which each arrived */
+    unsigned n_stages;      /* window length in samples and ring size */
+    unsigned head;          /* ring index of the oldest and least value */
+    unsigned count;         /* number of values in the deque */
+    unsigned t;             /* samples processed */
     float peak;
     };
 
@@ -34,6 +34,9 @@ typedef jack_default_audio_sample_t sample_t;
 static const size_t rb_n_samples = 10000;       /* maximum number of samples to hold in the ring buffer */
 static const size_t audio_buffer_elements = 256;
 
+/* how long the recorder thread sleeps waiting for input before checking anyway */
+#define RECORDER_IDLE_MS 100
+
 #if 0
 static void recorder_write_ogg_metaheader(struct recorder *self)
     {
@@ -437,11 +440,16 @@ static void recorder_display_logged_metadata2(struct metadata_item2 *mi2)
 static void recorder_append_metadata(struct recorder *self, struct encoder_op_packet *packet)
     {
     struct metadata_item *mi;
-    char *artist, *title, *album, *stringp;
+    char *artist, *title, *album, *stringp, *copy = NULL;
 
     if (packet)
         {
-        stringp = packet->data;
+        /* the packet is shared with other clients so a copy is split */
+        if (!(stringp = copy = strdup(packet->data)))
+            {
+            fprintf(stderr, "recorder_append_metadata: malloc failure\n");
+            return;
+            }
         strsep(&stringp, "\n");   /* we discard the first value */
         artist = strsep(&stringp, "\n");
         title  = strsep(&stringp, "\n");
@@ -455,13 +463,13 @@ static void recorder_append_metadata(struct recorder *self, struct encoder_op_pa
                 && !strcmp(self->mi_last->album, album))
         {
         fprintf(stderr, "recorder_append_metadata: duplicate artist-title, skipping\n");
-        return;
+        goto cleanup;
         }
 
     if (!(mi = calloc(1, sizeof (struct metadata_item))))
         {
         fprintf(stderr, "recorder_append_metadata: malloc failure\n");
-        return;
+        goto cleanup;
         }
 
     mi->artist = strdup(artist);
@@ -491,6 +499,8 @@ static void recorder_append_metadata(struct recorder *self, struct encoder_op_pa
             free(mi);
             }
         }
+    cleanup:
+    free(copy);
     }
 
 static void recorder_free_metadata(struct recorder *self)
@@ -527,17 +537,24 @@ static void recorder_display_logged_metadata(struct metadata_item *mi)
 static void *recorder_main(void *args)
     {
     struct recorder *self = args;
-    struct timespec ms10 = { 0, 10000000 };
     struct encoder_op_packet *packet;
     char *rl, *rr, *w, *endp;
     size_t nbytes;
-    int m, s, f;
+    int m, s, f, idle;
+    enum record_mode reported_mode = RM_STOPPED;
      
     sig_mask_thread();
     while (!self->thread_terminate_f)
         {
-        nanosleep(&ms10, NULL);
+        /* push state changes to the user interface */
+        if (self->record_mode != reported_mode)
+            {
+            reported_mode = self->record_mode;
+            sourceclient_event(SC_EVENT_RECORDER, self->numeric_id, reported_mode, 0);
+            wakeup_post(&self->state_wakeup);
+            }
 
+        idle = FALSE;           /* set when there is nothing more to do until posted */
         switch (self->record_mode)
             {
             case RM_STOPPED:
@@ -598,6 +615,7 @@ static void *recorder_main(void *args)
                         f = self->recording_length_ms % 1000 * 75 / 1000;
                         fprintf(self->fpcue, "    INDEX 01 %02d:%02d:%02d\r\n", m, s, f);
                         }
+                    idle = TRUE;
                     }
                 else
                     {
@@ -636,6 +654,8 @@ static void *recorder_main(void *args)
                             recorder_append_metadata(self, packet);
                         encoder_client_free_packet(packet);
                         }
+                    else
+                        idle = TRUE;
                     if (self->stop_request)
                         {
                         self->stop_pending = TRUE;
@@ -667,6 +687,8 @@ static void *recorder_main(void *args)
                             self->initial_serial = encoder_client_set_flush(self->encoder_op) + 1;
                         self->record_mode = RM_RECORDING;
                         }
+                    else
+                        idle = TRUE;
                     }
                 break;
             case RM_STOPPING:
@@ -676,7 +698,7 @@ static void *recorder_main(void *args)
                     fclose(self->fpcue);
                     self->jack_dataflow_control = JD_FLUSH;
                     while (self->jack_dataflow_control != JD_OFF)
-                        nanosleep(&ms10, NULL);
+                        wakeup_wait(&self->wakeup, 100);
                     jack_ringbuffer_free(self->input_rb[0]);
                     jack_ringbuffer_free(self->input_rb[1]);
                     free(self->left);
@@ -728,6 +750,9 @@ static void *recorder_main(void *args)
             default:
                 fprintf(stderr, "recorder_main: unhandled record mode\n");
             }
+        /* a request or a mode change means going round again straight away */
+        if (idle && self->record_mode == reported_mode)
+            wakeup_wait(&self->wakeup, RECORDER_IDLE_MS);
         }
     return NULL;
     }
@@ -735,7 +760,6 @@ static void *recorder_main(void *args)
 int recorder_make_report(struct recorder *self)
     {
     fprintf(g.out, "idjcsc: recorder%dreport=%d:%d\n", self->numeric_id, self->record_mode, self->recording_length_s);
-    fflush(g.out);
     return SUCCEEDED;
     }
 
@@ -796,7 +820,7 @@ int recorder_start(struct threads_info *ti, struct universal_vars *uv, void *oth
         }
     else
         {      
-        if (!(self->encoder_op = encoder_register_client(ti, atoi(rv->record_source))))
+        if (!(self->encoder_op = encoder_register_client(ti, atoi(rv->record_source), &self->wakeup, ENCODER_LAG_DROP)))
             {
             fprintf(stderr, "recorder_start: failed to register with encoder\n");
             return FAILED;
@@ -971,7 +995,6 @@ int recorder_start(struct threads_info *ti, struct universal_vars *uv, void *oth
 int recorder_stop(struct threads_info *ti, struct universal_vars *uv, void *other)
     {
     struct recorder *self = ti->recorder[uv->tab];
-    struct timespec ms10 = { 0, 10000000 };
 
     if (self->record_mode == RM_STOPPED)
         {
@@ -979,8 +1002,9 @@ int recorder_stop(struct threads_info *ti, struct universal_vars *uv, void *othe
         return FAILED;
         }
     self->stop_request = TRUE;
+    wakeup_post(&self->wakeup);
     while (self->record_mode != RM_STOPPED)
-        nanosleep(&ms10, NULL);
+        wakeup_wait(&self->state_wakeup, 100);
     fprintf(stderr, "recorder_stop: device %d stopped\n", self->numeric_id);
     return SUCCEEDED;
     }
@@ -988,15 +1012,15 @@ int recorder_stop(struct threads_info *ti, struct universal_vars *uv, void *othe
 int recorder_pause(struct threads_info *ti, struct universal_vars *uv, void *other)
     {
     struct recorder *self = ti->recorder[uv->tab];
-    struct timespec ms10 = { 0, 10000000 };
 
     self->unpause_request = FALSE;
     self->pause_request = TRUE;
+    wakeup_post(&self->wakeup);
     if (self->record_mode == RM_RECORDING)
         {
         fprintf(stderr, "recorder_pause: waiting for pause mode to be entered\n");
         while (self->record_mode != RM_PAUSED)
-            nanosleep(&ms10, NULL);
+            wakeup_wait(&self->state_wakeup, 100);
         fprintf(stderr, "recorder_pause: in pause mode\n");
         }
     else
@@ -1015,15 +1039,15 @@ int recorder_pause(struct threads_info *ti, struct universal_vars *uv, void *oth
 int recorder_unpause(struct threads_info *ti, struct universal_vars *uv, void *other)
     {
     struct recorder *self = ti->recorder[uv->tab];
-    struct timespec ms10 = { 0, 10000000 };
     
     self->pause_request = FALSE;
     self->unpause_request = TRUE;
+    wakeup_post(&self->wakeup);
     if (self->record_mode == RM_PAUSED)
         {
         fprintf(stderr, "recorder_unpause: waiting for pause mode to finish\n");
         while (self->record_mode == RM_PAUSED)
-            nanosleep(&ms10, NULL);
+            wakeup_wait(&self->state_wakeup, 100);
         fprintf(stderr, "recorder_unpause: left pause mode\n");
         }
     else
@@ -1051,6 +1075,8 @@ struct recorder *recorder_init(struct threads_info *ti, int numeric_id)
     pthread_mutex_init(&self->artist_title_mutex, NULL);
     pthread_mutex_init(&self->mode_mutex, NULL);
     pthread_cond_init(&self->mode_cv, NULL);
+    wakeup_init(&self->wakeup);
+    wakeup_init(&self->state_wakeup);
     pthread_create(&self->thread_h, NULL, recorder_main, self);
     return self;
     }
@@ -1061,7 +1087,10 @@ void recorder_destroy(struct recorder *self)
     self->thread_terminate_f = TRUE;
     pthread_cond_signal(&self->mode_cv);
     pthread_mutex_unlock(&self->mode_mutex);
+    wakeup_post(&self->wakeup);
     pthread_join(self->thread_h, NULL);
+    wakeup_destroy(&self->wakeup);
+    wakeup_destroy(&self->state_wakeup);
     pthread_cond_destroy(&self->mode_cv);
     pthread_mutex_destroy(&self->mode_mutex);
     pthread_mutex_destroy(&self->artist_title_mutex);
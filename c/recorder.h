@@ -23,6 +23,7 @@
 #include <stdio.h>
 #include <sndfile.h>
 #include "sourceclient.h"
+#include "wakeup.h"
 
 enum record_mode { RM_STOPPED, RM_RECORDING, RM_PAUSED, RM_STOPPING };
 
@@ -113,6 +114,8 @@ struct recorder
     int new_artist_title;
     pthread_mutex_t mode_mutex;
     pthread_cond_t mode_cv;
+    struct wakeup wakeup;        /* posted on new input and requests to the recorder thread */
+    struct wakeup state_wakeup;  /* posted by the recorder thread on record_mode changes */
     };
 
 struct recorder *recorder_init(struct threads_info *ti, int numeric_id);
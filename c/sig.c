@@ -74,3 +74,8 @@ int sig_recent_usr1()
         }
     return 0;
     }
+
+int sig_pending_usr1()
+    {
+    return sigusr1count != sigusr1oldcount;
+    }
@@ -23,7 +23,11 @@
 #include <stdlib.h>
 #include <string.h>
 #include <locale.h>
+#include <stddef.h>
 #include <unistd.h>
+#include <fcntl.h>
+#include <errno.h>
+#include <pthread.h>
 #include <jack/jack.h>
 #include <jack/ringbuffer.h>
 #include "sourceclient.h"
@@ -118,15 +122,109 @@ static int get_report(struct threads_info *ti, struct universal_vars *uv, void *
     return FAILED;
     }
 
-static int command_parse(struct commandmap *map, struct threads_info *ti, struct universal_vars *uv)
+/* Reports of every recorder and streamer in one reply, flushed along with it. */
+static int get_all_reports(struct threads_info *ti, struct universal_vars *uv, void *other)
     {
-    for (; map->key; map++)
-        if (!(strcmp(uv->command, map->key)))
+    for (int i = 0; i < ti->n_recorders; i++)
+        recorder_make_report(ti->recorder[i]);
+    for (int i = 0; i < ti->n_streamers; i++)
+        streamer_make_report(ti->streamer[i]);
+    return SUCCEEDED;
+    }
+
+static void latency_report(const char *device, int numeric_id, struct wakeup *wakeup)
+    {
+    struct wakeup_latency wl;
+
+    wakeup_read_latency(wakeup, &wl);
+    fprintf(g.out, "idjcsc: %s%dlatency=%lu:%d:%d\n", device, numeric_id, wl.n_wakes, (int)(wl.mean_s * 1e6), (int)(wl.max_s * 1e6));
+    }
+
+/* Wake-ups of each encoder, streamer and recorder thread since the last call:
+ * how many, and the mean and worst delay in microseconds from post to waking. */
+static int get_latency_report(struct threads_info *ti, struct universal_vars *uv, void *other)
+    {
+    for (int i = 0; i < ti->n_encoders; i++)
+        latency_report("encoder", i, &ti->encoder[i]->wakeup);
+    for (int i = 0; i < ti->n_streamers; i++)
+        latency_report("streamer", i, &ti->streamer[i]->wakeup);
+    for (int i = 0; i < ti->n_recorders; i++)
+        latency_report("recorder", i, &ti->recorder[i]->wakeup);
+    return SUCCEEDED;
+    }
+
+static pthread_mutex_t event_mutex = PTHREAD_MUTEX_INITIALIZER;
+static int event_fd = -1;
+static unsigned events_dropped;
+
+void sourceclient_event(int device, int numeric_id, int state, int flags)
+    {
+    struct sc_event event = { SC_EVENT_MAGIC, SC_EVENT_VERSION, device, numeric_id, state, flags };
+
+    pthread_mutex_lock(&event_mutex);
+    /* Events are small enough to be written atomically. When the pipe is
+     * full the user interface will catch up with its fallback poll.
+     */
+    if (event_fd >= 0 && write(event_fd, &event, sizeof event) < 0)
+        {
+        if (errno == EAGAIN)
+            ++events_dropped;
+        else
             {
-            if (uv->tab_id)
-                uv->tab = atoi(uv->tab_id);
-            return map->function(ti, uv, map->other_parameter);
+            perror("sourceclient_event: write");
+            close(event_fd);
+            event_fd = -1;
             }
+        }
+    pthread_mutex_unlock(&event_mutex);
+    }
+
+/* Start pushing state change events down the fifo the user interface made. */
+static int event_channel(struct threads_info *ti, struct universal_vars *uv, void *other)
+    {
+    char *pathname = getenv("be2ui_events");
+    int fd;
+
+    if (!pathname)
+        return FAILED;
+    /* The user interface holds the read end open in advance. */
+    if ((fd = open(pathname, O_WRONLY | O_NONBLOCK)) < 0)
+        {
+        fprintf(stderr, "event_channel: failed to open %s: %s\n", pathname, strerror(errno));
+        return FAILED;
+        }
+
+    pthread_mutex_lock(&event_mutex);
+    if (event_fd >= 0)
+        close(event_fd);
+    event_fd = fd;
+    pthread_mutex_unlock(&event_mutex);
+    return SUCCEEDED;
+    }
+
+static void event_channel_close()
+    {
+    pthread_mutex_lock(&event_mutex);
+    if (event_fd >= 0)
+        {
+        close(event_fd);
+        event_fd = -1;
+        }
+    pthread_mutex_unlock(&event_mutex);
+    if (events_dropped)
+        fprintf(stderr, "event_channel_close: %u events were dropped\n", events_dropped);
+    }
+
+static int command_parse(struct keymap *index, struct threads_info *ti, struct universal_vars *uv)
+    {
+    struct commandmap *map;
+
+    if ((map = keymap_lookup(index, uv->command)))
+        {
+        if (uv->tab_id)
+            uv->tab = atoi(uv->tab_id);
+        return map->function(ti, uv, map->other_parameter);
+        }
     fprintf(stderr, "command_parse: unhandled command %s\n", uv->command);
     return FAILED;
     }
@@ -186,6 +284,7 @@ static struct kvpdict kvpdict[] = {
     { "ca_file",          &sv.ca_file, NULL },
     { "client_cert",      &sv.client_cert, NULL },
     { "make_public",      &sv.make_public, NULL },
+    { "lag_policy",       &sv.lag_policy, NULL },
     { "record_source",    &rv.record_source, NULL },        /* recorder_vars */
     { "record_filename",  &rv.record_filename, NULL },
     { "record_folder",    &rv.record_folder, NULL },
@@ -200,6 +299,9 @@ static struct commandmap commandmap[] = {
     { "encoder_lame_availability", encoder_init_lame, NULL},
     { "encoder_aac_availability", live_avcodec_encoder_aac_functionality, NULL},
     { "get_report", get_report, NULL },
+    { "get_all_reports", get_all_reports, NULL },
+    { "get_latency_report", get_latency_report, NULL },
+    { "event_channel", event_channel, NULL },
     { "encoder_start", encoder_start, &ev },
     { "encoder_stop", encoder_stop, NULL },
     { "encoder_update", encoder_update, &ev },
@@ -214,10 +316,15 @@ static struct commandmap commandmap[] = {
     { "initiate_fade", encoder_initiate_fade, NULL },
     { NULL, NULL, NULL } }; 
 
+static struct keymap *kvpindex, *commandindex;
+
 static void sourceclient_cleanup()
     {
     threads_shutdown(&ti);
+    event_channel_close();
     kvp_free_dict(kvpdict);
+    keymap_free(kvpindex);
+    keymap_free(commandindex);
     }
 
 void sourceclient_init()
@@ -227,6 +334,12 @@ void sourceclient_init()
     setlocale(LC_ALL, "C");
 
     srand(time(NULL));
+
+    if (!(kvpindex = kvp_index_dict(kvpdict)) || !(commandindex = keymap_new(commandmap, sizeof (struct commandmap), offsetof(struct commandmap, key))))
+        {
+        fprintf(stderr, "sourceclient_init: failed to index the command tables\n");
+        exit(5);
+        }
     
     threads_init(&ti);
     atexit(sourceclient_cleanup);
@@ -234,10 +347,10 @@ void sourceclient_init()
 
 int sourceclient_main()
     {
-    if (!kvp_parse(kvpdict, g.in))
+    if (!kvp_parse(kvpindex, g.in))
         return FALSE;
 
-    if (uv.command && command_parse(commandmap, &ti, &uv))
+    if (uv.command && command_parse(commandindex, &ti, &uv))
         comms_send("succeeded");
     else
         {
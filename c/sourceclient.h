@@ -20,6 +20,8 @@
 #ifndef SOURCECLIENT_H
 #define SOURCECLIENT_H
 
+#include <stdint.h>
+
 enum { FAILED, SUCCEEDED }; /* use for return values to commandmap(pped) functions */
 enum { FALSE, TRUE };
 
@@ -54,6 +56,24 @@ struct commandmap
     void *other_parameter;
     };
     
+/* State change notifications pushed to the user interface. */
+#define SC_EVENT_MAGIC 0x56454353       /* "SCEV" little endian */
+#define SC_EVENT_VERSION 1
+
+enum sc_event_device { SC_EVENT_STREAMER, SC_EVENT_RECORDER };
+
+struct sc_event
+    {
+    uint32_t magic;
+    uint16_t version;
+    uint16_t device;
+    int32_t numeric_id;
+    int32_t state;                      /* stream_mode or record_mode */
+    int32_t flags;
+    };
+
+#define SC_EVENT_BUFFER_FULL 0x1        /* streamer send buffer is full */
+
 #include "encoder.h"
 #include "streamer.h"
 #include "recorder.h"
@@ -63,4 +83,8 @@ void sourceclient_init();
 int sourceclient_main();
 void comms_send(char *message);
 
+/* sourceclient_event: notify the user interface of a state change
+ * safe to call from any thread and never blocks */
+void sourceclient_event(int device, int numeric_id, int state, int flags);
+
 #endif
@@ -24,6 +24,7 @@
 #include <stdlib.h>
 #include <string.h>
 #include <pthread.h>
+#include <time.h>
 #include <shoutidjc/shout.h>
 #include "sourceclient.h"
 #include "sig.h"
@@ -37,14 +38,31 @@
 /* the number of seconds of audio to stockpile before packet dumping takes place */
 static const int shout_buffer_seconds = 9;
 
+/* connection progress is polled at this interval in milliseconds */
+#define STREAMER_CONNECT_POLL_MS 10
+/* and given up on after this many seconds */
+#define STREAMER_CONNECT_TIMEOUT_S 1.2
+/* with no packets arriving the connection is checked this often regardless */
+#define STREAMER_IDLE_MS 100
+
+static double monotonic_seconds()
+    {
+    struct timespec ts;
+
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return ts.tv_sec + ts.tv_nsec / 1e9;
+    }
+
 static void *streamer_main(void *args)
     {
     struct streamer *self = args;
-    struct timespec ms10 = { 0, 10000000 };
     struct encoder_op_packet *packet;
     char buffer[10];
     size_t data_size;
-    unsigned connect_time = 0;
+    double connect_start = 0.0;
+    int wait_ms;
+    enum stream_mode reported_mode = SM_DISCONNECTED;
+    int reported_full = FALSE, full;
     
     char *s_conv(unsigned long value)
         {
@@ -55,8 +73,18 @@ static void *streamer_main(void *args)
     sig_mask_thread();
     while (!self->thread_terminate_f)
         {
-        nanosleep(&ms10, NULL);
+        /* push state changes to the user interface */
+        full = self->stream_mode == SM_CONNECTED && self->max_shout_queue &&
+                        shout_queuelen(self->shout) >= self->max_shout_queue;
+        if (self->stream_mode != reported_mode || full != reported_full)
+            {
+            reported_mode = self->stream_mode;
+            reported_full = full;
+            sourceclient_event(SC_EVENT_STREAMER, self->numeric_id, reported_mode, full ? SC_EVENT_BUFFER_FULL : 0);
+            wakeup_post(&self->state_wakeup);
+            }
 
+        wait_ms = -1;           /* go round again straight away */
         switch (self->stream_mode)
             {
             case SM_DISCONNECTED:
@@ -71,7 +99,10 @@ static void *streamer_main(void *args)
                     case SHOUTERR_BUSY:
                         self->shout_status = shout_get_connected(self->shout);
 
-                        if (self->disconnect_request || ++connect_time > 120)
+                        /* timed rather than counted as packets from the encoder cut the polls short */
+                        if (connect_start == 0.0)
+                            connect_start = monotonic_seconds();
+                        if (self->disconnect_request || monotonic_seconds() - connect_start > STREAMER_CONNECT_TIMEOUT_S)
                             self->stream_mode = SM_DISCONNECTING;
                         break;
                     case SHOUTERR_CONNECTED:
@@ -86,6 +117,8 @@ static void *streamer_main(void *args)
                         fprintf(stderr, "streamer_main: connection failed, shout_get_error reports %ld %s\n", self->shout_status, shout_get_error(self->shout));
                         self->stream_mode = SM_DISCONNECTING;
                     }
+                if (self->stream_mode == SM_CONNECTING)
+                    wait_ms = STREAMER_CONNECT_POLL_MS;
                 break;
             case SM_CONNECTED:
                 /* check the connection is still on */
@@ -94,6 +127,11 @@ static void *streamer_main(void *args)
                     fprintf(stderr, "streamer_main: shout_get_error reports %ld %s\n", self->shout_status, shout_get_error(self->shout));
                     self->stream_mode = SM_DISCONNECTING;
                     }
+                if (encoder_client_overrun(self->encoder_op))
+                    {
+                    fprintf(stderr, "streamer_main: fell too far behind the encoder\n");
+                    self->stream_mode = SM_DISCONNECTING;
+                    }
                 if (self->disconnect_request && (!self->disconnect_pending))
                     {
                     self->disconnect_pending = TRUE;
@@ -149,9 +187,21 @@ static void *streamer_main(void *args)
                         }
                     if (packet->header.flags & PF_METADATA)  /* tell server about new metadata */
                         {
-                        *strpbrk(packet->data, "\n") = '\0';
-                        fprintf(stderr, "streamer_main: packet is metadata: %s\n", (char *)packet->data);
-                        shout_metadata_add(self->shout_meta, "song", packet->data);
+                        /* the packet is shared with other clients so the first line is copied out */
+                        size_t len = strcspn(packet->data, "\n");
+                        char *song = malloc(len + 1);
+
+                        if (!song)
+                            {
+                            fprintf(stderr, "streamer_main: malloc failure\n");
+                            encoder_client_free_packet(packet);
+                            break;
+                            }
+                        memcpy(song, packet->data, len);
+                        song[len] = '\0';
+                        fprintf(stderr, "streamer_main: packet is metadata: %s\n", song);
+                        shout_metadata_add(self->shout_meta, "song", song);
+                        free(song);
                         switch (shout_set_metadata(self->shout, self->shout_meta))
                             {
                             case SHOUTERR_SUCCESS:
@@ -164,6 +214,8 @@ static void *streamer_main(void *args)
                         }
                     encoder_client_free_packet(packet);
                     }
+                else if (self->stream_mode == SM_CONNECTED)
+                    wait_ms = STREAMER_IDLE_MS;
                 break;
             case SM_DISCONNECTING:
                 fprintf(stderr, "streamer_main: disconencting from server\n");
@@ -178,10 +230,12 @@ static void *streamer_main(void *args)
                 self->disconnect_request = FALSE;
                 self->disconnect_pending = FALSE;
                 self->stream_mode = SM_DISCONNECTED;
-                connect_time = 0;
+                connect_start = 0.0;
                 fprintf(stderr, "streamer_main: disconnection complete\n");
                 break;
             }
+        if (wait_ms >= 0)
+            wakeup_wait(&self->wakeup, wait_ms);
         }
     return NULL;
     }
@@ -197,7 +251,6 @@ int streamer_make_report(struct streamer *self)
     fprintf(g.out, "idjcsc: streamer%dreport=%d:%d:%d\n", self->numeric_id, (int)self->stream_mode, buffer_fill_pc, new_connection);
     if (new_connection)
         self->brand_new_connection = FALSE;
-    fflush(g.out);
     return SUCCEEDED;
     }
 
@@ -206,6 +259,7 @@ int streamer_connect(struct threads_info *ti, struct universal_vars *uv, void *o
     struct streamer_vars *sv = other;
     struct streamer *self = ti->streamer[uv->tab];
     int protocol, data_format = -1, tls;
+    enum encoder_lag_policy lag_policy = ENCODER_LAG_SKIP;
     char channels[2];
     char bitrate[4];
     char samplerate[6];
@@ -215,7 +269,15 @@ int streamer_connect(struct threads_info *ti, struct universal_vars *uv, void *o
         fprintf(stderr, "streamer_connect: failed to set parameter %s\n", parameter);
         }
 
-    if (!(self->encoder_op = encoder_register_client(ti, atoi(sv->stream_source))))
+    if (sv->lag_policy)
+        {
+        if (!strcmp(sv->lag_policy, "drop"))
+            lag_policy = ENCODER_LAG_DROP;
+        else if (!strcmp(sv->lag_policy, "disconnect"))
+            lag_policy = ENCODER_LAG_DISCONNECT;
+        }
+
+    if (!(self->encoder_op = encoder_register_client(ti, atoi(sv->stream_source), &self->wakeup, lag_policy)))
         {
         fprintf(stderr, "streamer_start: failed to register with encoder\n");
         return FAILED;
@@ -475,7 +537,6 @@ int streamer_connect(struct threads_info *ti, struct universal_vars *uv, void *o
 int streamer_disconnect(struct threads_info *ti, struct universal_vars *uv, void *other)
     {
     struct streamer *self = ti->streamer[uv->tab];
-    struct timespec ms10 = { 0, 10000000 };
 
     if (!self->shout)
         {
@@ -483,9 +544,10 @@ int streamer_disconnect(struct threads_info *ti, struct universal_vars *uv, void
         return FAILED;
         }
     self->disconnect_request = TRUE;
+    wakeup_post(&self->wakeup);
     fprintf(stderr, "streamer_disconnect: disconnection_request is set\n");
     while(self->stream_mode != SM_DISCONNECTED)
-        nanosleep(&ms10, NULL);
+        wakeup_wait(&self->state_wakeup, 100);
     fprintf(stderr, "streamer_disconnect: disconnection complete\n");
     return SUCCEEDED;
     }
@@ -510,6 +572,8 @@ struct streamer *streamer_init(struct threads_info *ti, int numeric_id)
     self->numeric_id = numeric_id;
     pthread_mutex_init(&self->mode_mutex, NULL);
     pthread_cond_init(&self->mode_cv, NULL);
+    wakeup_init(&self->wakeup);
+    wakeup_init(&self->state_wakeup);
     pthread_create(&self->thread_h, NULL, streamer_main, self);
     return self;
     }
@@ -524,7 +588,10 @@ void streamer_destroy(struct streamer *self)
     self->thread_terminate_f = TRUE;
     pthread_cond_signal(&self->mode_cv);
     pthread_mutex_unlock(&self->mode_mutex);
+    wakeup_post(&self->wakeup);
     pthread_join(self->thread_h, &thread_ret);
+    wakeup_destroy(&self->wakeup);
+    wakeup_destroy(&self->state_wakeup);
     pthread_cond_destroy(&self->mode_cv);
     pthread_mutex_destroy(&self->mode_mutex);
     free(self);
@@ -21,6 +21,7 @@
 #define STREAMER_H
 
 #include "sourceclient.h"
+#include "wakeup.h"
 
 struct streamer_vars
     {
@@ -44,6 +45,7 @@ struct streamer_vars
     char *ca_file;
     char *client_cert;
     char *make_public;
+    char *lag_policy;
     };
 
 enum stream_mode { SM_DISCONNECTED, SM_CONNECTING, SM_CONNECTED, SM_DISCONNECTING };
@@ -70,6 +72,8 @@ struct streamer
     ssize_t max_shout_queue;     /* how much audio data we are willing to stockpile */
     pthread_mutex_t mode_mutex;
     pthread_cond_t mode_cv;
+    struct wakeup wakeup;        /* posted on new packets and requests to the streamer thread */
+    struct wakeup state_wakeup;  /* posted by the streamer thread on stream_mode changes */
     };
 
 struct streamer *streamer_init(struct threads_info *ti, int numeric_id);
@@ -0,0 +1,124 @@
+/*
+#   wakeup.c: wake-up calls for worker threads that sleep until there is work
+#   Copyright (C) 2026 Stephen Fairchild (s-fairchild@users.sourceforge.net)
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program in the file entitled COPYING.
+#   If not, see <http://www.gnu.org/licenses/>.
+*/
+
+#include "gnusource.h"
+#include <stdio.h>
+#include <stdlib.h>
+#include <errno.h>
+#include "wakeup.h"
+
+void wakeup_init(struct wakeup *self)
+    {
+    pthread_condattr_t attr;
+
+    pthread_condattr_init(&attr);
+    pthread_condattr_setclock(&attr, CLOCK_MONOTONIC);
+    if (pthread_mutex_init(&self->mutex, NULL) || pthread_cond_init(&self->cv, &attr))
+        {
+        fprintf(stderr, "wakeup_init: failed to initialise\n");
+        exit(-5);
+        }
+    pthread_condattr_destroy(&attr);
+    self->pending = 0;
+    self->n_wakes = 0;
+    self->latency_sum = self->latency_max = 0.0;
+    }
+
+void wakeup_destroy(struct wakeup *self)
+    {
+    pthread_cond_destroy(&self->cv);
+    pthread_mutex_destroy(&self->mutex);
+    }
+
+/* call with the lock held */
+static void wakeup_post_locked(struct wakeup *self)
+    {
+    if (!self->pending)
+        {
+        clock_gettime(CLOCK_MONOTONIC, &self->posted);
+        self->pending = 1;
+        pthread_cond_signal(&self->cv);
+        }
+    }
+
+void wakeup_post(struct wakeup *self)
+    {
+    pthread_mutex_lock(&self->mutex);
+    wakeup_post_locked(self);
+    pthread_mutex_unlock(&self->mutex);
+    }
+
+void wakeup_post_rt(struct wakeup *self)
+    {
+    if (!pthread_mutex_trylock(&self->mutex))
+        {
+        wakeup_post_locked(self);
+        pthread_mutex_unlock(&self->mutex);
+        }
+    }
+
+int wakeup_wait(struct wakeup *self, int timeout_ms)
+    {
+    struct timespec deadline, now;
+    double latency;
+    int posted;
+
+    pthread_mutex_lock(&self->mutex);
+    if (timeout_ms < 0)
+        {
+        while (!self->pending)
+            pthread_cond_wait(&self->cv, &self->mutex);
+        }
+    else
+        {
+        clock_gettime(CLOCK_MONOTONIC, &deadline);
+        deadline.tv_sec += timeout_ms / 1000;
+        if ((deadline.tv_nsec += timeout_ms % 1000 * 1000000L) >= 1000000000L)
+            {
+            deadline.tv_nsec -= 1000000000L;
+            deadline.tv_sec++;
+            }
+        while (!self->pending)
+            if (pthread_cond_timedwait(&self->cv, &self->mutex, &deadline) == ETIMEDOUT)
+                break;
+        }
+    if ((posted = self->pending))
+        {
+        clock_gettime(CLOCK_MONOTONIC, &now);
+        latency = (now.tv_sec - self->posted.tv_sec) + (now.tv_nsec - self->posted.tv_nsec) / 1e9;
+        self->n_wakes++;
+        self->latency_sum += latency;
+        if (latency > self->latency_max)
+            self->latency_max = latency;
+        self->pending = 0;
+        }
+    pthread_mutex_unlock(&self->mutex);
+    return posted;
+    }
+
+void wakeup_read_latency(struct wakeup *self, struct wakeup_latency *wl)
+    {
+    pthread_mutex_lock(&self->mutex);
+    wl->n_wakes = self->n_wakes;
+    wl->mean_s = self->n_wakes ? self->latency_sum / self->n_wakes : 0.0;
+    wl->max_s = self->latency_max;
+    self->n_wakes = 0;
+    self->latency_sum = self->latency_max = 0.0;
+    pthread_mutex_unlock(&self->mutex);
+    }
@@ -0,0 +1,59 @@
+/*
+#   wakeup.h: wake-up calls for worker threads that sleep until there is work
+#   Copyright (C) 2026 Stephen Fairchild (s-fairchild@users.sourceforge.net)
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program in the file entitled COPYING.
+#   If not, see <http://www.gnu.org/licenses/>.
+*/
+
+#ifndef WAKEUP_H
+#define WAKEUP_H
+
+#include <pthread.h>
+#include <time.h>
+
+/* Posts are remembered until the waiter next returns so none made while
+ * it was busy can be missed. Each wakeup has one waiting thread. */
+struct wakeup
+    {
+    pthread_mutex_t mutex;
+    pthread_cond_t cv;
+    int pending;                 /* posted since the waiter last returned */
+    struct timespec posted;      /* time of the first such post */
+    unsigned long n_wakes;       /* latency counters since last read */
+    double latency_sum;          /* seconds from post to wake-up */
+    double latency_max;
+    };
+
+struct wakeup_latency
+    {
+    unsigned long n_wakes;
+    double mean_s;
+    double max_s;
+    };
+
+void wakeup_init(struct wakeup *self);
+void wakeup_destroy(struct wakeup *self);
+/* wakeup_post: wake the waiter, blocking briefly if it holds the lock */
+void wakeup_post(struct wakeup *self);
+/* wakeup_post_rt: for the JACK process callback, never blocks
+ * a post that meets the lock held is dropped and the waiter gets the next one */
+void wakeup_post_rt(struct wakeup *self);
+/* wakeup_wait: sleep until posted or timeout_ms passes, a negative timeout meaning never
+ * returns nonzero if posted */
+int wakeup_wait(struct wakeup *self, int timeout_ms);
+/* wakeup_read_latency: the latency counters which are then reset */
+void wakeup_read_latency(struct wakeup *self, struct wakeup_latency *wl);
+
+#endif /* WAKEUP_H */
@@ -23,6 +23,8 @@
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
+#include <strings.h>
+#include <fcntl.h>
 #include <math.h>
 #include <unistd.h>
 #include <ctype.h>
@@ -251,22 +253,67 @@ static u_int32_t xlplayer_update_progress_time_ms(struct xlplayer *self)
         return self->play_progress_ms = 0;
     }
 
-static char *get_extension(char *pathname)
+/* how much of the start of a track the preload thread reads ahead */
+#define PRELOAD_HEAD_BYTES (2 << 20)
+/* tags and indexes are often at the end so that is read ahead too */
+#define PRELOAD_TAIL_BYTES (128 << 10)
+#define PRELOAD_CHUNK_BYTES (64 << 10)
+
+static int mp3decode_reg_checked(struct xlplayer *self)
     {
-    char *p, *extension;
-    
-    if (!(p = strrchr(pathname, '.')))
-        {
-        fprintf(stderr, "get_extension: failed to find a file extension delineator '.'\n");
-        return strdup("");
-        }
-    extension = p = strdup(p + 1);
-    while (*p)
+    return mpg123ok && mp3decode_reg(self);
+    }
+
+/* the decoder to use for each file extension */
+static const struct xlplayer_decoder
+    {
+    const char *extension;
+    int (*reg)(struct xlplayer *);
+    } decoders[] = {
+    { "ogg", oggdecode_reg },
+    { "oga", oggdecode_reg },
+#ifdef HAVE_SPEEX
+    { "spx", oggdecode_reg },
+#endif
+#ifdef HAVE_OPUS
+    { "opus", oggdecode_reg },
+#endif
+#ifdef HAVE_FLAC
+    { "flac", flacdecode_reg },
+#endif
+    { "wav", sndfiledecode_reg },
+    { "au", sndfiledecode_reg },
+    { "aiff", sndfiledecode_reg },
+#ifdef HAVE_LIBAV
+    { "aac", avcodecdecode_reg },
+    { "m4a", avcodecdecode_reg },
+    { "mp4", avcodecdecode_reg },
+    { "m4b", avcodecdecode_reg },
+    { "m4p", avcodecdecode_reg },
+    { "wma", avcodecdecode_reg },
+    { "avi", avcodecdecode_reg },
+    { "mpc", avcodecdecode_reg },
+    { "ape", avcodecdecode_reg },
+#endif /* HAVE_LIBAV */
+    { "mp3", mp3decode_reg_checked },
+    { "mp2", mp3decode_reg_checked },
+    { NULL, NULL }};
+
+/* find_decoder: the decoder entry for pathname by its extension or NULL */
+static const struct xlplayer_decoder *find_decoder(const char *pathname)
+    {
+    const char *extension;
+    const struct xlplayer_decoder *d;
+
+    if (!(extension = strrchr(pathname, '.')))
         {
-        char c = tolower(*p);
-        *p++ = c;
+        fprintf(stderr, "find_decoder: failed to find a file extension delineator '.'\n");
+        return NULL;
         }
-    return extension;
+    for (d = decoders, ++extension; d->extension; ++d)
+        if (!strcasecmp(extension, d->extension))
+            return d;
+    return NULL;
     }
 
 static void xlplayer_command(struct xlplayer *self, enum command_t new_command)
@@ -279,9 +326,19 @@ static void xlplayer_command(struct xlplayer *self, enum command_t new_command)
         usleep(10000);
     }
 
+/* playlist_next: index of the internal playlist item after the current one or -1 at the end */
+static int playlist_next(struct xlplayer *self)
+    {
+    int next = self->playlistindex + 1;
+
+    if (next == self->playlistsize && self->loop)
+        next = 0;                       /* perform looparound if relevant */
+    return next < self->playlistsize ? next : -1;
+    }
+
 static void *xlplayer_main(struct xlplayer *self)
     {
-    char *extension;
+    const struct xlplayer_decoder *decoder;
     
     sig_mask_thread();
     for(self->up = TRUE; self->command != CMD_THREADEXIT; self->watchdog_timer = 0)
@@ -328,24 +385,8 @@ static void *xlplayer_main(struct xlplayer *self)
             case PM_INITIATE:
                 self->initial_audio_context = -1;   /* pre-select failure return code */
                 xlplayer_set_fadesteps(self, self->fade_mode);
-                extension = get_extension(self->pathname);
-                if (
-                          ((!strcmp(extension, "ogg") || !strcmp(extension, "oga")) && oggdecode_reg(self))
-#ifdef HAVE_SPEEX
-                          || (!strcmp(extension, "spx") && oggdecode_reg(self))
-#endif
-#ifdef HAVE_OPUS
-                          || (!strcmp(extension, "opus") && oggdecode_reg(self))
-#endif
-#ifdef HAVE_FLAC
-                          || (!strcmp(extension, "flac") && flacdecode_reg(self))
-#endif
-                          || ((!strcmp(extension, "wav") || !strcmp(extension, "au") || !strcmp(extension, "aiff")) && sndfiledecode_reg(self))
-#ifdef HAVE_LIBAV
-                          || ((!strcmp(extension, "aac") || !strcmp(extension, "m4a") || !strcmp(extension, "mp4") || !strcmp(extension, "m4b") || !strcmp(extension, "m4p") || !strcmp(extension, "wma") || !strcmp(extension, "avi") || !strcmp(extension, "mpc") || !strcmp(extension, "ape")) && avcodecdecode_reg(self))
-#endif /* HAVE_LIBAV */
-                          || ((!strcmp(extension, "mp3") || (!strcmp(extension, "mp2"))) && mpg123ok && mp3decode_reg(self))
-                    )
+                decoder = find_decoder(self->pathname);
+                if (decoder && decoder->reg(self))
                     {
                     self->playmode = PM_PLAYING;
                     self->play_progress_ms = 0;
@@ -363,7 +404,6 @@ static void *xlplayer_main(struct xlplayer *self)
                 else
                     self->playmode = PM_STOPPED;
                 self->command = CMD_COMPLETE;
-                free(extension);
                 break;
             case PM_PLAYING:
                 if (self->write_deferred)
@@ -382,21 +422,16 @@ static void *xlplayer_main(struct xlplayer *self)
                 self->dec_eject(self);
                 if (self->playlistmode)
                     {
-                    if (self->command != CMD_EJECT)
+                    /* implements the internal playlist here */
+                    if (self->command != CMD_EJECT && (self->playlistindex = playlist_next(self)) >= 0)
                         {
-                        /* implements the internal playlist here */
-                        if (++self->playlistindex == self->playlistsize && self->loop)
-                            self->playlistindex = 0;                   /* perform looparound if relevant */
-                        if (self->playlistindex < self->playlistsize) /* check for non end of playlist */
-                            {
-                            self->pathname = self->playlist[self->playlistindex];
-                            self->playmode = PM_INITIATE;
-                            continue;
-                            }
+                        self->pathname = self->playlist[self->playlistindex];
+                        self->playmode = PM_INITIATE;
+                        continue;
                         }
-                    else
-                        while (self->playlistsize--)
-                            free(self->playlist[self->playlistsize]);
+                    while (self->playlistsize > 0)
+                        free(self->playlist[--self->playlistsize]);
+                    self->playlistmode = FALSE;
                     }
                 ++self->current_audio_context;
                 self->playmode = PM_STOPPED;
@@ -407,6 +442,97 @@ static void *xlplayer_main(struct xlplayer *self)
     return 0;
     }
 
+/* preload_cancelled: a newer preload request or shutdown supersedes the current one */
+static int preload_cancelled(struct xlplayer *self)
+    {
+    int cancelled;
+
+    pthread_mutex_lock(&self->preload_mutex);
+    cancelled = self->preload_pathname != NULL || self->preload_exit;
+    pthread_mutex_unlock(&self->preload_mutex);
+    return cancelled;
+    }
+
+/* preload_file: pull the parts of a track read on play start into the page cache */
+static void preload_file(struct xlplayer *self, const char *pathname)
+    {
+    int fd;
+    off_t size, done;
+    ssize_t n;
+    char *buffer;
+
+    if (!find_decoder(pathname))
+        return;
+    if ((fd = open(pathname, O_RDONLY)) < 0)
+        {
+        fprintf(stderr, "xlplayer_preload: failed to open %s\n", pathname);
+        return;
+        }
+    if ((size = lseek(fd, 0, SEEK_END)) > PRELOAD_HEAD_BYTES + PRELOAD_TAIL_BYTES)
+        posix_fadvise(fd, size - PRELOAD_TAIL_BYTES, PRELOAD_TAIL_BYTES, POSIX_FADV_WILLNEED);
+    lseek(fd, 0, SEEK_SET);
+    /* reading rather than advising guarantees the head is resident on completion */
+    if ((buffer = malloc(PRELOAD_CHUNK_BYTES)))
+        {
+        for (done = 0; done < PRELOAD_HEAD_BYTES && !preload_cancelled(self); done += n)
+            if ((n = read(fd, buffer, PRELOAD_CHUNK_BYTES)) <= 0)
+                break;
+        free(buffer);
+        }
+    close(fd);
+    }
+
+static void *xlplayer_preload_main(struct xlplayer *self)
+    {
+    char *pathname;
+
+    sig_mask_thread();
+    pthread_mutex_lock(&self->preload_mutex);
+    for (;;)
+        {
+        while (!self->preload_pathname && !self->preload_exit)
+            pthread_cond_wait(&self->preload_cv, &self->preload_mutex);
+        if (self->preload_exit)
+            break;
+        pathname = self->preload_pathname;
+        self->preload_pathname = NULL;
+        pthread_mutex_unlock(&self->preload_mutex);
+        preload_file(self, pathname);
+        free(pathname);
+        pthread_mutex_lock(&self->preload_mutex);
+        }
+    pthread_mutex_unlock(&self->preload_mutex);
+    return NULL;
+    }
+
+void xlplayer_preload(struct xlplayer *self, char *pathname)
+    {
+    char *copy;
+
+    if (!(copy = strdup(pathname)))
+        {
+        fprintf(stderr, "xlplayer: malloc failure\n");
+        exit(5);
+        }
+    pthread_mutex_lock(&self->preload_mutex);
+    /* the thread is started on first use as most players never preload */
+    if (!self->preload_up)
+        {
+        if (pthread_create(&self->preload_thread, NULL, (void *(*)(void *)) xlplayer_preload_main, self))
+            {
+            pthread_mutex_unlock(&self->preload_mutex);
+            fprintf(stderr, "xlplayer: failed to start the preload thread\n");
+            free(copy);
+            return;
+            }
+        self->preload_up = TRUE;
+        }
+    free(self->preload_pathname);
+    self->preload_pathname = copy;
+    pthread_cond_signal(&self->preload_cv);
+    pthread_mutex_unlock(&self->preload_mutex);
+    }
+
 /* callback functions for feeding the playback speed resampler */
 static long conv_l_read(void *cb_data, float **audiodata)
     {
@@ -579,6 +705,8 @@ struct xlplayer *xlplayer_create(int samplerate, double duration, char *playerna
     smoothing_mute_init(&self->mute_aud, audmute_c);
     pthread_mutex_init(&self->command_mutex, NULL);
     pthread_cond_init(&self->command_cv, NULL);
+    pthread_mutex_init(&self->preload_mutex, NULL);
+    pthread_cond_init(&self->preload_cv, NULL);
     pthread_create(&self->thread, NULL, (void *(*)(void *)) xlplayer_main, self);
     while (self->up == FALSE)
         usleep(10000);
@@ -591,6 +719,17 @@ void xlplayer_destroy(struct xlplayer *self)
         {
         xlplayer_command(self, CMD_CLEANUP);
         pthread_join(self->thread, NULL);
+        if (self->preload_up)
+            {
+            pthread_mutex_lock(&self->preload_mutex);
+            self->preload_exit = TRUE;
+            pthread_cond_signal(&self->preload_cv);
+            pthread_mutex_unlock(&self->preload_mutex);
+            pthread_join(self->preload_thread, NULL);
+            }
+        free(self->preload_pathname);
+        pthread_cond_destroy(&self->preload_cv);
+        pthread_mutex_destroy(&self->preload_mutex);
         pthread_cond_destroy(&self->command_cv);
         pthread_mutex_destroy(&self->command_mutex);
         pthread_mutex_destroy(&(self->dynamic_metadata.meta_mutex));
@@ -989,10 +1128,31 @@ void xlplayer_smoothing_process_all(struct xlplayer **list)
         xlplayer_smoothing_process(*list++);
     }
 
+static void xlplayer_stats_metadata(struct xlplayer *self, const char *prefix)
+    {
+    struct xlp_dynamic_metadata *dm = &self->dynamic_metadata;
+
+    if (dm->data_type)
+        {
+        pthread_mutex_lock(&(dm->meta_mutex));
+        fprintf(stderr, "new dynamic metadata\n");
+        if (dm->data_type != DM_JOINED_UC)
+            {
+            fputs(prefix, g.out);
+            fprintf(g.out, "new_metadata=d%d:%dd%d:%sd%d:%sd%d:%sd9:%09dd9:%09dx\n", (int)log10(dm->data_type) + 1, dm->data_type, (int)strlen(dm->artist), dm->artist, (int)strlen(dm->title), dm->title, (int)strlen(dm->album), dm->album, dm->current_audio_context, dm->rbdelay);
+            }
+        else
+            {
+            fprintf(stderr, "send_metadata_update: utf16 chapter info not supported\n");
+            }
+        dm->data_type = DM_NONE_NEW;
+        pthread_mutex_unlock(&(dm->meta_mutex));
+        }
+    }
+
 void xlplayer_stats(struct xlplayer *self)
     {
     char prefix[20];
-    struct xlp_dynamic_metadata *dm = &self->dynamic_metadata;
     
     snprintf(prefix, 20, "%s_", self->playername);
     #define PREFIX() fputs(prefix, g.out)
@@ -1012,26 +1172,43 @@ void xlplayer_stats(struct xlplayer *self)
 
     self->peak = 0.0f;
 
-    if (dm->data_type)
-        {
-        pthread_mutex_lock(&(dm->meta_mutex));
-        fprintf(stderr, "new dynamic metadata\n");
-        if (dm->data_type != DM_JOINED_UC)
-            {
-            PREFIX();
-            fprintf(g.out, "new_metadata=d%d:%dd%d:%sd%d:%sd%d:%sd9:%09dd9:%09dx\n", (int)log10(dm->data_type) + 1, dm->data_type, (int)strlen(dm->artist), dm->artist, (int)strlen(dm->title), dm->title, (int)strlen(dm->album), dm->album, dm->current_audio_context, dm->rbdelay);
-            }
-        else
-            {
-            fprintf(stderr, "send_metadata_update: utf16 chapter info not supported\n");
-            }
-        dm->data_type = DM_NONE_NEW;
-        pthread_mutex_unlock(&(dm->meta_mutex));
-        }
+    xlplayer_stats_metadata(self, prefix);
     
     #undef PREFIX
     }
 
+void xlplayer_meter(struct xlplayer *self, struct meter_player *mp)
+    {
+    mp->elapsed = self->play_progress_ms / 1000;
+    mp->playing = self->have_data_f | (self->current_audio_context & 0x1);
+    mp->signal = self->peak > 0.001F || self->peak < 0.0F || self->pause;
+    mp->cid = self->current_audio_context;
+    mp->audio_runout = self->avail < self->samples_cutoff && (!(self->current_audio_context & 0x1));
+    mp->silence = self->silence;
+
+    self->peak = 0.0f;
+    }
+
+int xlplayer_metadata_pending_all(struct xlplayer **list)
+    {
+    while (*list)
+        if ((*list++)->dynamic_metadata.data_type)
+            return 1;
+
+    return 0;
+    }
+
+void xlplayer_stats_metadata_all(struct xlplayer **list)
+    {
+    char prefix[20];
+
+    for (; *list; ++list)
+        {
+        snprintf(prefix, 20, "%s_", (*list)->playername);
+        xlplayer_stats_metadata(*list, prefix);
+        }
+    }
+
 void xlplayer_stats_all(struct xlplayer **list)
     {
     while (*list)
@@ -35,6 +35,7 @@
 
 #include "fade.h"
 #include "smoothing.h"
+#include "meterframe.h"
 
 enum command_t {CMD_COMPLETE, CMD_PLAY, CMD_EJECT, CMD_CLEANUP, CMD_THREADEXIT, CMD_PLAYMANY};
 
@@ -147,6 +148,12 @@ struct xlplayer
     uint32_t id;                        /* player identity e.g. player 3 = 1 << 3 */
     pthread_mutex_t command_mutex;      /* lock for command varaible change */
     pthread_cond_t command_cv;          /* used to wake up idle worker thread */
+    pthread_t preload_thread;           /* reads ahead the track expected to play next */
+    pthread_mutex_t preload_mutex;      /* guards the preload variables below */
+    pthread_cond_t preload_cv;          /* wakes up the preload thread */
+    char *preload_pathname;             /* the track waiting to be read ahead */
+    int preload_up;                     /* set once the preload thread exists */
+    int preload_exit;                   /* tells the preload thread to finish */
     };
 
 /* xlplayer_create: create an instance of the player */
@@ -167,6 +174,10 @@ int xlplayer_playmany(struct xlplayer *self, char *playlist, int loop_f);
 /* xlplayer_play_noflush: starts the player without flushing out old data from the ringbuffer */
 int xlplayer_play_noflush(struct xlplayer *self, char *pathname, int seek_s, int size, float gain_db, int id);
 
+/* xlplayer_preload: names the track expected to play next so that it can be
+* probed and read into the page cache in the background ahead of play */
+void xlplayer_preload(struct xlplayer *self, char *pathname);
+
 /* xlplayer_cancelplaynext: cancels the automatic playing of the next track 
 * the current track is allowed to continue playing */
 void xlplayer_cancelplaynext(struct xlplayer *self);
@@ -222,6 +233,13 @@ void xlplayer_smoothing_process(struct xlplayer *self);
 
 void xlplayer_stats(struct xlplayer *self);
 
+/* binary counterpart of xlplayer_stats less the dynamic metadata */
+void xlplayer_meter(struct xlplayer *self, struct meter_player *mp);
+
+/* dynamic metadata reporting for when the binary meter channel is in use */
+int xlplayer_metadata_pending_all(struct xlplayer **list);
+void xlplayer_stats_metadata_all(struct xlplayer **list);
+
 /* group process all players from the list */
 void xlplayer_read_start_all(struct xlplayer **list, jack_nframes_t nframes, struct xlplayer **roster);
 void xlplayer_read_next_all(struct xlplayer **list);
@@ -656,3 +656,18 @@ def idle_add(callback, *args, **kwargs):
     data = [True, callback, args, kwargs]
     data.append(GLib.idle_add(_source_wrapper, data))
     return data
+
+
+def _io_watch_wrapper(source, condition, data):
+    if data[0]:
+        ret = data[1](source, condition, *data[2], **data[3])
+        if ret:
+            return ret
+        data[0] = False
+
+
+def io_add_watch(fd, condition, callback, *args, **kwargs):
+    data = [True, callback, args, kwargs]
+    data.append(GLib.io_add_watch(fd, GLib.PRIORITY_DEFAULT, condition,
+                                  _io_watch_wrapper, data))
+    return data
@@ -18,15 +18,19 @@
 #   If not, see <http://www.gnu.org/licenses/>.
 
 
+import os
 import re
 import json
 import time
 import sys
+import socket
 import threading
+import selectors
 import traceback
 import gettext
 from inspect import getargspec
 from functools import wraps, partial
+from collections import deque
 
 from gi.repository import GObject
 from gi.repository import Gtk
@@ -1324,27 +1328,177 @@ class ConnectionsController(list):
             i = model.iter_next(i)
 
 
-class IRCConnection(Gtk.TreeRowReference, threading.Thread):
+class IRCReactor(object):
+
+    """One thread doing the network I/O of every IRC connection.
+
+    Sockets and a wakeup pipe are multiplexed with a selector so the
+    thread sleeps until there is something to do. Actions from other
+    threads are handed over with call().
+    """
+
+    # Seconds between scheduler checks while delayed commands are pending.
+    TICK = 0.25
+
+    def __init__(self):
+        try:
+            self.reactor = client.Reactor()
+        except AttributeError:
+            self.reactor = client.IRC()  # Old API compatibility
+
+        self._owners = {}
+        self._queue = deque()
+        self._selector = selectors.DefaultSelector()
+        self._registered = set()
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+
+        for event in events.all:
+            self.reactor.add_global_handler(event,
+                                            partial(self._dispatch, event))
+
+        thread = threading.Thread(target=self._run)
+        thread.daemon = True
+        thread.start()
+
+    def call(self, action):
+        """Have action run on the reactor thread. Safe from any thread."""
+
+        self._queue.append(action)
+        try:
+            os.write(self._wake_w, b"\0")
+        except BlockingIOError:
+            pass  # A wakeup is already pending.
+
+    def attach(self, owner):
+        """A new server connection, events of which go to owner.
+
+        Reactor thread only.
+        """
+
+        server = self.reactor.server()
+        self._owners[server] = owner
+        return server
+
+    def detach(self, server):
+        """Forget a server connection. Reactor thread only."""
+
+        self._owners.pop(server, None)
+        try:
+            server.close()
+        except AttributeError:
+            pass  # Old API compatibility
+
+    def _dispatch(self, event_type, server, event):
+        owner = self._owners.get(server)
+        if owner is not None:
+            handler = getattr(owner, "_on_" + event_type,
+                              owner._generic_handler)
+            handler(server, event)
+
+    def _sync_selector(self):
+        sockets = set(x.socket for x in self.reactor.connections
+                      if getattr(x, "socket", None) is not None)
+        for sock in self._registered - sockets:
+            try:
+                self._selector.unregister(sock)
+            except (KeyError, ValueError):
+                pass
+        for sock in sockets - self._registered:
+            self._selector.register(sock, selectors.EVENT_READ)
+        self._registered = sockets
+
+    def _timeout(self, now):
+        """Seconds the selector may sleep, None for indefinitely."""
+
+        due = [x for x in (y.send_due() for y in self._owners.values())
+               if x is not None]
+        timeout = max(0.0, min(due) - now) if due else None
+
+        scheduler = getattr(self.reactor, "scheduler", None)
+        if scheduler is not None:
+            scheduled = getattr(scheduler, "queue", True)
+        else:
+            scheduled = getattr(self.reactor, "delayed_commands", True)
+        if scheduled:
+            timeout = self.TICK if timeout is None else min(timeout,
+                                                            self.TICK)
+        return timeout
+
+    def _run(self):
+        while 1:
+            try:
+                self._sync_selector()
+                sockets = []
+                for key, mask in self._selector.select(
+                                                self._timeout(time.time())):
+                    if key.fileobj == self._wake_r:
+                        try:
+                            while os.read(self._wake_r, 4096):
+                                pass
+                        except BlockingIOError:
+                            pass
+                    else:
+                        sockets.append(key.fileobj)
+                if sockets:
+                    self.reactor.process_data(sockets)
+
+                while self._queue:
+                    try:
+                        self._queue.popleft()()
+                    except Exception:
+                        traceback.print_exc()
+
+                self.reactor.process_timeout()
+
+                now = time.time()
+                for owner in list(self._owners.values()):
+                    owner.send_pending(now)
+            except Exception:
+                traceback.print_exc()
+
+
+_reactor = None
+_reactor_lock = threading.Lock()
+
+
+def get_irc_reactor():
+    """The IRC reactor shared by all stream tabs, made on first use."""
+
+    global _reactor
+
+    with _reactor_lock:
+        if _reactor is None:
+            _reactor = IRCReactor()
+        return _reactor
+
+
+class IRCConnection(Gtk.TreeRowReference):
 
     """Self explanatory really."""
 
+    # Minimum seconds between messages sent to the same server.
+    SEND_INTERVAL = 1.0
+
+    # Seconds allowed for a TCP connection to be made.
+    CONNECT_TIMEOUT = 30.0
+
     def __init__(self, model, path, stream_active):
         super(IRCConnection, self).__init__(model, path)
-        threading.Thread.__init__(self)
         self._hooks = []
-        self._queue = []
         self._played = []
         self._message_handlers = []
-        self._keepalive = True
         self._have_welcome = False
         self._stream_active = stream_active
-        try:
-            self.reactor = client.Reactor()
-        except AttributeError:
-            self.reactor = client.IRC()  # Old API compatibility
-
-        self.server = self.reactor.server()
-        self.start()
+        self._outbox = deque()
+        self._next_send = 0.0
+        self._connect_attempt = 0
+        self._detached = threading.Event()
+        self.server = None
+        self._reactor = get_irc_reactor()
+        self._reactor.call(self._attach)
         self._hooks.append((model, model.connect(
             "row-inserted",
             self._on_row_inserted)))
@@ -1353,6 +1507,9 @@ class IRCConnection(Gtk.TreeRowReference, threading.Thread):
             self._on_ui_row_changed)))
         self._on_ui_row_changed(model, path, model.get_iter(path))
 
+    def _attach(self):
+        self.server = self._reactor.attach(self)
+
     def set_stream_active(self, stream_active):
         self._stream_active = stream_active
         for each in self._message_handlers:
@@ -1404,27 +1561,45 @@ class IRCConnection(Gtk.TreeRowReference, threading.Thread):
                     if each[0] in "#&":
                         self.server.part(each)
 
-            self._queue.append(deferred)
+            self._reactor.call(deferred)
 
     def _channels_invalidate(self):
         for each in self._message_handlers:
             each.channels_invalidate()
 
-    def _on_privmsg_ready(self, handler, targets, message, delay):
+    def _on_privmsg_ready(self, handler, batch):
         if self._have_welcome:
-            chan_targets = [x.split(":")[0] for x in targets if x[0] in "#&"]
-            user_targets = [x for x in targets if x[0] not in "#&"]
-
             def deferred():
-                self.server.privmsg_many(chan_targets, message)
-                for target in user_targets:
-                    self.server.notice(target, message)
+                for chan_targets, user_targets, message, delay in batch:
+                    send = partial(self._outbox.append, partial(
+                            self._privmsg, chan_targets, user_targets, message))
+                    if delay:
+                        self.server.execute_delayed(delay, send)
+                    else:
+                        send()
 
-            if delay:
-                self._queue.append(
-                    lambda: self.server.execute_delayed(delay, deferred))
-            else:
-                self._queue.append(deferred)
+            self._reactor.call(deferred)
+
+    def _privmsg(self, chan_targets, user_targets, message):
+        if chan_targets:
+            self.server.privmsg_many(chan_targets, message)
+        for target in user_targets:
+            self.server.notice(target, message)
+
+    def send_due(self):
+        """When the next queued message may go, None if there are none."""
+
+        return self._next_send if self._outbox else None
+
+    def send_pending(self, now):
+        """Send queued messages as the rate limit allows. Reactor thread."""
+
+        while self._outbox and now >= self._next_send:
+            try:
+                self._outbox.popleft()()
+            except client.ServerConnectionError as e:
+                print(e)
+            self._next_send = now + self.SEND_INTERVAL
 
     def _on_ui_row_changed(self, model, path, iter):
         if path == self.get_path():
@@ -1454,6 +1629,17 @@ class IRCConnection(Gtk.TreeRowReference, threading.Thread):
                         username,
                         ircname)
 
+                    def retry(delays):
+                        try:
+                            delay = delays[0]
+                        except IndexError:
+                            print("No more connection attempts")
+                            self._ui_set_nick("")
+                        else:
+                            print("%d more tries" % len(delays))
+                            self.server.execute_delayed(delay, try_connect,
+                                                        delays[1:])
+
                     def try_connect(*delays):
                         model = ref.get_model()
                         path = ref.get_path()
@@ -1463,19 +1649,51 @@ class IRCConnection(Gtk.TreeRowReference, threading.Thread):
 
                         print("Attempting to connect IRC %s:%d" % (
                             hostname, port))
+                        # Name lookup and connect can take a long time so
+                        # they are kept off the shared reactor thread.
+                        self._connect_attempt += 1
+                        thread = threading.Thread(
+                            target=open_socket,
+                            args=(self._connect_attempt, delays))
+                        thread.daemon = True
+                        thread.start()
+
+                    def open_socket(attempt, delays):
                         try:
-                            connect()
-                        except client.ServerConnectionError as e:
-                            print(e)
+                            sock = socket.create_connection(
+                                (hostname, port), self.CONNECT_TIMEOUT)
+                        except OSError as e:
+                            sock, error = None, e
+                        else:
+                            sock.settimeout(None)
+                            error = None
+                        self._reactor.call(partial(
+                            socket_opened, attempt, delays, sock, error))
+
+                    def socket_opened(attempt, delays, sock, error):
+                        if attempt != self._connect_attempt:
+                            if sock is not None:
+                                sock.close()
+                            return  # Superseded by a newer attempt.
+
+                        if sock is not None:
                             try:
-                                delay = delays[0]
-                            except IndexError:
-                                print("No more connection attempts")
-                                self._ui_set_nick("")
-                            else:
-                                print("%d more tries" % len(delays))
-                                self.server.execute_delayed(delay, try_connect,
-                                                            delays[1:])
+                                connect(connect_factory=lambda addr: sock)
+                            except TypeError:
+                                # Old API compatibility: no connect_factory.
+                                sock.close()
+                                try:
+                                    connect()
+                                except client.ServerConnectionError as e:
+                                    error = e
+                            except client.ServerConnectionError as e:
+                                sock.close()
+                                error = e
+
+                        if error is not None:
+                            print("IRC connection to %s:%d failed: %s" % (
+                                hostname, port, error))
+                            retry(delays)
                         else:
                             self._ui_set_nick(nickname)
                             print("New IRC connection: %s@%s:%d" % (
@@ -1484,29 +1702,14 @@ class IRCConnection(Gtk.TreeRowReference, threading.Thread):
                     try_connect(1, 2, 3)
             else:
                 def deferred():
+                    self._connect_attempt += 1  # Drop any in progress.
                     try:
                         self.server.disconnect()
                     except client.ServerConnectionError as e:
                         print(str(e), file=sys.stderr)
                     self._ui_set_nick("")
 
-            self._queue.append(deferred)
-
-    def run(self):
-        for event in events.all:
-            try:
-                target = getattr(self, "_on_" + event)
-            except AttributeError:
-                target = self._generic_handler
-            self.server.add_global_handler(event, target)
-
-        while self._keepalive:
-            while len(self._queue):
-                self._queue.pop(0)()
-
-            self.reactor.process_once(0.2)
-
-        self.reactor.process_once()
+            self._reactor.call(deferred)
 
     def cleanup(self):
         for each in self._message_handlers:
@@ -1514,23 +1717,20 @@ class IRCConnection(Gtk.TreeRowReference, threading.Thread):
         for obj, handler_id in self._hooks:
             obj.disconnect(handler_id)
 
-        if self.server.is_connected():
-            def deferred():
-                self.server.add_global_handler("disconnect", self.end_thread)
-                try:
-                    self.server.disconnect()
-                except client.ServerConnectionError as e:
-                    print(str(e), file=sys.stderr)
-                self._ui_set_nick("")
-
-            self._queue.append(deferred)
-        else:
-            self._keepalive = False
-
-        self.join(1.0)
+        self._reactor.call(self._detach)
+        self._detached.wait(1.0)
 
-    def end_thread(self, server, event):
-        self._keepalive = False
+    def _detach(self):
+        self._connect_attempt += 1  # A socket still opening is discarded.
+        self._outbox.clear()
+        try:
+            if self.server.is_connected():
+                self.server.disconnect()
+        except client.ServerConnectionError as e:
+            print(str(e), file=sys.stderr)
+        finally:
+            self._reactor.detach(self.server)
+            self._detached.set()
 
     @threadslock
     def _ui_set_nick(self, nickname):
@@ -1610,6 +1810,7 @@ class IRCConnection(Gtk.TreeRowReference, threading.Thread):
 
     def _on_disconnect(self, server, event):
         self._have_welcome = False
+        self._outbox.clear()
         self._ui_set_nick("")
         print(event.source, "disconnected")
 
@@ -1702,8 +1903,7 @@ class MessageHandler(GObject.GObject):
 
         'privmsg-ready': (
             GObject.SignalFlags.RUN_LAST | GObject.SignalFlags.ACTION,
-            None, (GObject.TYPE_PYOBJECT,
-                   GObject.TYPE_STRING, GObject.TYPE_INT)
+            None, (GObject.TYPE_PYOBJECT, )
         )
 
     }
@@ -1732,11 +1932,34 @@ class MessageHandler(GObject.GObject):
 
     subst = dict.fromkeys(subst_keys, "<No data>")
 
+    _subst_re = re.compile("%[%" + "".join(x[1] for x in subst_tokens) + "]")
+
+    @classmethod
+    def compile_message(cls, text):
+        """A str.format_map template doing the % substitutions of text.
+
+        Substitutions are made in one pass so the inserted text is never
+        itself substituted.
+        """
+
+        fields = dict(zip(cls.subst_tokens, cls.subst_keys))
+        parts = []
+        start = 0
+        for match in cls._subst_re.finditer(text):
+            parts.append(text[start:match.start()].replace(
+                                        "{", "{{").replace("}", "}}"))
+            token = match.group()
+            parts.append("%" if token == "%%" else "{%s}" % fields[token])
+            start = match.end()
+        parts.append(text[start:].replace("{", "{{").replace("}", "}}"))
+        return "".join(parts)
+
     def __init__(self, model, path, stream_active):
         super(MessageHandler, self).__init__()
         self.tree_row_ref = Gtk.TreeRowReference(model, path)
 
         self._channels = frozenset()
+        self._plan = None
         self._stream_active = stream_active
         model.connect("row-inserted", self.channels_evaluate)
         model.connect("row-deleted", self.channels_evaluate)
@@ -1771,6 +1994,7 @@ class MessageHandler(GObject.GObject):
     def channels_evaluate(self, model, path, iter=None):
         pp = self.tree_row_ref.get_path()
         if path[:-1] == pp:
+            self._plan = None
             nc = set()
 
             iter = model.iter_children(model.get_iter(pp))
@@ -1807,27 +2031,51 @@ class MessageHandler(GObject.GObject):
         else:
             raise AttributeError("unknown property '%s'" % prop.name)
 
-    def issue_messages(self, delay_calc=lambda row: 0, forced_message=None):
-        model = self.tree_row_ref.get_model()
-        iter = model.get_iter(self.tree_row_ref.get_path())
-        iter = model.iter_children(iter)
+    def _compile_plan(self, model):
+        """(row reference, template, channel targets, user targets) of rows.
+
+        Row references follow their rows as rows above them come and go.
+        Whether a row is active depends on its ancestors too so that is
+        left for issue time.
+        """
+
+        plan = []
+        iter = model.iter_children(model.get_iter(
+                                                self.tree_row_ref.get_path()))
         while iter is not None:
             path = model.get_path(iter)
-            if model.path_is_active(path):
-                row = model[path]
-                delay_s = delay_calc(row)
-                if delay_s is not None:
-                    targets = [x.split("!")[0]
-                               for x in row.channels.split(",")]
-                    table = [("%%", "%")] + list(zip(self.subst_tokens, (
-                        self.subst[x] for x in self.subst_keys)))
-                    if forced_message is not None:
-                        message = string_multireplace(forced_message, table)
-                    else:
-                        message = string_multireplace(row.message, table)
-                    self.emit("privmsg-ready", targets, message, delay_s)
-
+            row = model[path]
+            targets = [x.split("!")[0] for x in row.channels.split(",") if x]
+            try:
+                template = self.compile_message(row.message)
+            except KeyError:
+                template = None  # Row type has no message.
+            plan.append((Gtk.TreeRowReference(model, path), template,
+                         [x.split(":")[0] for x in targets if x[0] in "#&"],
+                         [x for x in targets if x[0] not in "#&"]))
             iter = model.iter_next(iter)
+        return plan
+
+    def issue_messages(self, delay_calc=lambda row: 0, forced_message=None):
+        """Emit the messages of all active rows as one batch."""
+
+        model = self.tree_row_ref.get_model()
+        if self._plan is None:
+            self._plan = self._compile_plan(model)
+        if forced_message is not None:
+            forced_message = self.compile_message(forced_message)
+
+        batch = []
+        for ref, template, chan_targets, user_targets in self._plan:
+            path = ref.get_path()
+            if path is None or not model.path_is_active(path):
+                continue
+            delay_s = delay_calc(model[path])
+            if delay_s is not None:
+                message = (forced_message or template).format_map(self.subst)
+                batch.append((chan_targets, user_targets, message, delay_s))
+        if batch:
+            self.emit("privmsg-ready", batch)
 
 
 class MessageHandlerForType_3(MessageHandler):
@@ -39,6 +39,7 @@ from .gtkstuff import threadslock
 from .gtkstuff import timeout_add, source_remove
 from .tooltips import set_tip
 from .utils import LinkUUIDRegistry
+from .sessionstore import get_session_store
 
 _ = gettext.translation(FGlobs.package_name, FGlobs.localedir,
                         fallback=True).gettext
@@ -495,11 +496,8 @@ class EffectBank(Gtk.Frame):
             print("failed to read effects session file")
 
     def save_session(self, where):
-        try:
-            with open((where or PM.basedir) / self.session_filename, "w") as f:
-                f.write(self.marshall())
-        except IOError:
-            print("failed to write effects session file")
+        get_session_store().write((where or PM.basedir) / self.session_filename,
+                                  str, self.marshall())
 
     def update_leds(self, bits):
         for bit, each in enumerate(self.effects):
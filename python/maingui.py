@@ -30,6 +30,7 @@ import collections
 import json
 import uuid
 import ctypes
+import struct
 from binascii import hexlify, unhexlify
 
 import dbus
@@ -53,6 +54,9 @@ from .gtkstuff import threadslock, WindowSizeTracker, ConfirmationDialog
 from .gtkstuff import IconChooserButton, IconPreviewFileChooserDialog, LEDDict
 from .gtkstuff import LabelSubst, gdklock, nullcm
 from .gtkstuff import idle_add, timeout_add, timeout_add_seconds, source_remove
+from .gtkstuff import io_add_watch
+from .mixerchannel import MixerChannel, reply_line
+from .sessionstore import get_session_store
 from . import midicontrols
 from .tooltips import set_tip
 from . import songdb
@@ -132,6 +136,129 @@ class FreewheelButton(Gtk.Button):
             )
 
 
+class MeterFrameReader(object):
+    """Receiving end of the binary meter channel.
+
+    The backend pushes fixed size frames down a FIFO. The layout is defined
+    in c/meterframe.h and each write is atomic so reads always land on frame
+    boundaries. Only the most recent frame is of interest.
+    """
+
+    MAGIC = 0x5254454D
+    VERSION = 1
+    PLAYERS = ("left", "right", "interlude", "jingles")
+    PLAYER_KEYS = ("elapsed", "playing", "signal", "cid", "audio_runout",
+                   "silence")
+
+    # Bits of the aux_flags field.
+    AUX_MIDI = 0x1
+    AUX_SESSION = 0x2
+    AUX_METADATA = 0x4
+
+    def __init__(self, pathname, n_mics):
+        self.pathname = pathname
+        self.n_mics = n_mics
+        self._struct = struct.Struct(
+            "=IHHII4iIii" + "5if" * len(self.PLAYERS) + "4i" * n_mics)
+        self.size = self._struct.size
+        self._buffer = bytearray(self.size * 16)
+        self._fd = self._keepalive_fd = None
+        self._last_ports = self._last_effects = None
+        # Field names in frame order after the header and aux_flags.
+        names = ["str_l_peak", "str_r_peak", "str_l_rms", "str_r_rms",
+                 "port_connection_count", "effects_playing", "freewheel_mode"]
+        for player in self.PLAYERS:
+            names.extend("%s_%s" % (player, key) for key in self.PLAYER_KEYS)
+        self._names = names
+        self._mic_base = 5 + len(names)
+
+    def open(self):
+        try:
+            os.unlink(self.pathname)
+        except OSError:
+            pass
+        try:
+            os.mkfifo(self.pathname, 0o600)
+            self._fd = os.open(self.pathname, os.O_RDONLY | os.O_NONBLOCK)
+            # Holding a write end ourselves means no POLLHUP when the backend
+            # restarts.
+            self._keepalive_fd = os.open(self.pathname, os.O_WRONLY)
+        except OSError as e:
+            print("meter channel unavailable:", e)
+            self.close()
+            return False
+        return True
+
+    def close(self):
+        for fd in (self._fd, self._keepalive_fd):
+            if fd is not None:
+                os.close(fd)
+        self._fd = self._keepalive_fd = None
+
+    def fileno(self):
+        return self._fd
+
+    def bind(self, vumap):
+        """Precompute (frame index, meter) pairs for the keys in vumap."""
+
+        self._targets = [(i + 5, vumap[name]) for i, name in
+                         enumerate(self._names) if name in vumap and
+                         name not in ("effects_playing",)]
+        self._mics = [(self._mic_base + i * 4, vumap["mic_%d_levels" % (i + 1)])
+                      for i in range(self.n_mics)
+                      if "mic_%d_levels" % (i + 1) in vumap]
+
+    def read(self):
+        """Drain the FIFO and return the latest frame as a tuple or None."""
+
+        view = memoryview(self._buffer)
+        got = 0
+        while 1:
+            try:
+                n = os.readv(self._fd, [view])
+            except BlockingIOError:
+                break
+            if n <= 0:
+                break
+            got = n
+            if n < len(self._buffer):
+                break
+        if got < self.size:
+            return None
+
+        frame = self._struct.unpack_from(self._buffer,
+                                         (got // self.size - 1) * self.size)
+        if frame[0] != self.MAGIC or frame[1] != self.VERSION or \
+                frame[2] != self.n_mics:
+            raise ValueError("bad meter frame")
+        return frame
+
+    def apply(self, frame):
+        """Update meters from a frame.
+
+        Return value is aux_flags, ports connections changed, effects.
+        Like the line protocol effects is -1 for no change.
+        """
+
+        for i, meter in self._targets:
+            meter.set_meter_value(frame[i])
+        for i, meter in self._mics:
+            meter.set_meter_values(*frame[i:i + 4])
+
+        ports = frame[9]
+        cons_changed = self._last_ports is not None and \
+            ports != self._last_ports
+        self._last_ports = ports
+
+        effects = frame[10]
+        if effects == self._last_effects:
+            effects = -1
+        else:
+            self._last_effects = effects
+
+        return frame[4], cons_changed, effects
+
+
 class MenuMixin(object):
 
     def build(self, menu, autowipe=False, use_underline=True):
@@ -1753,7 +1880,9 @@ class peakholdmeter(BasicMeter):
 class MicMeter(Gtk.VBox):
 
     def set_meter_value(self, newvals):
-        gain, red, yellow, green = (int(x) for x in newvals.split(","))
+        self.set_meter_values(*(int(x) for x in newvals.split(",")))
+
+    def set_meter_values(self, gain, red, yellow, green):
         self.peak.set_meter_value(gain)
         self.attenuation.set_meter_value(red, yellow, green)
 
@@ -1983,6 +2112,10 @@ class idjc_shutdown_dialog:
 
 class MainWindow(dbus.service.Object):
 
+    # Binary meter frames arrive every 50 ms. After this long without one
+    # the meters are polled instead.
+    METER_WATCHDOG_MS = 500
+
     def send_new_mixer_stats(self):
 
         deckadj = deck2adj = self.deckadj.get_value()
@@ -2495,72 +2628,38 @@ class MainWindow(dbus.service.Object):
             print("saving template only")
             return True
 
-        try:
-            with open(session_filename, "w") as fh:
-                fh.write("deckvol=" + str(self.deckadj.get_value()) + "\n")
-                fh.write("deck2vol=" + str(self.deck2adj.get_value()) + "\n")
-                fh.write("crossfade=" + str(self.crossadj.get_value()) + "\n")
-                fh.write("stream_mon=" +
-                         str(int(self.listen_stream.get_active())) + "\n")
-                fh.write("tracks_played=" +
-                         str(int(self.history_expander.get_expanded())) + "\n")
-                fh.write("pass_speed=" +
-                         str(self.passspeed_adj.get_value()) + "\n")
-                fh.write(
-                    "prefs={}\n".format(
-                        int(self.prefs_window.window.is_visible())
-                    )
-                )
-                fh.write(
-                    "server={}\n".format(
-                        int(self.prefs_window.window.is_visible())
-                    )
-                )
-                fh.write("prefspage=" +
-                         str(self.prefs_window.notebook.get_current_page()) +
-                         "\n")
-                fh.write("metadata_src=" +
-                         str(self.metadata_source.get_active()) + "\n")
-                fh.write("crosstype=" +
-                         str(self.crosspattern.get_active()) + "\n")
-                fh.write("hpane=" +
-                         str(self.paned.get_position()) + "\n")
-                fh.write("vpane=" +
-                         str(self.leftpane.get_position()) + "\n")
-                fh.write("cw_tree=" +
-                         self.topleftpane.get_col_widths("tree") + "\n")
-                fh.write("cw_flat=" +
-                         self.topleftpane.get_col_widths("flat") + "\n")
-                fh.write("cw_catalogs=" +
-                         self.topleftpane.get_col_widths("catalogs") + "\n")
-                fh.write("dbpage=" +
-                         str(self.topleftpane.notebook.get_current_page()) +
-                         "\n")
-                fh.write("playerpage=" +
-                         str(self.player_nb.get_current_page()) + "\n")
-                fh.close()
-
-                # Save a list of files played and timestamps.
-                fh = open(session_filename + "_files_played", "wb")
-                cutoff = time.time() - 2592000  # 2592000 = 30 days.
-                recent = {}
-                for key, value in self.files_played.items():
-                    if value > cutoff:
-                        recent[key] = value
-                pickle.Pickler(fh).dump(recent)
-                fh.close()
-
-        except Exception as e:
-            print("Error writing out main session data", e)
-
-        try:
-            fh = open(session_filename + "_tracks", "w")
-            start, end = self.history_buffer.get_bounds()
-            text = str(self.history_buffer.props.text)
-            fh.write(text)
-            fh.close()
-        except Exception as e:
-            print("Error writing out tracks played data", e)
+        store = get_session_store()
+        # Widget state is read here but written out by the session store.
+        store.write(session_filename, "".join, [
+            "deckvol=" + str(self.deckadj.get_value()) + "\n",
+            "deck2vol=" + str(self.deck2adj.get_value()) + "\n",
+            "crossfade=" + str(self.crossadj.get_value()) + "\n",
+            "stream_mon=" + str(int(self.listen_stream.get_active())) + "\n",
+            "tracks_played=" +
+            str(int(self.history_expander.get_expanded())) + "\n",
+            "pass_speed=" + str(self.passspeed_adj.get_value()) + "\n",
+            "prefs={}\n".format(int(self.prefs_window.window.is_visible())),
+            "server={}\n".format(int(self.prefs_window.window.is_visible())),
+            "prefspage=" +
+            str(self.prefs_window.notebook.get_current_page()) + "\n",
+            "metadata_src=" + str(self.metadata_source.get_active()) + "\n",
+            "crosstype=" + str(self.crosspattern.get_active()) + "\n",
+            "hpane=" + str(self.paned.get_position()) + "\n",
+            "vpane=" + str(self.leftpane.get_position()) + "\n",
+            "cw_tree=" + self.topleftpane.get_col_widths("tree") + "\n",
+            "cw_flat=" + self.topleftpane.get_col_widths("flat") + "\n",
+            "cw_catalogs=" +
+            self.topleftpane.get_col_widths("catalogs") + "\n",
+            "dbpage=" +
+            str(self.topleftpane.notebook.get_current_page()) + "\n",
+            "playerpage=" + str(self.player_nb.get_current_page()) + "\n"])
+
+        # Save a list of files played and timestamps.
+        store.write(session_filename + "_files_played", self._files_played_data,
+                    dict(self.files_played))
+
+        store.write(session_filename + "_tracks", str,
+                    self.history_buffer.props.text)
 
         self.prefs_window.save_player_prefs(where)
         self.controls.save_prefs(where)
@@ -2568,7 +2667,7 @@ class MainWindow(dbus.service.Object):
 
         # Build links directory when in session mode.
         if pm.profile is None:
-            link_uuid_reg.clear()
+            links = []
             for row in itertools.chain(self.player_left.liststore,
                                        self.player_right.liststore,
                                        self.jingles.interlude.liststore):
@@ -2578,22 +2677,44 @@ class MainWindow(dbus.service.Object):
                 except:
                     pass
                 else:
-                    link_uuid_reg.add(uuid_, row[1])
+                    links.append((uuid_, row[1]))
 
             effects = self.jingles.all_effects
             for uuid_, pathname in ((x.uuid, x.pathname) for x in effects):
                 if pathname is not None:
-                    link_uuid_reg.add(str(uuid_), pathname)
+                    links.append((str(uuid_), pathname))
 
-            link_uuid_reg.update(PathStr(where or pm.basedir) / "links")
+            link_dir = PathStr(where or pm.basedir) / "links"
+            if (link_dir, links) != self._session_links:
+                self._session_links = (link_dir, links)
+                store.call(self._update_links, link_dir, links)
+                if trigger != "periodic":
+                    # Effects resolve their links here on the main thread.
+                    store.flush()
 
         self.player_left.save_session(where)
         self.player_right.save_session(where)
         self.jingles.save_session(where)
         # JACK ports are saved at the moment of change, not here.
 
+        if trigger != "periodic":
+            store.flush()
+
         return True  # This is also a timeout routine
 
+    @staticmethod
+    def _files_played_data(files_played):
+        cutoff = time.time() - 2592000  # 2592000 = 30 days.
+        recent = {k: v for k, v in files_played.items() if v > cutoff}
+        return pickle.dumps(recent)
+
+    @staticmethod
+    def _update_links(link_dir, links):
+        link_uuid_reg.clear()
+        for uuid_, pathname in links:
+            link_uuid_reg.add(uuid_, pathname)
+        link_uuid_reg.update(link_dir)
+
     def restore_session(self):
         try:
             fh = open(pm.basedir / self.session_filename, "r")
@@ -2673,6 +2794,7 @@ class MainWindow(dbus.service.Object):
             print("disregarding out of date track history text")
 
     def destroy_hard(self, widget=None, data=None):
+        self._shutting_down = True
         if self.session_loaded:
             self.freewheel_button.set_active(False)
             self.save_session("atexit")
@@ -2688,6 +2810,7 @@ class MainWindow(dbus.service.Object):
         exit(5)
 
     def destroy(self, widget=None, data=None):
+        self._shutting_down = True
         self.freewheel_button.set_active(False)
         self.save_session("atexit")
         if self.crosspass:
@@ -2703,14 +2826,17 @@ class MainWindow(dbus.service.Object):
         self.prefs_window.songdbprefs.disconnect()
         source_remove(self.statstimeout)
         source_remove(self.vutimeout)
+        if self._meter_watchdog is not None:
+            source_remove(self._meter_watchdog)
         source_remove(self.savetimeout)
         self._mixer_ctrl.close()
+        self.meter_reader.close()
         self.quitting()
         self.window.hide()
         self.prefs_window.window.hide()
         self.server_window.window.hide()
         if pm.profile_dialog:
-			pm.profile_dialog.hide()
+            pm.profile_dialog.hide()
 
         if Gtk.main_level():
             Gtk.main_quit()
@@ -2776,76 +2902,227 @@ class MainWindow(dbus.service.Object):
                 print("launching backend")
             else:
                 print(str(e))
-            for i in range(1, 4 if self.session_loaded else 2):
-                print("backend launch attempt", i)
+            if self._backend_launch(message != "bootstrap") and \
+                                                    message != "bootstrap":
+                self.mixer_write(message, target)
 
-                read = ctypes.c_int()
-                write = ctypes.c_int()
-                if not self.backend.init_backend(ctypes.byref(read),
-                                                 ctypes.byref(write)):
-                    print("call to init_backend failed")
-                    continue
+    def _backend_launch(self, restore):
+        """Start the backend, restoring its settings after a crash.
 
-                try:
-                    self._mixer_ctrl = os.fdopen(write.value, "w")
-                    self._mixer_rply = os.fdopen(read.value, "r")
-                except OSError:
-                    "failed to open streams to backend"
-                    continue
-
-                print("awaiting reply")
-
-                for j in range(10):
-                    reply = self.mixer_read()
-                    print("got", reply)
-                    if reply == "idjc backend ready\n":
-                        break
-                else:
-                    print("bad response from newly started backend")
-                    continue
-
-                if FGlobs.have_libmpg123:
-                    self.mixer_write("ACTN=mp3_getstatus\nend\n")
-                    self.mp3status = int(self.mixer_read())
-
-                if message != "bootstrap":
-                    # Restore previous settings.
-                    self.send_new_mixer_stats()
-                    self.prefs_window.mic_controls_backend_update()
-                    self.prefs_window.voip_pan_backend_update()
-                    self.player_left.next.clicked()
-                    self.player_right.next.clicked()
-                    self.jingles.interlude.next.clicked()
-                    self.server_window.source_client_open()
-                    self.comms_reply_pending = False
-                    self.server_window.restart_streams_and_recorders()
-                    self.jack.restore()
-                    self.mixer_write(message, target)
-                break
+        Return value is True when the backend was started.
+        """
+
+        for i in range(1, 4 if self.session_loaded else 2):
+            print("backend launch attempt", i)
+
+            read = ctypes.c_int()
+            write = ctypes.c_int()
+            if not self.backend.init_backend(ctypes.byref(read),
+                                             ctypes.byref(write)):
+                print("call to init_backend failed")
+                continue
+
+            if self._mixer_channel is not None:
+                self._mixer_channel.close()
+            try:
+                self._mixer_ctrl = os.fdopen(write.value, "w")
+            except OSError:
+                "failed to open streams to backend"
+                continue
+            self._mixer_channel = MixerChannel(read.value,
+                                               self._cb_mixer_eof)
+
+            print("awaiting reply")
+
+            for j in range(10):
+                reply = self.mixer_read()
+                print("got", reply)
+                if reply == "idjc backend ready\n":
+                    break
             else:
-                print("giving up")
-                self.destroy_hard()
+                print("bad response from newly started backend")
+                continue
+
+            if FGlobs.have_libmpg123:
+                self.mixer_write("ACTN=mp3_getstatus\nend\n")
+                self.mp3status = int(self.mixer_read())
+
+            if restore:
+                # Restore previous settings.
+                self.send_new_mixer_stats()
+                self.prefs_window.mic_controls_backend_update()
+                self.prefs_window.voip_pan_backend_update()
+                self.player_left.next.clicked()
+                self.player_right.next.clicked()
+                self.jingles.interlude.next.clicked()
+                self.server_window.source_client_open()
+                self.comms_reply_pending = False
+                self.server_window.restart_streams_and_recorders()
+                self.jack.restore()
+                if self.meter_reader.fileno() is not None:
+                    if self._meter_channel_enable():
+                        self._meter_frame_time = time.monotonic()
+                    else:
+                        self._meters_fallback()
+            return True
+        else:
+            print("giving up")
+            self.destroy_hard()
+            return False
+
+    def _cb_mixer_eof(self, channel):
+        """The backend closed the reply pipe, which means it went away.
+
+        In binary meter mode nothing else writes to the backend regularly
+        so the restart is made here rather than waiting on the next write.
+        """
+
+        if channel is not self._mixer_channel or self._shutting_down:
+            return
+        print("backend reply channel closed -- restarting the backend")
+        try:
+            self._mixer_ctrl.close()
+        except (IOError, ValueError):
+            pass
+        self._backend_launch(True)
 
     def mixer_read(self, iters=0):
         if iters == 5:
             self.destroy_hard()
         try:
-            line = self._mixer_rply.readline()
+            line = self._mixer_channel.readline()
         except IOError as e:
             print(str(e))
             line = self.mixer_read(iters + 1)
-        if line == "Segmentation Fault\n":
-            line = ""
-            print("Mixer reports a segmentation fault")
-            self._mixer_rply.close()
+        if self._mixer_channel.crashed:
+            self._mixer_channel.close()
             self._mixer_ctrl.close()
         return line
 
+    def mixer_request(self, message, parser, target="mx", ends=()):
+        """Send a command without waiting for the reply.
+
+        parser: generator that is sent the reply lines and returns the result
+        ends: the lines that can close the reply, see MixerRequest
+        Return value is a MixerRequest, a future of the parser's result.
+        """
+
+        self.mixer_write(message, target)
+        return self._mixer_channel.request(parser, ends)
+
+    def _read_reply_values(self, session_ns, player_metadata):
+        """Parse key=value lines from the backend up to 'end'.
+
+        Session and metadata lines are sorted into the supplied containers.
+        Return value is a dict of the rest or None if the pipe closed.
+        """
+
+        values = {}
+        while 1:
+            line = self.mixer_read().rstrip()
+            if line == "":
+                return None
+
+            if line == "end":
+                return values
+
+            if not line.count("="):
+                print(line)
+                continue
+
+            key, value = line.split("=", 1)
+
+            if key == "midi":
+                values[key] = value
+                continue
+
+            if key.startswith("session_"):
+                session_ns[key[8:]] = value
+                continue
+
+            if key.endswith("_silence"):
+                try:
+                    value = float(value)
+                except ValueError:
+                    pass
+            else:
+                try:
+                    value = int(value)
+                except ValueError:
+                    pass
+
+            if key.endswith("_new_metadata"):
+                if not key.startswith("jingles"):
+                    if key.startswith("interlude"):
+                        target = self.jingles.interlude
+                    else:
+                        target = getattr(
+                            self,
+                            "player_" +
+                            key.split("_", 1)[0]
+                        )
+                    player_metadata.append((target, value))
+                continue
+
+            values[key] = value
+
+    def _meter_channel_enable(self):
+        """Ask the backend to push binary meter frames."""
+
+        self.mixer_write("ACTN=meterchannel\nFLAG=1\nend\n")
+        return self.mixer_read().rstrip() == "meterchannel=1"
+
+    def _meters_start(self):
+        """Begin meter updates using whichever transport is available."""
+
+        want_binary = args.meters is None or args.meters[0] == "binary"
+        if want_binary and self.meter_reader.open():
+            self.meter_reader.bind(self.vumap)
+            if self._meter_channel_enable():
+                self.vutimeout = io_add_watch(self.meter_reader.fileno(),
+                                              GLib.IO_IN, self._cb_meter_frame)
+                self._meter_frame_time = time.monotonic()
+                self._meter_watchdog = timeout_add(
+                    self.METER_WATCHDOG_MS, self._cb_meter_watchdog)
+                print("meter levels by binary frames")
+                return
+            self.meter_reader.close()
+
+        print("meter levels by line protocol")
+        self.vutimeout = timeout_add(50, self.vu_update)
+
+    def _meters_fallback(self):
+        """Switch from binary frames to the line protocol."""
+
+        print("meter channel lost -- reverting to line protocol")
+        source_remove(self.vutimeout)
+        if self._meter_watchdog is not None:
+            source_remove(self._meter_watchdog)
+            self._meter_watchdog = None
+        self.meter_reader.close()
+        self.vutimeout = timeout_add(50, self.vu_update)
+
+    @threadslock
+    def _cb_meter_watchdog(self):
+        """Poll instead should frames stop, as they do if the backend hangs.
+
+        The requestlevels writes then find a crashed backend too.
+        """
+
+        if time.monotonic() - self._meter_frame_time > \
+                                            self.METER_WATCHDOG_MS / 1000.0:
+            print("no meter frame for %d ms" % self.METER_WATCHDOG_MS)
+            self._meters_fallback()
+            return False
+        return True
+
+    def _cb_meter_frame(self, source, condition):
+        self._meter_frame_time = time.monotonic()
+        return self.vu_update()
+
     def vu_update(self, locking=True, vu_update_counter=[0]):
         session_ns = {}
         player_metadata = []
-        midis = ''
-        cons_changed = False
 
         with (gdklock if locking else nullcm)():
             if not Gtk.main_level():
@@ -2855,65 +3132,48 @@ class MainWindow(dbus.service.Object):
             if vu_update_counter[0] % 20 == 0:
                 self.heartbeat()
 
-            try:
-                self.mixer_write("ACTN=requestlevels\nend\n")
-            except (ValueError, IOError):
-                return True
-
-            while 1:
-                line = self.mixer_read().rstrip()
-                if line == "":
+            if self.meter_reader.fileno() is not None:
+                try:
+                    frame = self.meter_reader.read()
+                except ValueError as e:
+                    print(e)
+                    self._meters_fallback()
+                    return False
+                if frame is None:
                     return True
 
-                if line == "end":
-                    break
-
-                if not line.count("="):
-                    print(line)
-                    continue
-
-                key, value = line.split("=", 1)
-
-                if key == "midi":
-                    midis = value
-                    continue
-
-                if key.startswith("session_"):
-                    session_ns[key[8:]] = value
-                    continue
+                aux, cons_changed, ep = self.meter_reader.apply(frame)
+                values = {}
+                if aux:
+                    try:
+                        self.mixer_write("ACTN=requestaux\nend\n")
+                    except (ValueError, IOError):
+                        return True
+                    values = self._read_reply_values(session_ns,
+                                                     player_metadata)
+                    if values is None:
+                        return True
+            else:
+                try:
+                    self.mixer_write("ACTN=requestlevels\nend\n")
+                except (ValueError, IOError):
+                    return True
 
-                if key == "ports_connections_changed":
-                    cons_changed = value != "0"
+                values = self._read_reply_values(session_ns, player_metadata)
+                if values is None:
+                    return True
 
-                if key.endswith("_silence"):
+                for key, value in values.items():
                     try:
-                        value = float(value)
-                    except ValueError:
-                        pass
-                else:
-                    try:
-                        value = int(value)
-                    except ValueError:
+                        self.vumap[key].set_meter_value(value)
+                    except KeyError:
                         pass
+                        # print "key value", key, "missing from vumap"
 
-                if key.endswith("_new_metadata"):
-                    if not key.startswith("jingles"):
-                        if key.startswith("interlude"):
-                            target = self.jingles.interlude
-                        else:
-                            target = getattr(
-                                self,
-                                "player_" +
-                                key.split("_", 1)[0]
-                            )
-                        player_metadata.append((target, value))
-                    continue
+                cons_changed = values.get("ports_connections_changed", 0) != 0
+                ep = int(self.effects_playing)
 
-                try:
-                    self.vumap[key].set_meter_value(value)
-                except KeyError:
-                    pass
-                    # print "key value", key, "missing from vumap"
+            midis = values.get("midi", "")
 
             if self.jingles.playing is True and \
                     int(self.jingles_playing) == 0:
@@ -2927,17 +3187,17 @@ class MainWindow(dbus.service.Object):
                     input, _, value = midi.partition(':')
                     self.controls.input(input, int(value, 16))
 
-            if session_ns["command"] == "save_L1" and pm.session_type == "L1":
+            command = session_ns.get("command", "")
+            if command == "save_L1" and pm.session_type == "L1":
                 self.jack.session_save()
                 self.save_session("L1")
-            if session_ns["command"].endswith("_JACK") and \
+            if command.endswith("_JACK") and \
                     pm.session_type == "JACK":
                 self.handle_jack_session(**session_ns)
 
             if cons_changed:
                 self.jack.standard_save()
 
-            ep = int(self.effects_playing)
             if ep != -1:
                 self.jingles.update_effect_leds(ep)
 
@@ -2988,14 +3248,13 @@ class MainWindow(dbus.service.Object):
         print("## Restored session commandline will be:", commandline)
 
         # Reply to backend confirms save has took place.
-        self.mixer_write("ACTN=session_reply\nsession_event=%s\n"
-                         "session_commandline=%s\n" % (
-                             event, commandline))
-        self.mixer_read()
-        # At this point the session event has been disposed of.
+        request = self.mixer_request("ACTN=session_reply\nsession_event=%s\n"
+                                     "session_command=%s\nend\n" % (
+                                         event, commandline), reply_line())
 
         if command == "saveandquit":
-            self.destroy()
+            # Once the session event has been disposed of.
+            request.add_done_callback(lambda request: self.destroy())
 
     @threadslock
     def stats_update(self):
@@ -3141,6 +3400,13 @@ class MainWindow(dbus.service.Object):
         # For IPC.
         os.environ["ui2be"] = pm.basedir / "ui2be"
         os.environ["be2ui"] = pm.basedir / "be2ui"
+        os.environ["be2ui_meter"] = pm.basedir / "be2ui_meter"
+        os.environ["be2ui_events"] = pm.basedir / "be2ui_events"
+        self.meter_reader = MeterFrameReader(os.environ["be2ui_meter"],
+                                             PGlobs.num_micpairs * 2)
+        self._mixer_channel = None
+        self._shutting_down = False
+        self._meter_watchdog = None
 
         print("jack client ID:", client_id)
 
@@ -4084,6 +4350,7 @@ class MainWindow(dbus.service.Object):
         self.session_filename = "main_session"
         self.files_played = {}
         self.files_played_offline = {}
+        self._session_links = None
 
         # Variable map for stuff read from the mixer
         self.vumap = {
@@ -4177,7 +4444,7 @@ class MainWindow(dbus.service.Object):
         self.prefs_window.load_player_prefs()
         self.prefs_window.apply_player_prefs()
 
-        self.vutimeout = timeout_add(50, self.vu_update)
+        self._meters_start()
         self.statstimeout = timeout_add(100, self.stats_update)
 
         self.savetimeout = timeout_add_seconds(
@@ -0,0 +1,653 @@
+"""Length and tag information from Ogg and libsndfile type media files.
+
+This replicates the answers the backend gives to ogginforequest and
+sndfileinforequest so that playlist imports need not tie up the mixer
+control channel. Media the code here can't vouch for raises
+UnsupportedMedia and may be handed to the backend as before.
+"""
+
+#   Copyright (C) 2026 Stephen Fairchild (s-fairchild@users.sourceforge.net)
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program in the file entitled COPYING.
+#   If not, see <http://www.gnu.org/licenses/>.
+
+
+__all__ = ["UnsupportedMedia", "OggInfo", "SndfileInfo", "ogg_info",
+           "sndfile_info"]
+
+
+import re
+import mmap
+import struct
+from collections import namedtuple
+
+from idjc import FGlobs
+
+
+class UnsupportedMedia(Exception):
+    """The file may be valid but it's not something handled here."""
+
+
+# The fields of an OIR: reply. Length is None when the reply is NOT VALID.
+OggInfo = namedtuple("OggInfo",
+                     "artist title album length replaygain rgloudness")
+
+# The fields of an idjcmixer: sndfileinfo reply.
+SndfileInfo = namedtuple("SndfileInfo", "artist title album length")
+
+# R128_TRACK_GAIN text that strtol reads to the end.
+_R128_GAIN = re.compile(r"(?:[+-]?[0-9]+)?")
+
+
+def _printf(value, single=False):
+    """Round trip a number as though through printf("%f")."""
+
+    if single:
+        value = struct.unpack("f", struct.pack("f", value))[0]
+    return float("%f" % value)
+
+
+def _text(data):
+    return data.decode("utf-8", "replace")
+
+
+def _mapfile(pathname):
+    with open(pathname, "rb") as f:
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Zero length file.
+            return b""
+
+
+# ---------------------------------------------------------------- Ogg ----
+
+_PAGE = struct.Struct("<4sBBqIIIB")
+
+_CONTINUED, _BOS, _EOS = 1, 2, 4
+
+
+class _Page(namedtuple("_Page", "offset size flags granule serial pageno "
+                                "lacing")):
+    @property
+    def eos(self):
+        return self.flags & _EOS
+
+    @property
+    def bos(self):
+        return self.flags & _BOS
+
+    @property
+    def continued(self):
+        return self.flags & _CONTINUED
+
+    @property
+    def packets(self):
+        """The number of packets that finish on this page."""
+
+        return sum(1 for x in self.lacing if x < 255)
+
+
+def _page_at(m, offset):
+    """The page starting at offset or None."""
+
+    try:
+        capture, version, flags, granule, serial, pageno, crc, nsegs = \
+                                                _PAGE.unpack_from(m, offset)
+    except struct.error:
+        return None
+    if capture != b"OggS" or version != 0:
+        return None
+    lacing = m[offset + 27:offset + 27 + nsegs]
+    if len(lacing) != nsegs:
+        return None
+    size = 27 + nsegs + sum(lacing)
+    if offset + size > len(m):
+        return None
+    return _Page(offset, size, flags, granule, serial, pageno, lacing)
+
+
+def _next_page(m, offset, end=None):
+    """The first page starting at or after offset."""
+
+    while 1:
+        offset = m.find(b"OggS", offset, len(m) if end is None else end)
+        if offset == -1:
+            return None
+        page = _page_at(m, offset)
+        if page is not None:
+            return page
+        offset += 1
+
+
+def _packets(m, page):
+    """Yield (packet, page, is_last_on_page) for a logical bitstream."""
+
+    serial = page.serial
+    partial = b""
+    while page is not None:
+        if page.serial == serial:
+            pos = page.offset + 27 + len(page.lacing)
+            last = max((i for i, x in enumerate(page.lacing) if x < 255),
+                       default=-1)
+            for i, seg in enumerate(page.lacing):
+                partial += m[pos:pos + seg]
+                pos += seg
+                if seg < 255:
+                    yield partial, page, i == last
+                    partial = b""
+            if page.eos:
+                return
+        page = _next_page(m, page.offset + page.size)
+
+
+def _find_last_page(m, bos, end):
+    """The end of stream page of the logical bitstream starting at bos.
+
+    A bisection narrows the search so only a small part of a long file
+    is read. Unterminated streams yield their final page.
+    """
+
+    last = bos
+    lo, hi = bos.offset, end
+    for depth in range(40):
+        if hi - lo < 65536:
+            break
+        page = _next_page(m, lo + (hi - lo) // 2, hi)
+        if page is not None and page.serial == bos.serial:
+            last = page
+            if page.eos:
+                return page
+            lo = page.offset
+        else:
+            hi = lo + (hi - lo) // 2
+
+    page = last
+    while page is not None and page.serial == bos.serial:
+        last = page
+        if page.eos:
+            break
+        page = _next_page(m, page.offset + page.size, end)
+    if not last.eos:
+        print("mediainfo: an unterminated stream was detected")
+    return last
+
+
+def _comments(data):
+    """The comments of a Vorbis comment header as (lower key, value)."""
+
+    pos = 0
+    (vendor_length,) = struct.unpack_from("<I", data, pos)
+    pos += 4 + vendor_length
+    (count,) = struct.unpack_from("<I", data, pos)
+    pos += 4
+    comments = []
+    for i in range(count):
+        (length,) = struct.unpack_from("<I", data, pos)
+        pos += 4
+        entry = data[pos:pos + length]
+        if len(entry) != length:
+            raise struct.error("truncated comment")
+        pos += length
+        key, sep, value = entry.partition(b"=")
+        if sep:
+            comments.append((_text(key).lower(), _text(value)))
+    return comments
+
+
+def _query(comments, key, multiple=True):
+    values = [v for k, v in comments if k == key]
+    if not values:
+        return None
+    return "/".join(values) if multiple else values[-1]
+
+
+class _Stream(object):
+    def __init__(self, bos, last):
+        self.bos = bos
+        self.last = last
+        self.samplerate = 0
+        self.initial_granule = 0
+        self.artist = self.title = self.album = ""
+        self.replaygain = self.rgloudness = ""
+
+    @property
+    def final_granule(self):
+        # Stored unsigned 32 bit by the backend.
+        return self.last.granule & 0xFFFFFFFF
+
+    @property
+    def duration(self):
+        if not self.samplerate:
+            return 0.0
+        return (self.final_granule - self.initial_granule) / \
+                                                    float(self.samplerate)
+
+    def fill_vorbis(self, m):
+        packets = _packets(m, self.bos)
+        ident, page, dummy = next(packets)
+        channels, rate = struct.unpack_from("<BI", ident, 11)
+        if not rate:
+            raise ValueError("zero sample rate")
+        comment, page, dummy = next(packets)
+        if comment[:7] != b"\x03vorbis":
+            raise ValueError("missing comment header")
+        setup, page, last = next(packets)
+        if setup[:7] != b"\x05vorbis":
+            raise ValueError("missing setup header")
+        if page.granule != 0 or not last:
+            raise ValueError("non standard ogg/vorbis header found")
+        nextpage = _next_page(m, page.offset + page.size)
+        if nextpage is None or nextpage.continued:
+            raise ValueError("non standard ogg/vorbis header found")
+
+        comments = _comments(comment[7:])
+        prefix = "trk-" if _query(comments, "trk-title") is not None else ""
+        for each in ("artist", "title", "album"):
+            setattr(self, each, _query(comments, prefix + each) or "")
+        self.replaygain = _query(
+                        comments, "replaygain_track_gain", False) or ""
+        self.rgloudness = _query(
+                        comments, "replaygain_reference_loudness", False) or ""
+        self.samplerate = rate
+
+    def fill_flac(self, m):
+        packets = _packets(m, self.bos)
+        head, page, dummy = next(packets)
+        if head[9:13] != b"fLaC" or head[13] & 0x7F != 0:
+            raise ValueError("missing streaminfo")
+        info = head[17:]
+        self.samplerate = (info[10] << 12 | info[11] << 4 | info[12] >> 4)
+
+        last = head[13] & 0x80
+        while not last:
+            block, page, dummy = next(packets)
+            last = block[0] & 0x80
+            if block[0] & 0x7F == 4:
+                comments = _comments(block[4:])
+                prefix = "trk-" if _query(
+                                comments, "trk-title") is not None else ""
+                for each in ("artist", "title", "album"):
+                    self._copy_tag(comments, prefix + each, each, True)
+                self._copy_tag(comments, "replaygain_track_gain",
+                               "replaygain", False)
+                self._copy_tag(comments, "replaygain_reference_loudness",
+                               "rgloudness", False)
+
+    def _copy_tag(self, comments, key, attr, multiple):
+        # Leading space is trimmed from values and empty values don't
+        # start a list, as per the backend's Ogg FLAC metadata callback.
+        target = getattr(self, attr)
+        for k, v in comments:
+            if k == key:
+                v = v.lstrip()
+                target = target + "/" + v if target and multiple else v
+        setattr(self, attr, target)
+
+    def _vtags(self, comments):
+        def merge(*keys):
+            for key in keys:
+                value = _query(comments, key)
+                if value is not None:
+                    return value
+            return ""
+
+        self.artist = merge("trk-author", "trk-artist", "author", "artist")
+        self.title = merge("trk-title", "title")
+        self.album = merge("trk-album", "album")
+
+    def fill_speex(self, m):
+        packets = _packets(m, self.bos)
+        head, page, last = next(packets)
+        if not last or page.packets != 1:
+            raise ValueError("failed to get speex header")
+        rate, = struct.unpack_from("<i", head, 36)
+        channels, = struct.unpack_from("<i", head, 48)
+        if channels not in (1, 2):
+            raise ValueError("unsupported number of audio channels")
+        tags, page, last = next(packets)
+        if not last:
+            raise ValueError("speex comment packet not page aligned")
+        self._vtags(_comments(tags))
+        self.samplerate = rate
+
+    def fill_opus(self, m):
+        final = self.final_granule
+        if final == 0:
+            raise ValueError("stream final packet granule count is zero")
+
+        packets = _packets(m, self.bos)
+        head, page, last = next(packets)
+        if page.granule != 0:
+            raise ValueError("non zero granule position")
+        if page.packets != 1 or page.continued or page.pageno != 0:
+            raise ValueError("bad header page alignment")
+        if len(head) < 19:
+            raise ValueError("packet too small to be version 1")
+        if head[8] > 15:
+            raise ValueError("encapsulation version unsupported")
+        channels, chanmap = head[9], head[18]
+        if channels == 0:
+            raise ValueError("number of channels is zero")
+        if chanmap > 1:
+            raise ValueError("unsupported channel map")
+        if (chanmap == 0 and channels > 2) or (chanmap == 1 and channels > 8):
+            raise ValueError("too many channels for given channel mapping")
+        if chanmap == 0 and len(head) != 19:
+            raise ValueError("OpusHead packet size wrong")
+        if chanmap == 1:
+            if len(head) != 21 + channels:
+                raise ValueError("OpusHead packet size wrong")
+            streams, coupled = head[19], head[20]
+            if streams == 0:
+                raise ValueError("streamcount is zero")
+            if coupled > streams:
+                raise ValueError("two channel streamcount > total "
+                                 "streamcount")
+            if streams + coupled > 255:
+                raise ValueError("combined streamcount quantity exceeds 255")
+            for index in head[21:]:
+                if index != 255 and index >= streams + coupled:
+                    raise ValueError("bad channel map")
+        preskip, = struct.unpack_from("<H", head, 10)
+        if preskip >= final:
+            raise ValueError("no samples to decode after preskip")
+
+        tags, page, last = next(packets)
+        if page.packets != 1 or page.continued or page.pageno < 1:
+            raise ValueError("bad header page alignment")
+        if page.granule != 0:
+            raise ValueError("non zero granule position")
+        if tags[:8] != b"OpusTags":
+            raise ValueError("bad or missing OpusTags packet")
+        comments = _comments(tags[8:])
+        self._vtags(comments)
+        gains = [v for k, v in comments if k == "r128_track_gain"]
+        if len(gains) > 1:
+            raise ValueError("too many R128_TRACK_GAIN tags")
+        if gains:
+            text = gains[0]
+            if text[:1].isspace():
+                raise ValueError("R128_TRACK_GAIN contains whitespace at "
+                                 "start")
+            # As strtol in oggdec.c, which reads an empty value as 0.
+            if not _R128_GAIN.fullmatch(text):
+                raise ValueError("R128_TRACK_GAIN contains non digit data")
+            value = int(text) if text else 0
+            if len(text) > 6 or not -32768 <= value <= 32767:
+                raise ValueError("R128_TRACK_GAIN value out of range")
+
+        packet, page, last = next(packets)
+        samples = _opus_samples(packet)
+        while not last:
+            packet, page, last = next(packets)
+            samples += _opus_samples(packet)
+        if not page.eos:
+            if page.granule < samples:
+                raise ValueError("first page granule position less than "
+                                 "number of samples, end of stream not set")
+            self.initial_granule = (page.granule - samples) & 0xFFFFFFFF
+            if self.initial_granule and \
+                            preskip >= final - self.initial_granule:
+                raise ValueError("no samples to decode after accounting "
+                                 "for initial granulepos")
+        self.samplerate = 48000
+
+
+def _opus_samples(packet):
+    """Samples at 48kHz in an Opus packet per the table of contents byte."""
+
+    if not packet:
+        raise ValueError("packet with no frames detected")
+    toc = packet[0]
+    code = toc & 3
+    if code == 0:
+        frames = 1
+    elif code != 3:
+        frames = 2
+    elif len(packet) < 2:
+        raise ValueError("packet with no frames detected")
+    else:
+        frames = packet[1] & 0x3F
+    if frames < 1:
+        raise ValueError("packet with no frames detected")
+
+    if toc & 0x80:
+        size = (48000 << (toc >> 3 & 3)) // 400
+    elif toc & 0x60 == 0x60:
+        size = 480 if toc & 0x08 else 960
+    else:
+        size = toc >> 3 & 3
+        size = 2880 if size == 3 else (48000 << size) // 100
+    return size * frames
+
+
+_OGG_TYPES = ((b"\x01vorbis", "fill_vorbis", True),
+              (b"\x7fFLAC", "fill_flac", FGlobs.oggflacenabled),
+              (b"Speex", "fill_speex", FGlobs.speexenabled),
+              (b"OpusHead", "fill_opus", FGlobs.opusenabled))
+
+
+def _id3v2_skip(m):
+    """Mirror the backend's tolerance of a leading ID3v2 tag."""
+
+    if m[:3] == b"ID3" and len(m) >= 10 and m[3] != 0xFF and m[4] != 0xFF:
+        return m[6] << 21 | m[7] << 14 | m[8] << 7 | m[9]
+    return 0
+
+
+def ogg_info(pathname):
+    """The equivalent of an ogginforequest.
+
+    Returns an OggInfo whose length is None when the backend would reply
+    OIR:NOT VALID.
+    """
+
+    notvalid = OggInfo("", "", "", None, "", "")
+
+    try:
+        m = _mapfile(pathname)
+    except EnvironmentError:
+        return notvalid
+
+    try:
+        end = len(m)
+        offset = _id3v2_skip(m)
+        streams = []
+        while offset < end:
+            page = _next_page(m, offset)
+            while page is not None and not page.bos:
+                page = _next_page(m, page.offset + page.size)
+            if page is None:
+                break
+            last = _find_last_page(m, page, end)
+            streams.append(_Stream(page, last))
+            offset = last.offset + last.size
+
+        for stream in streams:
+            packet = next(_packets(m, stream.bos))[0]
+            for magic, method, enabled in _OGG_TYPES:
+                if packet.startswith(magic):
+                    if enabled:
+                        try:
+                            getattr(stream, method)(m)
+                        except (ValueError, IndexError, StopIteration,
+                                                        struct.error) as e:
+                            print("mediainfo: %s: %s" % (pathname, e))
+                            stream.samplerate = 0
+                    break
+            else:
+                print("mediainfo: unhandled ogg stream type in", pathname)
+    finally:
+        if isinstance(m, mmap.mmap):
+            m.close()
+
+    length = sum(x.duration for x in streams)
+    if not length:
+        return notvalid
+
+    first = streams[0]
+    if len(streams) > 1 and first.duration > 0.1:
+        # Only the initial tags of chained streams that possess a
+        # metaheader are used, which is to say none at all.
+        return OggInfo("", "", "", _printf(length), "", "")
+
+    return OggInfo(first.artist.strip(), first.title.strip(),
+                   first.album.strip(), _printf(length),
+                   first.replaygain.rstrip(), first.rgloudness.rstrip())
+
+
+# ----------------------------------------------------------- sndfile ----
+
+def _chunks(m, offset, end, fmt):
+    """Yield (id, data offset, size) for RIFF style chunks."""
+
+    end = min(end, len(m))
+    while offset + 8 <= end:
+        cid, size = struct.unpack_from(fmt, m, offset)
+        yield cid, offset + 8, size
+        offset += 8 + size + (size & 1)
+
+
+def _cstring(data):
+    return _text(data.split(b"\0", 1)[0])
+
+
+def _wav_info(m):
+    riff = m[:4]
+    if riff == b"RIFF":
+        fmt = "<4sI"
+    elif riff == b"RIFX":
+        fmt = ">4sI"
+    else:
+        raise UnsupportedMedia("not RIFF")
+    e = fmt[0]
+
+    tags = {}
+    format_ = blockalign = channels = rate = fact = datasize = None
+    for cid, pos, size in _chunks(m, 12, len(m), fmt):
+        if cid == b"fmt ":
+            format_, channels, rate, dummy, blockalign = struct.unpack_from(
+                                                    e + "HHIIH", m, pos)
+        elif cid == b"fact":
+            fact, = struct.unpack_from(e + "I", m, pos)
+        elif cid == b"data":
+            datasize = min(size, len(m) - pos)
+        elif cid == b"LIST" and m[pos:pos + 4] == b"INFO":
+            for sid, spos, ssize in _chunks(m, pos + 4, pos + size, fmt):
+                tags[sid] = _cstring(m[spos:spos + ssize])
+
+    if format_ is None or datasize is None or not rate or not blockalign:
+        raise UnsupportedMedia("no fmt or data chunk")
+
+    # PCM, float, A-law, mu-law and extensible have a fixed block size.
+    if format_ in (1, 3, 6, 7, 0xFFFE):
+        frames = datasize // blockalign
+    elif fact is not None:
+        frames = fact
+    else:
+        raise UnsupportedMedia("compressed format %#x" % format_)
+
+    return frames, rate, tags.get(b"IART"), tags.get(b"INAM"), \
+                                                        tags.get(b"IPRD")
+
+
+def _extended(data):
+    """An IEEE 754 80 bit extended float as used by AIFF."""
+
+    exponent, mantissa = struct.unpack(">HQ", data)
+    sign = -1 if exponent & 0x8000 else 1
+    exponent &= 0x7FFF
+    if exponent == 0 and mantissa == 0:
+        return 0.0
+    return sign * mantissa * 2.0 ** (exponent - 16383 - 63)
+
+
+def _aiff_info(m):
+    if m[:4] != b"FORM" or m[8:12] not in (b"AIFF", b"AIFC"):
+        raise UnsupportedMedia("not AIFF")
+
+    frames = rate = None
+    tags = {}
+    for cid, pos, size in _chunks(m, 12, len(m), ">4sI"):
+        if cid == b"COMM":
+            channels, frames, bits = struct.unpack_from(">hIh", m, pos)
+            rate = _extended(m[pos + 8:pos + 18])
+        elif cid in (b"NAME", b"AUTH"):
+            tags[cid] = _cstring(m[pos:pos + size])
+
+    if not rate or frames is None:
+        raise UnsupportedMedia("no COMM chunk")
+
+    return frames, rate, tags.get(b"AUTH"), tags.get(b"NAME"), None
+
+
+_AU_SAMPLE_BYTES = {1: 1, 2: 1, 3: 2, 4: 3, 5: 4, 6: 4, 7: 8, 27: 1}
+
+
+def _au_info(m):
+    magic = m[:4]
+    if magic == b".snd":
+        e = ">"
+    elif magic == b"dns.":
+        e = "<"
+    else:
+        raise UnsupportedMedia("not AU")
+
+    offset, size, encoding, rate, channels = struct.unpack_from(
+                                                        e + "5I", m, 4)
+    try:
+        width = _AU_SAMPLE_BYTES[encoding] * channels
+    except KeyError:
+        raise UnsupportedMedia("AU encoding %d" % encoding)
+    if size == 0xFFFFFFFF or offset + size > len(m):
+        size = len(m) - offset
+    if not rate or not width:
+        raise UnsupportedMedia("bad AU header")
+
+    return size // width, rate, None, None, None
+
+
+def sndfile_info(pathname):
+    """The equivalent of a sndfileinforequest.
+
+    Returns a SndfileInfo or None for an unreadable file. Anything not
+    plainly a WAV, AIFF or AU file raises UnsupportedMedia since libsndfile
+    may still make sense of it.
+    """
+
+    try:
+        m = _mapfile(pathname)
+    except EnvironmentError:
+        return None
+
+    try:
+        for reader in (_wav_info, _aiff_info, _au_info):
+            try:
+                frames, rate, artist, title, album = reader(m)
+            except UnsupportedMedia:
+                continue
+            except (struct.error, IndexError):
+                raise UnsupportedMedia(pathname)
+            break
+        else:
+            raise UnsupportedMedia(pathname)
+    finally:
+        if isinstance(m, mmap.mmap):
+            m.close()
+
+    length = _printf(frames / rate, single=True)
+    if artist and title:
+        return SndfileInfo(artist, title, album or "", length)
+    return SndfileInfo("", "", "", length)
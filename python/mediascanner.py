@@ -0,0 +1,180 @@
+"""Background metadata scanning for playlist imports."""
+
+#   Copyright (C) 2026 Stephen Fairchild (s-fairchild@users.sourceforge.net)
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program in the file entitled COPYING.
+#   If not, see <http://www.gnu.org/licenses/>.
+
+
+__all__ = ["Pending", "MediaScanner"]
+
+
+import os
+import time
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from .gtkstuff import threadslock, timeout_add, source_remove
+
+
+# A pathname awaiting a metadata scan. Playlist generators yield these in
+# place of finished rows so that tag reading can be farmed out.
+Pending = namedtuple("Pending", "pathname")
+
+# A finish still in conversation with the backend.
+_Finishing = namedtuple("_Finishing", "request")
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """The worker pool is shared by all players and made on first use."""
+
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=min(8, (os.cpu_count() or 1) + 2))
+        return _executor
+
+
+class MediaScanner(object):
+    """Probe tags in a worker pool and deliver rows in order, in batches.
+
+    source: iterable of finished rows or Pending items
+    probe: thread safe callable, pathname -> intermediate result
+    finish: main thread callable, intermediate result -> row (falsy if bad)
+            or a request object whose result() is the row once done()
+    deliver: main thread callable taking a list of rows
+    done: optional main thread callable for when the scan ends
+
+    The source is drawn on in the main thread as it may create Gtk objects
+    e.g. for cue sheets. Registration with a FillStopper allows the user to
+    cancel.
+    """
+
+    # Milliseconds between checks for finished work.
+    INTERVAL = 20
+    # Main thread time budget per check, in seconds.
+    SLICE = 0.008
+    # Limit on work in the pool so huge imports don't eat memory.
+    WINDOW = 256
+
+    def __init__(self, source, probe, finish, deliver, done=None,
+                 fill_stopper=None):
+        self._source = iter(source)
+        self._probe = probe
+        self._finish = finish
+        self._deliver = deliver
+        self._done = done
+        self._fill_stopper = fill_stopper
+        self._queue = deque()
+        self._source_done = False
+        self._ended = False
+        self._started = time.time()
+        self._shown_stopper = False
+
+        if fill_stopper is not None:
+            fill_stopper.register(self)
+        self._timeout = timeout_add(self.INTERVAL, self._tick)
+
+    @property
+    def active(self):
+        return not self._ended and (
+            self._queue or not self._source_done)
+
+    def cancel(self):
+        """Drop all outstanding work. Already delivered rows remain."""
+
+        if not self._ended:
+            self._ended = True
+            source_remove(self._timeout)
+            for each in self._queue:
+                if hasattr(each, "cancel"):
+                    each.cancel()
+            self._queue.clear()
+            self._finished()
+
+    def _finished(self):
+        if self._fill_stopper is not None:
+            self._fill_stopper.unregister(self)
+        if self._done is not None:
+            self._done()
+
+    def _fill(self, deadline):
+        executor = _get_executor()
+        while not self._source_done and len(self._queue) < self.WINDOW and \
+                time.time() < deadline:
+            try:
+                item = next(self._source)
+            except StopIteration:
+                self._source_done = True
+            else:
+                if isinstance(item, Pending):
+                    item = executor.submit(self._probe, item.pathname)
+                self._queue.append(item)
+
+    def _collect(self, deadline):
+        batch = []
+        while self._queue and time.time() < deadline:
+            item = self._queue[0]
+            if isinstance(item, _Finishing):
+                if not item.request.done():
+                    break
+                item = item.request.result()
+            elif hasattr(item, "result"):
+                if not item.done():
+                    break
+                try:
+                    item = self._finish(item.result())
+                except Exception as e:
+                    print("media scanner:", e)
+                    item = None
+                if hasattr(item, "add_done_callback"):
+                    self._queue[0] = _Finishing(item)
+                    continue
+            self._queue.popleft()
+            if item:
+                batch.append(item)
+        return batch
+
+    @threadslock
+    def _tick(self):
+        if self._fill_stopper is not None:
+            if not self._fill_stopper.check(self):
+                self.cancel()
+                return False
+            if not self._shown_stopper and time.time() > self._started + 4:
+                self._fill_stopper.show()
+                self._shown_stopper = True
+
+        deadline = time.time() + self.SLICE
+        self._fill(deadline)
+        batch = self._collect(time.time() + self.SLICE)
+        if batch:
+            self._deliver(batch)
+
+        if self._ended:
+            return False
+
+        if self._source_done and not self._queue:
+            self._ended = True
+            self._finished()
+            return False
+
+        return True
@@ -0,0 +1,229 @@
+"""The reply side of the backend control channel, with pipelined requests.
+
+The backend answers commands strictly in the order they arrive so replies
+need no tags. Each outstanding request claims the reply lines that follow
+those of the request before it, as they arrive in the main loop.
+Synchronous readers let pending requests take their lines first.
+A parser that raises has the rest of its reply skipped, so later requests
+still get their own lines.
+"""
+
+#   Copyright (C) 2026 Stephen Fairchild (s-fairchild@users.sourceforge.net)
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program in the file entitled COPYING.
+#   If not, see <http://www.gnu.org/licenses/>.
+
+
+__all__ = ["MixerRequest", "MixerChannel", "reply_line"]
+
+
+import os
+import select
+import traceback
+from collections import deque
+
+from gi.repository import GLib
+
+from .gtkstuff import threadslock, idle_add, io_add_watch, source_remove
+
+
+def reply_line():
+    """Parser for commands that answer with a single line."""
+
+    line = yield
+    return line
+
+
+def _skip_reply(ends):
+    """Parser that discards lines up to and including one of ends."""
+
+    while 1:
+        line = yield
+        if not line or line in ends:
+            return None
+
+
+class MixerRequest(object):
+    """The reply to a backend command, which may not have arrived yet.
+
+    parser: a generator that is sent each reply line in turn and returns
+    the result. An empty line means the backend went away.
+    ends: the lines that can close the reply. Should the parser raise,
+    lines are skipped up to one of these and the result is None. Without
+    them the request fails at once and a longer reply goes astray.
+    """
+
+    def __init__(self, channel, parser, ends=()):
+        self._channel = channel
+        self._parser = parser
+        self._ends = frozenset(ends)
+        self._done = False
+        self._result = None
+        self._callbacks = []
+        next(parser)
+
+    def done(self):
+        return self._done
+
+    def result(self):
+        """The parsed reply, waiting for it if need be."""
+
+        if not self._done:
+            self._channel.wait(self)
+        return self._result
+
+    def add_done_callback(self, fn):
+        """Have fn(request) called from the main loop once the reply is in.
+
+        Callbacks never run from within another backend conversation so
+        they are free to start their own.
+        """
+
+        if self._done:
+            idle_add(threadslock(fn), self)
+        else:
+            self._callbacks.append(fn)
+
+    def _feed(self, line):
+        """Return True once the reply is complete."""
+
+        try:
+            self._parser.send(line)
+        except StopIteration as e:
+            self._finish(e.value)
+        except Exception:
+            print("mixer channel: reply parser failed on %r" % line)
+            traceback.print_exc()
+            if not line or line in self._ends or not self._ends:
+                self._finish(None)
+            else:
+                self._parser = _skip_reply(self._ends)
+                next(self._parser)
+        else:
+            if not line:
+                self._parser.close()
+                self._finish(None)
+        return self._done
+
+    def _finish(self, result):
+        self._done = True
+        self._result = result
+        for fn in self._callbacks:
+            idle_add(threadslock(fn), self)
+        del self._callbacks[:]
+
+
+class MixerChannel(object):
+    """Line reader of the backend reply pipe.
+
+    on_eof: called from the main loop as on_eof(channel) when the watch
+    finds the backend has gone away. Not called for close().
+    """
+
+    CHUNK = 65536
+
+    def __init__(self, fd, on_eof=None):
+        self._fd = fd
+        self._on_eof = on_eof
+        self._partial = b""
+        self._lines = deque()
+        self._pending = deque()
+        self._eof = False
+        self.crashed = False
+        self._watch = io_add_watch(fd, GLib.IO_IN | GLib.IO_HUP,
+                                   self._cb_readable)
+
+    def request(self, parser, ends=()):
+        """Register for the reply of the command just written."""
+
+        request = MixerRequest(self, parser, ends)
+        if self._eof:
+            request._feed("")
+        else:
+            self._pending.append(request)
+        return request
+
+    def readline(self):
+        """The next reply line no request has claimed, "" at the end."""
+
+        while self._pending:
+            self._feed(self._next_line())
+        return self._next_line()
+
+    def wait(self, request):
+        while not request.done():
+            self._feed(self._next_line())
+
+    def close(self):
+        source_remove(self._watch)
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self._eof = True
+        while self._pending:
+            self._feed("")
+
+    def _feed(self, line):
+        if self._pending[0]._feed(line):
+            self._pending.popleft()
+
+    def _next_line(self):
+        while not self._lines and not self._eof:
+            self._read()
+        return self._lines.popleft() if self._lines else ""
+
+    def _read(self):
+        """One read of the pipe which blocks only if nothing is there.
+
+        Only readline and wait may block. The watch checks _ready first.
+        """
+
+        try:
+            data = os.read(self._fd, self.CHUNK)
+        except (OSError, TypeError) as e:
+            print("mixer channel:", e)
+            data = b""
+        if not data:
+            self._eof = True
+            return
+
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()
+        for line in lines:
+            line = line.decode("utf-8", "replace") + "\n"
+            if line == "Segmentation Fault\n":
+                print("Mixer reports a segmentation fault")
+                self.crashed = self._eof = True
+                return
+            self._lines.append(line)
+
+    def _ready(self):
+        """True if a read of the pipe would not block."""
+
+        try:
+            return bool(select.select([self._fd], [], [], 0)[0])
+        except (OSError, ValueError, TypeError):
+            return True  # For _read to report.
+
+    def _cb_readable(self, source, condition):
+        # A synchronous reader dispatched earlier in this main loop
+        # iteration may have emptied the pipe, which blocks.
+        if not self._ready():
+            return True
+        self._read()
+        while self._pending and (self._lines or self._eof):
+            self._feed(self._next_line())
+        if self._eof and self._on_eof is not None:
+            idle_add(threadslock(self._on_eof), self)
+        return not self._eof
@@ -28,6 +28,9 @@ import xml.dom.minidom as mdom
 import warnings
 import gettext
 import uuid
+import bisect
+import weakref
+from itertools import accumulate
 from stat import *
 from collections import deque, namedtuple, defaultdict
 from functools import partial
@@ -39,11 +42,10 @@ from gi.repository import Gdk
 from gi.repository import GdkPixbuf
 from gi.repository import Pango
 import mutagen
-from mutagen.mp3 import MP3
+from mutagen.mp3 import EasyMP3
 from mutagen.mp4 import MP4
 from mutagen.easyid3 import EasyID3
-from mutagen.apev2 import APEv2, APETextValue
-from mutagen.id3 import ID3
+from mutagen.apev2 import APEv2
 
 from idjc import FGlobs
 from . import popupwindow
@@ -51,6 +53,11 @@ from .mutagentagger import *
 from .utils import SlotObject
 from .utils import LinkUUIDRegistry
 from .utils import PathStr
+from .mediascanner import Pending, MediaScanner
+from .tagcache import get_tagcache
+from .sessionstore import get_session_store
+from . import playlistcodec
+from .mediainfo import UnsupportedMedia, ogg_info, sndfile_info
 from .gtkstuff import threadslock
 from .gtkstuff import idle_add, timeout_add, source_remove, nullcm, gdklock
 from .prelims import *
@@ -115,6 +122,10 @@ NOTVALID = PlayerRow(
 # Delay in milliseconds between progress bar updates.
 PROGRESS_TIMEOUT = 200
 
+# Delay in milliseconds before asking the backend to read ahead a track, so
+# that moving through the playlist does not send a request per row.
+PRELOAD_TIMEOUT = 500
+
 # Pathname is an absolute file path or 'missing' or 'pregap'.
 CueSheetTrack = namedtuple(
     "CueSheetTrack",
@@ -242,6 +253,122 @@ class CueSheetListStore(Gtk.ListStore):
         return IndexingIterator(self)
 
 
+class BlockIndex(object):
+    """Prefix sums of playlist row durations for quick block size queries.
+
+    Row data is kept up to date from the playlist model's signals. Any
+    change in the durations or the position of control elements marks the
+    sums for recalculation which then happens once at the next query.
+    """
+
+    # Controls that end a block when playlist controls are in effect.
+    STOPS = frozenset((">stopplayer", ">stopplayer2", ">transfer",
+                       ">crossfade", ">announcement", ">jumptotop"))
+
+    def __init__(self, model):
+        self._model = model
+        self._lengths = []
+        self._controls = []
+        self._cuesheets = weakref.WeakSet()
+        self._dirty = True
+        self._speedfactor = None
+        self._reload()
+
+        model.connect("row-inserted", self._cb_row_inserted)
+        model.connect("row-deleted", self._cb_row_deleted)
+        model.connect("row-changed", self._cb_row_changed)
+        model.connect("rows-reordered", lambda *args: self._reload())
+
+    def _row_data(self, iter_):
+        length, text, cuesheet = self._model.get(iter_, 2, 0, 8)
+        if length >= 0:
+            if cuesheet is not None:
+                if cuesheet not in self._cuesheets:
+                    # Tracks can be switched on and off in the cue sheet.
+                    self._cuesheets.add(cuesheet)
+                    cuesheet.connect("row-changed", self._cb_cuesheet_changed)
+                length = cuesheet.time_remaining(0.0)
+            return length, None
+        if length == -11 and text:
+            if text.startswith("<b>"):
+                text = text[3:-4]
+            if text in self.STOPS or text == ">normalspeed":
+                return 0, text
+        return 0, None
+
+    def _reload(self):
+        data = [self._row_data(row.iter) for row in self._model]
+        self._lengths = [x[0] for x in data]
+        self._controls = [x[1] for x in data]
+        self._dirty = True
+
+    def _cb_row_inserted(self, model, path, iter_):
+        i = path.get_indices()[0]
+        length, control = self._row_data(iter_)
+        self._lengths.insert(i, length)
+        self._controls.insert(i, control)
+        self._dirty = True
+
+    def _cb_row_deleted(self, model, path):
+        i = path.get_indices()[0]
+        del self._lengths[i]
+        del self._controls[i]
+        self._dirty = True
+
+    def _cb_row_changed(self, model, path, iter_):
+        i = path.get_indices()[0]
+        length, control = self._row_data(iter_)
+        # Play highlighting and tag edits commonly change nothing of note.
+        if self._lengths[i] != length or self._controls[i] != control:
+            self._lengths[i] = length
+            self._controls[i] = control
+            self._dirty = True
+
+    def _cb_cuesheet_changed(self, *args):
+        self._reload()
+
+    def _update(self, speedfactor):
+        if self._dirty:
+            self._whole = [0] + list(accumulate(int(x) for x in self._lengths))
+            self._stops = [i for i, x in enumerate(self._controls)
+                           if x in self.STOPS]
+            self._normal = [i for i, x in enumerate(self._controls)
+                            if x == ">normalspeed"]
+            self._speedfactor = None
+            self._dirty = False
+        if speedfactor != self._speedfactor:
+            if speedfactor == 1.0:
+                self._scaled = self._whole
+            else:
+                self._scaled = [0] + list(accumulate(
+                            int(x / speedfactor) for x in self._lengths))
+            self._speedfactor = speedfactor
+
+    def block_size(self, start, speedfactor, use_controls):
+        """Play time in whole seconds from row start to the end of block.
+
+        Each row's time is truncated to the second as it always was.
+        """
+
+        self._update(speedfactor)
+        end = len(self._lengths)
+        if start >= end:
+            return 0
+
+        if use_controls:
+            i = bisect.bisect_left(self._stops, start)
+            if i < len(self._stops):
+                end = self._stops[i]
+            i = bisect.bisect_left(self._normal, start)
+            normal = self._normal[i] if i < len(self._normal) else end
+            normal = min(normal, end)
+        else:
+            normal = end
+
+        return self._scaled[normal] - self._scaled[start] + \
+            self._whole[end] - self._whole[normal]
+
+
 class NumberedLabel(Gtk.Label):
     attrs = Pango.AttrList()
     #attrs.insert(Pango.AttrFamily("Monospace" , 0, 3))
@@ -801,6 +928,270 @@ class Supported(object):
 supported = Supported()
 
 
+def replaygain_text(handle=None, prefix="", gain=None, ref=None):
+    """ReplayGain value in playlist form e.g. '-6.2 RG' or '-1.0 R128'."""
+
+    try:
+        if ref is None:
+            ref = str(
+                handle[prefix + "REPLAYGAIN_REFERENCE_LOUDNESS"][0]
+            )
+    except Exception:
+        ref = None
+    else:
+        try:
+            ref = float(ref.rstrip("dbDBLUlu"))
+        except Exception:
+            ref = None
+        else:
+            ref = "R128" if -23.1 < ref < -22.9 else "RG"
+
+    if gain is None:
+        gain = str(
+            handle[prefix + "REPLAYGAIN_TRACK_GAIN"][0]
+        ).rstrip().upper()
+    else:
+        gain = gain.upper()
+    if gain.endswith("DB"):
+        if ref is None or ref == "RG":
+            gain = gain[:-2] + "RG"
+        else:
+            gain = gain[:-2] + "R128"
+    elif gain.endswith("LU"):
+        if ref is None or ref == "R128":
+            gain = gain[:-2] + "R128"
+        else:
+            gain = gain[:-2] + "RG"
+    else:
+        if ref is None or ref == "RG":
+            gain += " RG"
+        else:
+            gain += " R128"
+
+    try:
+        v1, v2 = gain.split()
+        if v2 not in ("RG", "R128"):
+            raise Exception
+        float(v1)
+    except Exception:
+        return RGDEF
+
+    return gain
+
+
+# Formats that carry APEv2 and ID3 tags separately from the audio stream.
+# All others are opened just the once by mutagen.File which in the case of
+# Monkey's Audio and Musepack reads the native APEv2 tag.
+ID3_EXTS = (".mp3", ".mp2", ".aac")
+
+# Formats whose details are read by the mediainfo module or failing that,
+# supplied by the backend.
+BACKEND_EXTS = {".wav": "sndfile", ".aiff": "sndfile", ".au": "sndfile",
+                ".ogg": "ogg", ".oga": "ogg", ".spx": "ogg"}
+
+# Tag data collected by probe_media. The key is the file's tag cache key
+# when the data was freshly read or None when it came from the cache.
+MediaProbe = namedtuple(
+    "MediaProbe",
+    "filename artist title album length replaygain meta_name rsmeta_name "
+    "backend key")
+
+
+def tag_text(value):
+    """Tag values as a string with multiple values separated by a slash."""
+
+    if isinstance(value, list):
+        return "/".join(str(x) for x in value)
+    return str(value)
+
+
+def probe_media(filename):
+    """Read the tags of a media file.
+
+    Safe to call from any thread. Returns a MediaProbe for completion by
+    IDJC_Media_Player.finish_media_metadata or an invalid PlayerRow.
+    """
+
+    artist = title = album = ""
+    length = 0.0
+    rg = RGDEF
+    backend = None
+
+    # Strip away any file:// prefix
+    if filename.count("file://", 0, 7):
+        host, filename = filename[7:].split("/", 1)
+        filename = "/" + urllib.parse.unquote(filename)
+        if host not in ("", "localhost", "127.0.0.1", "::1"):
+            return NOTVALID._replace(filename=filename)
+    elif filename.count("file:", 0, 5):
+        filename = filename[5:]
+
+    filext = supported.check_media(filename)
+    if filext is False or os.path.isfile(filename) is False:
+        return NOTVALID._replace(filename=filename)
+
+    # Use this name for metadata when we can't get anything from tags.
+    # The name will also appear grey to indicate a tagless state.
+    meta_name = os.path.splitext(
+        GLib.filename_display_basename(filename)
+    )[0].lstrip("0123456789 -")
+    # TC: Playlist text meaning the metadata tag is missing or incomplete.
+    rsmeta_name = '<span foreground="dark red">(%s)</span> %s' % (
+        _('Bad Tag'), GLib.markup_escape_text(meta_name))
+
+    tagcache = get_tagcache()
+    key = tagcache.stat_key(filename)
+    cached = tagcache.lookup(filename, key)
+    if cached is not None:
+        return MediaProbe(filename, *cached, meta_name=meta_name,
+                          rsmeta_name=rsmeta_name, backend=None, key=None)
+
+    if filext in ID3_EXTS:
+        # Files can have ape and id3 tags. ID3 has priority in this case.
+        try:
+            audio = APEv2(filename)
+        except Exception:
+            pass
+        else:
+            try:
+                rg = replaygain_text(audio)
+            except Exception:
+                rg = RGDEF
+            artist = audio.get("ARTIST", [""])
+            title = audio.get("TITLE", [""])
+            album = audio.get("ALBUM", [""])
+
+        if filext == ".aac":
+            audio = None
+            try:
+                id3 = EasyID3(filename)
+            except Exception:
+                id3 = None
+            else:
+                try:
+                    length = float(id3["length"][0]) / 1000.0
+                except (KeyError, ValueError, IndexError):
+                    print(
+                        "unknown track length -- add a TLEN tag if you know it"
+                    )
+        else:
+            # The audio stream and the ID3 tag in one pass.
+            try:
+                audio = EasyMP3(filename)
+            except Exception:
+                return NOTVALID._replace(filename=filename)
+            length = float(audio.info.length)
+            id3 = audio.tags
+
+        if id3 is not None:
+            try:
+                rg = replaygain_text(id3, "TXXX_")
+            except Exception:
+                try:
+                    rg = replaygain_text(id3)
+                except Exception:
+                    pass
+            artist = id3.get("artist", artist)
+            title = id3.get("title", title)
+            album = id3.get("album", album)
+
+        # The LAME tag is the last port of call for ReplayGain info
+        # due to it frequently being based on the source audio.
+        if audio is not None and rg == RGDEF:
+            try:
+                rg = audio.info.track_gain
+            except AttributeError:
+                pass
+            else:
+                if rg is None:
+                    rg = RGDEF
+                else:
+                    rg = str(rg) + " RG"
+
+    elif filext in BACKEND_EXTS:
+        # Read natively the same as the backend would. What can't be read
+        # this way is left for finish_media_metadata to ask the backend.
+        try:
+            if BACKEND_EXTS[filext] == "ogg":
+                info = ogg_info(filename)
+                if info.length is None:
+                    return NOTVALID._replace(filename=filename)
+                rg = replaygain_text(gain=info.replaygain,
+                                     ref=info.rgloudness)
+            else:
+                info = sndfile_info(filename)
+                if info is None:
+                    return NOTVALID._replace(filename=filename)
+        except UnsupportedMedia:
+            backend = BACKEND_EXTS[filext]
+        else:
+            artist, title, album, length = info[:4]
+
+    else:
+        # Mutagen used for all remaining formats.
+        try:
+            audio = mutagen.File(filename)
+            if audio is None:
+                raise Exception
+        except Exception:
+            return NOTVALID._replace(filename=filename)
+        else:
+            length = float(audio.info.length)
+            if isinstance(audio, MP4):
+                try:
+                    artist = audio["\xa9ART"][0]
+                except:
+                    pass
+                try:
+                    title = audio["\xa9nam"][0]
+                except:
+                    pass
+                try:
+                    album = audio["\xa9alb"][0]
+                except:
+                    pass
+            else:
+                x = list(audio.get("Artist", []))
+                x += list(audio.get("Author", []))
+                if x:
+                    artist = "/".join((str(y) for y in x))
+
+                try:
+                    x = list(audio["Title"])
+                except:
+                    pass
+                else:
+                    title = "/".join((str(y) for y in x))
+
+                try:
+                    x = list(audio["Album"])
+                except:
+                    pass
+                else:
+                    album = "/".join((str(y) for y in x))
+
+                try:
+                    rg = replaygain_text(audio)
+                except:
+                    pass
+
+                try:
+                    rg = str(
+                        float(
+                            str(
+                                audio["r128_track_gain"][-1]
+                            )
+                        ) / 256.0) + " R128"
+                except:
+                    pass
+
+    artist, title, album = (tag_text(x) for x in (artist, title, album))
+    if backend is None:
+        tagcache.store(filename, key, artist, title, album, length, rg)
+    return MediaProbe(filename, artist, title, album, length, rg, meta_name,
+                      rsmeta_name, backend, key)
+
+
 # Arrow button creation helper function
 def make_arrow_button(self, arrow_type, shadow_type, data):
     button = Gtk.Button()
@@ -1071,6 +1462,9 @@ class IDJC_Media_Player:
         ('', 'm3u', 'm3u8', 'xspf', 'pls')
     ))
 
+    # Batches of at least this many rows are inserted with the view detached.
+    DETACH_ROWS = 200
+
     def make_cuesheet_playlist_entry(self, cue_pathname):
         cuesheet_liststore = CueSheetListStore()
         try:
@@ -1174,284 +1568,106 @@ class IDJC_Media_Player:
         return element
 
     def get_media_metadata(self, filename, get_length=False):
-        artist = ""
-        title = ""
-        album = ""
-        length = 0.0
-        title_retval = ""
-        cuesheet = None
-
-        # Strip away any file:// prefix
-        if filename.count("file://", 0, 7):
-            host, filename = filename[7:].split("/", 1)
-            filename = "/" + urllib.parse.unquote(filename)
-            if host not in ("", "localhost", "127.0.0.1", "::1"):
-                return NOTVALID._replace(filename=filename)
-        elif filename.count("file:", 0, 5):
-            filename = filename[5:]
-
-        filext = supported.check_media(filename)
-        if filext is False or os.path.isfile(filename) is False:
-            return NOTVALID._replace(filename=filename)
-
-        # Use this name for metadata when we can't get anything from tags.
-        # The name will also appear grey to indicate a tagless state.
-        meta_name = os.path.splitext(
-            GLib.filename_display_basename(filename)
-        )[0].lstrip("0123456789 -")
-        encoding = None  # Obsolete
-        # TC: Playlist text meaning the metadata tag is missing or incomplete.
-        rsmeta_name = '<span foreground="dark red">(%s)</span> %s' % (
-            _('Bad Tag'), GLib.markup_escape_text(meta_name))
-        title_retval = meta_name
-
-        def gain(handle=None, prefix="", gain=None, ref=None):
-            try:
-                if ref is None:
-                    ref = str(
-                        handle[prefix + "REPLAYGAIN_REFERENCE_LOUDNESS"][0]
-                    )
-            except Exception:
-                ref = None
-            else:
-                try:
-                    ref = float(ref.rstrip("dbDBLUlu"))
-                except Exception:
-                    ref = None
-                else:
-                    ref = "R128" if -23.1 < ref < -22.9 else "RG"
+        return self.finish_media_metadata(probe_media(filename), get_length)
 
-            if gain is None:
-                gain = str(
-                    handle[prefix + "REPLAYGAIN_TRACK_GAIN"][0]
-                ).rstrip().upper()
-            else:
-                gain = gain.upper()
-            if gain.endswith("DB"):
-                if ref is None or ref == "RG":
-                    gain = gain[:-2] + "RG"
-                else:
-                    gain = gain[:-2] + "R128"
-            elif gain.endswith("LU"):
-                if ref is None or ref == "R128":
-                    gain = gain[:-2] + "R128"
-                else:
-                    gain = gain[:-2] + "RG"
-            else:
-                if ref is None or ref == "RG":
-                    gain += " RG"
-                else:
-                    gain += " R128"
+    def finish_media_metadata(self, probe, get_length=False, wait=True):
+        """Turn the output of probe_media into a PlayerRow.
 
-            try:
-                v1, v2 = gain.split()
-                if v2 not in ("RG", "R128"):
-                    raise Exception
-                float(v1)
-            except Exception:
-                return RGDEF
+        Must run in the main thread since it may converse with the backend.
+        When wait is False that conversation is not waited on and a
+        MixerRequest for the result is returned instead.
+        """
 
-            return gain
+        if isinstance(probe, PlayerRow):
+            return probe
 
-        # Obtain as much metadata from ubiquitous tags as possible.
-        # Files can have ape and id3 tags. ID3 has priority in this case.
-        try:
-            audio = APEv2(filename)
-        except:
-            rg = RGDEF
-            artist = title = ""
-        else:
-            try:
-                rg = gain(audio)
-            except:
-                rg = RGDEF
-            artist = audio.get("ARTIST", [""])
-            title = audio.get("TITLE", [""])
-            album = audio.get("ALBUM", [""])
-        # ID3 is tried second so it can supercede APE tag data.
-        try:
-            audio = EasyID3(filename)
-        except:
-            pass
-        else:
-            try:
-                rg = gain(audio, "TXXX_")
-            except:
-                try:
-                    rg = gain(audio)
-                except:
-                    pass
-            try:
-                artist = audio["artist"]
-            except:
-                pass
-            try:
-                title = audio["title"]
-            except:
-                pass
-            try:
-                album = audio["album"]
-            except:
-                pass
+        filename = probe.filename
 
         # Trying for metadata from native tagging formats.
-        if (filext == ".wav" or filext == ".aiff" or filext == ".au"):
-            self.parent.mixer_write(
-                "SNDP=%s\nACTN=sndfileinforequest\nend\n" % filename
-            )
-            while 1:
-                line = self.parent.mixer_read()
-                if line == "idjcmixer: sndfileinfo Not Valid\n" or line == "":
-                    return NOTVALID._replace(filename=filename)
-                if line.startswith("idjcmixer: sndfileinfo length="):
-                    length = float(line[30:-1])
-                if line.startswith("idjcmixer: sndfileinfo artist="):
-                    artist = line[30:-1]
-                if line.startswith("idjcmixer: sndfileinfo title="):
-                    title = line[29:-1]
-                if line.startswith("idjcmixer: sndfileinfo album="):
-                    album = line[29:-1]
-                if line == "idjcmixer: sndfileinfo end\n":
-                    break
-            if length is None:
-                return NOTVALID._replace(filename=filename)
+        if probe.backend == "sndfile":
+            request = self.parent.mixer_request(
+                "SNDP=%s\nACTN=sndfileinforequest\nend\n" % filename,
+                self._sndfileinfo_reply(probe, get_length),
+                ends=("idjcmixer: sndfileinfo end\n",
+                      "idjcmixer: sndfileinfo Not Valid\n"))
 
         # This handles chained ogg files as generated by IDJC.
-        elif filext == ".ogg" or filext == ".oga" or filext == ".spx":
-            self.parent.mixer_write(
-                "OGGP=%s\nACTN=ogginforequest\nend\n" % filename)
-
-            gval = None
-            ref = None
+        elif probe.backend == "ogg":
+            request = self.parent.mixer_request(
+                "OGGP=%s\nACTN=ogginforequest\nend\n" % filename,
+                self._ogginfo_reply(probe, get_length),
+                ends=("OIR:end\n", "OIR:NOT VALID\n"))
 
-            while 1:
-                line = self.parent.mixer_read()
-                if line == "OIR:NOT VALID\n" or line == "":
-                    return NOTVALID._replace(filename=filename)
-                if line.startswith("OIR:ARTIST="):
-                    artist = line[11:].strip()
-                if line.startswith("OIR:TITLE="):
-                    title = line[10:].strip()
-                if line.startswith("OIR:ALBUM="):
-                    album = line[10:].strip()
-                if line.startswith("OIR:LENGTH="):
-                    length = float(line[11:].strip())
-                if line.startswith("OIR:REPLAYGAIN_TRACK_GAIN="):
-                    gval = line[26:].rstrip()
-                if line.startswith("OIR:REPLAYGAIN_REFERENCE_LOUDNESS="):
-                    ref = line[34:].rstrip()
-                if line == "OIR:end\n":
-                    break
-
-            if gval is None:
-                rg = RGDEF
-            else:
-                rg = gain(gain=gval, ref=ref)
-
-        elif filext == ".aac":
-            try:
-                id3 = ID3(filename)
-                try:
-                    length = float(id3["TLEN"].text[0]) / 1000.0
-                except (KeyError, ValueError, IndexError):
-                    print(
-                        "unknown track length -- add a TLEN tag if you know it"
-                    )
-                    raise Exception
-            except Exception:
-                length = 0.0
         else:
-            # Mutagen used for all remaining formats.
-            try:
-                audio = mutagen.File(filename)
-                if audio is None:
-                    raise Exception
-            except Exception:
-                return NOTVALID._replace(filename=filename)
-            else:
-                length = float(audio.info.length)
-                if isinstance(audio, MP4):
-                    try:
-                        artist = audio["\xa9ART"][0]
-                    except:
-                        pass
-                    try:
-                        title = audio["\xa9nam"][0]
-                    except:
-                        pass
-                    try:
-                        album = audio["\xa9alb"][0]
-                    except:
-                        pass
-                elif isinstance(audio, MP3):
-                    # The LAME tag is the last port of call for ReplayGain info
-                    # due to it frequently being based on the source audio.
-                    if rg == RGDEF:
-                        try:
-                            rg = audio.info.track_gain
-                        except AttributeError:
-                            pass
-                        else:
-                            if rg is None:
-                                rg = RGDEF
-                            else:
-                                rg = str(rg) + " RG"
-                else:
-                    x = list(audio.get("Artist", []))
-                    x += list(audio.get("Author", []))
-                    if x:
-                        artist = "/".join((str(y) for y in x))
-
-                    try:
-                        x = list(audio["Title"])
-                    except:
-                        pass
-                    else:
-                        title = "/".join((str(y) for y in x))
+            return self._media_row(probe, *probe[1:6], get_length=get_length)
 
-                    try:
-                        x = list(audio["Album"])
-                    except:
-                        pass
-                    else:
-                        album = "/".join((str(y) for y in x))
+        return request.result() if wait else request
 
-                    try:
-                        rg = gain(audio)
-                    except:
-                        pass
+    def _sndfileinfo_reply(self, probe, get_length):
+        filename, artist, title, album, length, rg = probe[:6]
 
-                    try:
-                        rg = str(
-                            float(
-                                str(
-                                    audio["r128_track_gain"][-1]
-                                )
-                            ) / 256.0) + " R128"
-                    except:
-                        pass
+        while 1:
+            line = yield
+            if line == "idjcmixer: sndfileinfo Not Valid\n" or line == "":
+                return NOTVALID._replace(filename=filename)
+            if line.startswith("idjcmixer: sndfileinfo length="):
+                length = float(line[30:-1])
+            if line.startswith("idjcmixer: sndfileinfo artist="):
+                artist = line[30:-1]
+            if line.startswith("idjcmixer: sndfileinfo title="):
+                title = line[29:-1]
+            if line.startswith("idjcmixer: sndfileinfo album="):
+                album = line[29:-1]
+            if line == "idjcmixer: sndfileinfo end\n":
+                break
+        if length is None:
+            return NOTVALID._replace(filename=filename)
 
-        if isinstance(artist, list):
-            artist = "/".join(artist)
+        return self._media_row(probe, artist, title, album, length, rg,
+                               get_length)
 
-        if isinstance(title, list):
-            title = "/".join(title)
+    def _ogginfo_reply(self, probe, get_length):
+        filename, artist, title, album, length, rg = probe[:6]
+        gval = None
+        ref = None
 
-        if isinstance(album, list):
-            album = "/".join(album)
+        while 1:
+            line = yield
+            if line == "OIR:NOT VALID\n" or line == "":
+                return NOTVALID._replace(filename=filename)
+            if line.startswith("OIR:ARTIST="):
+                artist = line[11:].strip()
+            if line.startswith("OIR:TITLE="):
+                title = line[10:].strip()
+            if line.startswith("OIR:ALBUM="):
+                album = line[10:].strip()
+            if line.startswith("OIR:LENGTH="):
+                length = float(line[11:].strip())
+            if line.startswith("OIR:REPLAYGAIN_TRACK_GAIN="):
+                gval = line[26:].rstrip()
+            if line.startswith("OIR:REPLAYGAIN_REFERENCE_LOUDNESS="):
+                ref = line[34:].rstrip()
+            if line == "OIR:end\n":
+                break
 
-        if isinstance(artist, (str, APETextValue)):
-            artist = str(artist)
+        if gval is None:
+            rg = RGDEF
+        else:
+            rg = replaygain_text(gain=gval, ref=ref)
 
-        if isinstance(title, (str, APETextValue)):
-            title = str(title)
+        return self._media_row(probe, artist, title, album, length, rg,
+                               get_length)
 
-        if isinstance(album, (str, APETextValue)):
-            album = str(album)
+    def _media_row(self, probe, artist, title, album, length, rg,
+                   get_length=False):
+        filename = probe.filename
+        meta_name = probe.meta_name
+        encoding = None  # Obsolete
+        cuesheet = None
 
-        assert(isinstance(artist, str))
-        assert(isinstance(title, str))
-        assert(isinstance(album, str))
+        if probe.backend is not None:
+            get_tagcache().store(filename, probe.key, artist, title, album,
+                                 length, rg)
 
         if get_length:
             # Used if only requesting the length of the track
@@ -1476,8 +1692,8 @@ class IDJC_Media_Player:
             return player_row(artist + " - " + title)
         else:
             return PlayerRow(
-                rsmeta_name, filename, length, meta_name, encoding,
-                title_retval, artist, rg, cuesheet, album, uuid_
+                probe.rsmeta_name, filename, length, meta_name, encoding,
+                meta_name, artist, rg, cuesheet, album, uuid_
             )
 
     # Update playlist entries for a given filename
@@ -1514,19 +1730,20 @@ class IDJC_Media_Player:
         self.exiting = True
         if self.player_is_playing:
             self.stop.clicked()
+        get_tagcache().flush()
 
     def save_session(self, where=None):
         if where is None:
             where = PM.basedir
 
-        fh = open(where / self.session_filename, "w")
+        lines = []
         extlist = self.external_pl.filechooser.get_filename()
         if extlist is not None:
-            fh.write("extlist=" + extlist + "\n")
+            lines.append("extlist=" + extlist + "\n")
         extdir = self.external_pl.directorychooser.get_filename()
         if extdir is not None:
-            fh.write("extdir=" + extdir + "\n")
-        fh.writelines([
+            lines.append("extdir=" + extdir + "\n")
+        lines += [
             "digiprogress_type=" + str(int(self.digiprogress_type)) + "\n",
             "stream_button=" + str(int(self.stream.get_active())) + "\n",
             "listen_button=" + str(int(self.listen.get_active())) + "\n",
@@ -1535,52 +1752,57 @@ class IDJC_Media_Player:
             "plsave_filetype=" + str(self.plsave_filetype) + "\n",
             "plsave_open=" + str(int(self.plsave_open)) + "\n",
             "fade_mode=" + str(self.pl_delay.get_active()) + "\n"
-        ])
+        ]
         if self.plsave_folder is not None:
-            fh.write("plsave_folder=" + self.plsave_folder + "\n")
+            lines.append("plsave_folder=" + self.plsave_folder + "\n")
+
+        # The playlist is copied only when it has changed since last time.
+        if self._session_rows is None:
+            self._session_rows = [list(x) for x in self.liststore]
+            self._session_cues = [i for i, x in enumerate(self._session_rows)
+                                  if isinstance(x[8], CueSheetListStore)]
+        # Cue sheet contents can change without the playlist noticing.
+        rows = list(self._session_rows)
+        for i in self._session_cues:
+            rows[i] = rows[i][:8] + [tuple(rows[i][8])] + rows[i][9:]
 
-        for row in self.liststore:
-            # Allow modification without affecting the playlist.
+        model, iter = self.treeview.get_selection().get_selected()
+        if iter is not None:
+            lines.append("select=" + str(model.get_path(iter)[0]) + "\n")
+
+        store = get_session_store()
+        store.write(where / (self.session_filename + "_playlist"),
+                    self._playlist_text, rows)
+        store.write(where / self.session_filename, "".join, lines)
+
+    @staticmethod
+    def _playlist_text(rows):
+        """Playlist file content, made in the session store thread."""
+
+        links = link_uuid_reg.get_link_filenames()
+        entries = []
+        for row in rows:
+            # Allow modification without affecting the snapshot.
             entry = list(row)
-            link = link_uuid_reg.get_link_filename(row[10])
+            link = links.get(row[10])
             if link is not None:
                 # Replace orig file abspath with alternate path to a hard link
                 # except when link is None as happens when a hard link fails.
                 entry[1] = PathStr("links") / link
-
-            fh.write("pe=")
             if entry[0].startswith("<b>"):  # Clean off bold tags.
                 entry[0] = entry[0][3:-4]
-            for item in entry:
-                if isinstance(item, int):
-                    item = str(item)
-                    fh.write("i")
-                elif isinstance(item, float):
-                    item = str(item)
-                    fh.write("f")
-                elif isinstance(item, str):
-                    fh.write("s")
-                elif isinstance(item, CueSheetListStore):
-                    fh.write("c")
-                    if item:
-                        item = "(%s, )" % ", ".join(repr(x) for x in item)
-                    else:
-                        item = "()"
-                elif item is None:
-                    fh.write("n")
-                    item = "None"
-                fh.write(str(len(item)) + ":" + item)
-            fh.write("\n")
-        model, iter = self.treeview.get_selection().get_selected()
-        if iter is not None:
-            fh.write("select=" + str(model.get_path(iter)[0]) + "\n")
-        fh.close()
+            entries.append(entry)
+        return playlistcodec.dumps(entries)
+
+    def _cb_session_rows_changed(self, *args):
+        self._session_rows = None
 
     def restore_session(self):
         try:
             fh = open(PM.basedir / self.session_filename, "r")
         except:
             return
+        have_playlist = self._restore_playlist()
         while 1:
             try:
                 line = fh.readline()
@@ -1614,22 +1836,16 @@ class IDJC_Media_Player:
                     self.plsave_folder = line[14:-1]
                 if line.startswith("fade_mode="):
                     self.pl_delay.set_active(int(line[10]))
-                if line.startswith("pe="):
-                    playlist_entry = self.pl_unpack(line[3:])
-                    # Links directory entries conversion to absolute path.
-                    if playlist_entry[1] and \
-                            playlist_entry[1][0] != os.path.sep:
-                        playlist_entry = playlist_entry._replace(
-                            filename=PM.basedir / playlist_entry[1]
-                        )
-
-                    if not playlist_entry or self.playlist_todo:
-                        self.playlist_todo.append(playlist_entry.filename)
-                    else:
-                        try:
-                            self.liststore.append(playlist_entry)
-                        except TypeError:
-                            self.playlist_todo.append(playlist_entry.filename)
+                if line.startswith("pe=") and not have_playlist:
+                    # Playlist of a version before the playlist file.
+                    try:
+                        values = playlistcodec.unpack_legacy(line[3:],
+                                                             CueSheetTrack)
+                    except playlistcodec.LegacyRowError as e:
+                        print("playlist line not valid", e)
+                        # The filename is kept for a rescan if it was read.
+                        values = e.row
+                    self._restore_playlist_entry(values)
                 if line.startswith("select="):
                     path = line[7:-1]
                     try:
@@ -1646,66 +1862,71 @@ class IDJC_Media_Player:
                     "compatible with this version\nfiles placed"
                     " in a queue for rescanning")
             )
-            idle_add(self.cb_playlist_todo)
+            self.scan_elements(self._drain_playlist_todo(), self._append_rows,
+                               self._finish_playlist_todo)
 
-    @threadslock
-    def cb_playlist_todo(self):
-        if self.no_more_files:
-            return False
+    def _restore_playlist(self):
+        """Fill the playlist from the playlist file if there is one."""
+
+        pathname = PM.basedir / (self.session_filename + "_playlist")
         try:
-            pathname = self.playlist_todo.popleft()
-        except:
+            with open(pathname, "r", encoding="utf-8") as fh:
+                rows = playlistcodec.loads(fh.read())
+        except FileNotFoundError:
+            return False
+        except (EnvironmentError, ValueError) as e:
+            print("failed to read the playlist file", e)
             return False
-        line = self.get_media_metadata(pathname)
-        if line:
-            self.liststore.append(line)
-        else:
-            print("file missing or type unsupported %s" % pathname)
-        return True
-
-    def pl_unpack(self, text):
-        """Unmarshall a string to a list."""
 
-        start = 0
-        reply = []
-        while text[start] != "\n":
-            end = start
-            while text[end] != ":":
-                end = end + 1
-            nextstart = int(text[start + 1: end]) + end + 1
+        # Much faster with nothing to display it.
+        self.treeview.set_model(None)
+        try:
+            for values in rows:
+                self._restore_playlist_entry(values)
+        finally:
+            self.treeview.set_model(self.liststore)
+        return True
 
-            value = text[end + 1: nextstart]
-            try:
-                t = text[start]
-                if t == "i":
-                    value = int(value)
-                elif t == "f":
-                    value = float(value)
-                elif t == "s":
-                    pass
-                elif t == "c":
-                    csts = eval(
-                        value,
-                        {"__builtins__": None},
-                        {"CueSheetTrack": CueSheetTrack}
-                    )
-                    value = CueSheetListStore()
-                    for cst in csts:
-                        value.append(cst)
-                elif t == "n":
-                    value = None
-            except Exception as e:
-                print("pl_unpack: playlist line not valid", e)
-                try:
-                    return NOTVALID._replace(filename=reply[1])
-                except IndexError:
-                    return NOTVALID
-            reply.append(value)
-            start = nextstart
+    def _restore_playlist_entry(self, values):
         try:
-            return PlayerRow._make(reply)
-        except:
-            return NOTVALID._replace(filename=reply[1])
+            playlist_entry = PlayerRow._make(values)
+            if playlist_entry.cuesheet is not None:
+                cuesheet = CueSheetListStore()
+                for track in playlist_entry.cuesheet:
+                    cuesheet.append(tuple(track))
+                playlist_entry = playlist_entry._replace(cuesheet=cuesheet)
+        except (TypeError, ValueError):
+            playlist_entry = NOTVALID._replace(
+                filename=values[1] if len(values) > 1 else "")
+
+        # Links directory entries conversion to absolute path.
+        if playlist_entry[1] and playlist_entry[1][0] != os.path.sep:
+            playlist_entry = playlist_entry._replace(
+                filename=PM.basedir / playlist_entry[1])
+
+        if not playlist_entry or self.playlist_todo:
+            self.playlist_todo.append(playlist_entry.filename)
+        else:
+            try:
+                self.liststore.append(playlist_entry)
+            except (TypeError, ValueError):
+                self.playlist_todo.append(playlist_entry.filename)
+
+    def _drain_playlist_todo(self):
+        while self.playlist_todo:
+            yield Pending(self.playlist_todo.popleft())
+
+    def _finish_playlist_todo(self, probe):
+        def report(line):
+            if not line:
+                print("file missing or type unsupported %s" % probe.filename)
+
+        line = self.finish_media_metadata(probe, wait=False)
+        if hasattr(line, "add_done_callback"):
+            line.add_done_callback(lambda request: report(request.result()))
+        else:
+            report(line)
+        return line
 
     def handle_stop_button(self, widget):
         self.restart_cancel = True
@@ -1945,9 +2166,43 @@ class IDJC_Media_Player:
                 )
             else:
                 self.invoke_end_of_track_policy()
+        if self.player_cid != -1 and self.player_cid & 1:
+            self.preload(self.model_playing,
+                         self.next_real_track(self.iter_playing))
         self.parent.send_new_mixer_stats()
         return True
 
+    def preload(self, model, iter):
+        """Have the backend read ahead the track at iter to play it sooner.
+
+        Only the latest of several calls made in quick succession is acted
+        upon. Cue sheet rows preload their first playable element.
+        """
+
+        if self._preload_source_id:
+            source_remove(self._preload_source_id)
+            self._preload_source_id = 0
+        if iter is None:
+            return
+
+        row = PlayerRow._make(model[model.get_path(iter)])
+        if row.cuesheet:
+            pathname = next((x.pathname for x in row.cuesheet if x.play), "")
+        else:
+            pathname = row.filename
+        if pathname and pathname != self._preloaded and \
+                                                    os.path.isfile(pathname):
+            self._preload_source_id = timeout_add(
+                PRELOAD_TIMEOUT, self._cb_preload, pathname)
+
+    @threadslock
+    def _cb_preload(self, pathname):
+        self._preload_source_id = 0
+        self._preloaded = pathname
+        self.parent.mixer_write(
+            "PLRP=%s\nACTN=preload%s\nend\n" % (pathname, self.playername))
+        return False
+
     def player_shutdown(self):
         print("player shutdown code was called")
 
@@ -2289,28 +2544,11 @@ class IDJC_Media_Player:
                 treeselection.select_path(0)
 
     def get_pl_block_size(self, iter):
-        use_controls = self.pl_mode.get_active() == 0
-        size = 0
-        speedfactor = self.pbspeedfactor
-        while iter is not None:
-            length = self.liststore.get_value(iter, 2)
-            if length == -11 and use_controls:
-                text = self.liststore.get_value(iter, 0)
-                if text.startswith("<b>"):
-                    text = text[3:-4]
-                if text in (
-                    ">stopplayer", ">stopplayer2", ">transfer",
-                        ">crossfade", ">announcement", ">jumptotop"):
-                    break
-                if text == ">normalspeed":
-                    speedfactor = 1.0
-            if length >= 0:
-                cuesheet = self.liststore.get_value(iter, 8)
-                if cuesheet is not None:
-                    length = cuesheet.time_remaining(0.0)
-                size += int(length / speedfactor)
-            iter = self.liststore.iter_next(iter)
-        return size
+        if iter is None:
+            return 0
+        return self.block_index.block_size(
+            self.liststore.get_path(iter).get_indices()[0],
+            self.pbspeedfactor, self.pl_mode.get_active() == 0)
 
     def update_time_stats(self):
         """In playlist mode 0 the block times are calculated and displayed.
@@ -2838,19 +3076,86 @@ class IDJC_Media_Player:
         self.filerq.destroy()
         if response_id != Gtk.ResponseType.ACCEPT:
             return
-        gen = self.filter_allowed_controls(self.get_elements_from(chosenfiles))
-        idle_add(self.file_response_idle, iter(gen))
+        gen = self.filter_allowed_controls(self.iter_elements_from(chosenfiles))
+        self.scan_elements(gen, self._append_rows)
 
-    @threadslock
-    def file_response_idle(self, iterator):
-        if self.no_more_files:
-            self.no_more_files = False
+    def _append_rows(self, rows):
+        self._insert_rows(rows)
+
+    def _insert_rows(self, rows, sibling=None, before=False):
+        """Insert rows next to sibling or append them when it is None.
+
+        Each row goes in with its values so the model signals once per row
+        rather than for an empty row and again for its values. Big batches
+        are inserted with the view detached after which the selection and
+        the scroll position are put back.
+
+        Returns the iter of the last row inserted, or sibling if none were.
+        """
+
+        model = self.liststore
+        if sibling is None:
+            start = -1
         else:
-            for element in iterator:
-                self.liststore.append(element)
-                return True
+            start = model.get_path(sibling)[0] + (0 if before else 1)
+
+        view = self.treeview
+        detach = len(rows) >= self.DETACH_ROWS and view.get_model() is model
+        if detach:
+            selected = view.get_selection().get_selected()[1]
+            if selected is not None:
+                selected = model.get_path(selected)[0]
+            visible = view.get_visible_range()
+            top = visible[0][0] if visible else None
+            view.set_model(None)
+
+        iter_ = sibling
+        position = start
+        try:
+            for row in rows:
+                iter_ = model.insert(position, row)
+                if position >= 0:
+                    position += 1
+        finally:
+            if detach:
+                view.set_model(model)
+                shift = position - start if start >= 0 else 0
+                if top is not None:
+                    if start >= 0 and top >= start:
+                        top += shift
+                    view.scroll_to_cell(Gtk.TreePath(top), None, True, 0.0,
+                                        0.0)
+                if selected is not None:
+                    if start >= 0 and selected >= start:
+                        selected += shift
+                    view.get_selection().select_path(Gtk.TreePath(selected))
+
+        return iter_
+
+    def scan_elements(self, elements, deliver, finish=None, done=None):
+        """Resolve playlist elements in the background.
+
+        Tag reading happens in a worker pool and finished rows are passed
+        to deliver in playlist order, a batch at a time.
+        """
 
-        return False
+        def _done():
+            get_tagcache().flush()
+            if done is not None:
+                done()
+
+        def _deliver(rows):
+            if self.no_more_files:
+                self.no_more_files = False
+                scanner.cancel()
+            else:
+                deliver(rows)
+
+        scanner = MediaScanner(elements, probe_media,
+                               finish or partial(self.finish_media_metadata,
+                                                 wait=False),
+                               _deliver, _done, self.fill_stopper)
+        return scanner
 
     def filter_allowed_controls(self, items):
         """Interlude playlist must not contain certain playlist controls."""
@@ -3132,6 +3437,18 @@ class IDJC_Media_Player:
         return False
 
     def get_elements_from(self, pathnames):
+        """Playlist rows from pathnames with tags read in the caller."""
+
+        for each in self.iter_elements_from(pathnames):
+            if isinstance(each, Pending):
+                each = self.get_media_metadata(each.pathname)
+                if not each:
+                    continue
+            yield each
+
+    def iter_elements_from(self, pathnames):
+        """Playlist rows or Pending scans from pathnames."""
+
         self.no_more_files = False
         l = len(pathnames)
         if l == 1:
@@ -3157,9 +3474,7 @@ class IDJC_Media_Player:
 
     def get_elements_from_chosen(self, chosenfiles):
         for each in chosenfiles:
-            meta = self.get_media_metadata(each)
-            if meta:
-                yield meta
+            yield Pending(each)
 
     def get_elements_from_cue(self, filename):
         cuesheet_entry = self.make_cuesheet_playlist_entry(filename)
@@ -3169,9 +3484,7 @@ class IDJC_Media_Player:
         # Multi file cue sheet adds as content files.
         if len(set(pathnames)) > 1:
             for each in pathnames:
-                meta = self.get_media_metadata(each)
-                if meta:
-                    yield meta
+                yield Pending(each)
         else:
             if any(pathnames):
                 yield cuesheet_entry
@@ -3203,9 +3516,7 @@ class IDJC_Media_Player:
                 if not filename.startswith("."):
                     directories.add(filename)
             else:
-                meta = self.get_media_metadata(pathname)
-                if meta:
-                    yield meta
+                yield Pending(pathname)
 
         if depth:
             for subdir in directories:
@@ -3243,9 +3554,7 @@ class IDJC_Media_Player:
                 for meta in gen:
                     yield meta
                 return
-            meta = self.get_media_metadata(each)
-            if meta:
-                yield meta
+            yield Pending(each)
             line += 1
 
     def get_elements_from_pls(self, filename):
@@ -3276,9 +3585,7 @@ class IDJC_Media_Player:
                 print("Problem getting file path from playlist")
             else:
                 if os.path.isfile(path):
-                    meta = self.get_media_metadata(path)
-                    if meta:
-                        yield meta
+                    yield Pending(path)
 
     def get_elements_from_xspf(self, filename):
 
@@ -3434,7 +3741,7 @@ class IDJC_Media_Player:
             else:
                 if context.get_actions() == Gdk.DragAction.MOVE:
                     context.finish(True, True, etime)
-                elements = self.get_elements_from([
+                elements = self.iter_elements_from([
                     urllib.parse.unquote(t[7:])
                     for t in dragged.get_data().decode().strip().splitlines()
                     if t.startswith("file://")]
@@ -3442,20 +3749,22 @@ class IDJC_Media_Player:
                 try:
                     path, pos = treeview.get_dest_row_at_pos(x, y)
                 except (ValueError, TypeError):
-                    idle_add(self.drag_data_received_data_idle, model, None,
-                                                                    elements)
+                    dest = [None, False]
                 else:
-                    for element in elements:
-                        iter_ = model.get_iter(path)
-                        if pos in (Gtk.TreeViewDropPosition.BEFORE,
-                                   Gtk.TreeViewDropPosition.INTO_OR_BEFORE):
-                            iter_ = model.insert_before(iter_, element)
-                        else:
-                            iter_ = model.insert_after(iter_, element)
+                    dest = [model.get_iter(path), pos in (
+                        Gtk.TreeViewDropPosition.BEFORE,
+                        Gtk.TreeViewDropPosition.INTO_OR_BEFORE)]
 
-                        idle_add(self.drag_data_received_data_idle,
-                                 model, iter_, elements)
-                        break
+                def deliver(rows):
+                    if rows:
+                        dest[:] = self._insert_rows(rows, *dest), False
+
+                reselect = dest[0] is not None
+
+                def done():
+                    self.reselect_please = reselect
+
+                self.scan_elements(elements, deliver, done=done)
         else:
             treeselection = treeview.get_selection()
             model, iter_ = treeselection.get_selected()
@@ -3474,40 +3783,6 @@ class IDJC_Media_Player:
                 context.finish(False, False, etime)
         return True
 
-    @threadslock
-    def drag_data_received_data_idle(self, model, iter_, elements,
-                                                timestamp=None, reselect=True):
-        if timestamp is not False:
-            if timestamp is not None:
-                if time.time() > timestamp + 4:
-                    self.fill_stopper.show()
-                    timestamp = False
-            else:
-                timestamp = time.time()
-                self.fill_stopper.register(elements)
-
-        if self.no_more_files:
-            self.no_more_files = False
-        else:
-            for element in elements:
-                if iter_ is None:
-                    iter_ = model.append(element)
-                    reselect = False
-                else:
-                    iter_ = model.insert_after(iter_, element)
-
-                if not self.fill_stopper.check(elements):
-                    elements = []
-
-                idle_add(self.drag_data_received_data_idle,
-                         model, iter_, elements)
-                break
-            else:
-                self.fill_stopper.unregister(elements)
-                self.reselect_please = reselect
-
-        return False
-
     sourcetargets = [
         ('MY_TREE_MODEL_ROW', Gtk.TargetFlags.SAME_WIDGET, 0),
         ('text/plain', 0, 1),
@@ -3551,6 +3826,8 @@ class IDJC_Media_Player:
             if row.cuesheet:
                 self.cuesheet_playlist.treeview.set_model(row.cuesheet)
                 self.cuesheet_playlist.show()
+            if not self.player_is_playing:
+                self.preload(model, iter)
         self.update_time_stats()
 
     def cb_playlist_changed(self, treemodel, path, iter=None):
@@ -4386,6 +4663,7 @@ class IDJC_Media_Player:
                                        str, str, CueSheetListStore, str, str)
         self.templist = Gtk.ListStore(str, str, int, str, str, str,
                                       str, str, CueSheetListStore, str, str)
+        self.block_index = BlockIndex(self.liststore)
         self.treeview = Gtk.TreeView(self.liststore)
         self.rgcellrender = Gtk.CellRendererText()
         self.playtimecellrender = Gtk.CellRendererText()
@@ -4433,6 +4711,8 @@ class IDJC_Media_Player:
             "row_activated",
             self.cb_doubleclick,
             "Double click")
+        self._preload_source_id = 0
+        self._preloaded = None
         self.treeview.get_selection().connect(
             "changed",
             self.cb_selection_changed)
@@ -4441,6 +4721,10 @@ class IDJC_Media_Player:
 
         self.liststore.connect("row-inserted", self.cb_playlist_changed)
         self.liststore.connect("row-deleted", self.cb_playlist_changed)
+        self._session_rows = self._session_cues = None
+        for signal in ("row-changed", "row-inserted", "row-deleted",
+                       "rows-reordered"):
+            self.liststore.connect(signal, self._cb_session_rows_changed)
 
         self.scrolllist.add(self.treeview)
         self.treeview.show()
@@ -0,0 +1,150 @@
+"""Storage format of the player playlists in the session.
+
+A playlist file is JSON lines. The first line is a header object carrying
+the format version, each line after that is one playlist row as an array.
+A cue sheet is stored as an array of track arrays, or null.
+
+Playlists saved by older versions are "pe=" lines in the player session
+file which can be read with unpack_legacy.
+"""
+
+#   Copyright (C) 2026 Stephen Fairchild (s-fairchild@users.sourceforge.net)
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program in the file entitled COPYING.
+#   If not, see <http://www.gnu.org/licenses/>.
+
+
+__all__ = ["dumps", "loads", "unpack_legacy", "LegacyRowError"]
+
+
+import ast
+import json
+
+
+MAGIC = "idjc-playlist"
+
+# Bump when the meaning of a row changes.
+VERSION = 1
+
+# Index of the cue sheet within a row.
+CUESHEET = 8
+
+
+def dumps(rows):
+    """Playlist file content for rows of plain values.
+
+    The cue sheet of a row is None or a sequence of track tuples.
+    """
+
+    lines = [json.dumps({MAGIC: VERSION})]
+    lines.extend(json.dumps(x, check_circular=False) for x in rows)
+    lines.append("")
+    return "\n".join(lines)
+
+
+def loads(text):
+    """The rows of a playlist file as lists.
+
+    The whole file is handed to the JSON decoder as one array. ValueError is
+    raised for files of an unknown format or version.
+    """
+
+    header, sep, body = text.partition("\n")
+    if json.loads(header).get(MAGIC) != VERSION:
+        raise ValueError("unsupported playlist format: %s" % header.strip())
+
+    body = body.strip()
+    if not body:
+        return []
+    rows = json.loads("[" + body.replace("\n", ",") + "]")
+    if not all(isinstance(x, list) for x in rows):
+        raise ValueError("playlist rows must be arrays")
+    return rows
+
+
+class LegacyRowError(ValueError):
+    """A legacy "pe=" line that could not be read in full.
+
+    row holds the values read before the fault so the filename at least
+    can be kept.
+    """
+
+    def __init__(self, message, row):
+        ValueError.__init__(self, message)
+        self.row = row
+
+
+def _cue_tracks(text, name):
+    """Parse the legacy cue sheet repr without evaluating it.
+
+    Only a tuple of calls to name with literal arguments is accepted.
+    Returns a list of (args, kwargs) pairs.
+    """
+
+    tree = ast.parse(text, mode="eval").body
+    if not isinstance(tree, ast.Tuple):
+        raise ValueError("cue sheet is not a tuple")
+
+    tracks = []
+    for call in tree.elts:
+        if not isinstance(call, ast.Call) or \
+                not isinstance(call.func, ast.Name) or call.func.id != name:
+            raise ValueError("cue sheet element is not a %s" % name)
+        args = [ast.literal_eval(x) for x in call.args]
+        kwargs = {x.arg: ast.literal_eval(x.value) for x in call.keywords}
+        tracks.append((args, kwargs))
+    return tracks
+
+
+def unpack_legacy(text, track_type):
+    """The row of a legacy "pe=" line, text being what follows the "=".
+
+    Each value is a type letter, a length, a colon, and that many
+    characters. track_type makes the cue sheet tracks.
+    Raises LegacyRowError on bad input.
+    """
+
+    row = []
+    try:
+        _unpack_legacy_values(text, track_type, row)
+    except (ValueError, IndexError, SyntaxError, TypeError) as e:
+        raise LegacyRowError(str(e), row)
+    return row
+
+
+def _unpack_legacy_values(text, track_type, row):
+    """Append the values of a legacy line to row."""
+
+    start = 0
+    end_of_line = len(text.rstrip("\n"))
+    while start < end_of_line:
+        colon = text.index(":", start)
+        nextstart = colon + 1 + int(text[start + 1:colon])
+        if nextstart > end_of_line:
+            raise ValueError("truncated playlist value")
+        value = text[colon + 1:nextstart]
+        kind = text[start]
+        if kind == "i":
+            value = int(value)
+        elif kind == "f":
+            value = float(value)
+        elif kind == "c":
+            value = [track_type(*a, **k) for a, k in
+                     _cue_tracks(value, track_type.__name__)]
+        elif kind == "n":
+            value = None
+        elif kind != "s":
+            raise ValueError("unknown playlist value type %s" % kind)
+        row.append(value)
+        start = nextstart
@@ -147,6 +147,13 @@ class ArgumentParserImplementation(object, metaclass=Singleton):
             description=description + " " + _("-- sub-command: ls -- list "
                                         "available profiles"), epilog=epilog)
 
+        # TC: a command line option help string.
+        sp_tagcache = sp.add_parser("tagcache", add_help=False,
+                                help=_("maintain a profile's tag cache"),
+            # TC: do not translate the word tagcache.
+            description=description + " " + _("-- sub-command: tagcache -- "
+            "maintain the cache of media file tag data"), epilog=epilog)
+
         sp_run.add_argument("-h", "--help", action="help",
                                     help=_('show this help message and exit'))
         sp_run.add_argument("-d", "--dialog", dest="dialog", nargs=1,
@@ -179,6 +186,12 @@ class ArgumentParserImplementation(object, metaclass=Singleton):
                 help=_('No JACK ports will be connected except those listed in'
                 ' the session file.'))
 
+        sp_run.add_argument("--meters", dest="meters", nargs=1,
+                choices=("binary", "text"),
+                help=_("""how meter levels are passed from the audio backend
+                -- binary frames are pushed over a dedicated pipe whereas text
+                is the older line based polling method and the fallback"""))
+
         group = sp_run.add_argument_group(_("user interface settings"))
         group.add_argument("-c", "--channels", dest="channels", nargs="+",
                 metavar="c",
@@ -244,6 +257,31 @@ class ArgumentParserImplementation(object, metaclass=Singleton):
                 help=_('show this help message and exit'))
         sp_ls.add_argument("--dummyarg", dest="ls", help=argparse.SUPPRESS)
 
+        sp_tagcache.add_argument("-h", "--help", action="help",
+                help=_('show this help message and exit'))
+        sp_tagcache.add_argument("tagcache", choices=("warm", "prune", "info"),
+                help=_("""warm: read the tags of the specified media files
+                and directories in advance -- prune: remove entries for files
+                that have changed or gone missing -- info: show the size of
+                the cache"""))
+        # TC: command line help placeholder.
+        sp_tagcache.add_argument("pathnames", metavar=_("pathname"),
+                nargs="*", help=_("media files or directories to scan"))
+        # TC: command line help placeholder.
+        sp_tagcache.add_argument("-p", "--profile", dest="profile", nargs=1,
+                metavar=_("profile_name"),
+                help=_("the profile whose cache to use -- defaults to the "
+                "default profile"))
+        # TC: command line help placeholder.
+        sp_tagcache.add_argument("--max-entries", dest="max_entries", nargs=1,
+                type=int, metavar=_("number"),
+                help=_("prune the least recently used entries down to this "
+                "number"))
+        # TC: command line help placeholder.
+        sp_tagcache.add_argument("--max-age", dest="max_age", nargs=1,
+                type=int, metavar=_("days"),
+                help=_("prune entries not used in this many days"))
+
 
     def parse_args(self):
         try:
@@ -392,6 +430,7 @@ class ProfileManager(object, metaclass=Singleton):
 
 
     _profile = _dbus_bus_name = _profile_dialog = _init_time = None
+    _tagcache_args = None
     _iconpathname = PGlobs.default_icon
 
     _textoptionals = ("nickname", "description")
@@ -442,6 +481,20 @@ class ProfileManager(object, metaclass=Singleton):
         except EnvironmentError as e:
             ap.error(_("ls failed: %s") % e)
 
+        if "tagcache" in args:
+            # Tag cache maintenance runs against the profile directory and
+            # without the user interface. See the package main function.
+            profile = args.profile[0] if args.profile else default
+            if not profile_name_valid(profile):
+                ap.error(_("the specified profile name is not valid"))
+            if not os.path.isdir(PGlobs.profile_dir / profile):
+                ap.error(_('profile %s does not exist') % profile)
+            self._profile = profile
+            self._session_type, self._session_dir, self._session_name, \
+                                self._session_uuid = "L0", None, "default", None
+            self._tagcache_args = args
+            return
+
         self._session_type, self._session_dir, self._session_name, \
                             self._session_uuid = self._parse_session(ap, args)
 
@@ -526,6 +579,13 @@ class ProfileManager(object, metaclass=Singleton):
         return self._profile
 
 
+    @property
+    def tagcache_args(self):
+        """Arguments of the tagcache sub-command when that is in use."""
+
+        return self._tagcache_args
+
+
     @property
     def iconpathname(self):
         return self._iconpathname
@@ -0,0 +1,272 @@
+"""Local full text index of a song title database.
+
+The search page can run its fuzzy search against this SQLite FTS5 copy of
+the song, artist, and album tables rather than the database server. It is
+kept up to date per catalog using the catalog modification times.
+"""
+
+#   Copyright (C) 2026 Stephen Fairchild (s-fairchild@users.sourceforge.net)
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program in the file entitled COPYING.
+#   If not, see <http://www.gnu.org/licenses/>.
+
+
+__all__ = ["SearchIndex", "tokens", "refines", "matches"]
+
+
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+
+
+FILENAME = "searchindex.db"
+
+# Bump whenever the table layout or the meaning of a column changes.
+# Older databases are discarded rather than migrated.
+SCHEMA_VERSION = 1
+
+
+def tokens(text):
+    """Words of text folded much like the FTS5 unicode61 tokenizer does."""
+
+    text = unicodedata.normalize("NFKD", text or "").casefold()
+    text = "".join(x for x in text if not unicodedata.combining(x))
+    return re.findall(r"[^\W_]+", text)
+
+
+def refines(old_text, new_text):
+    """True when a search for new_text can only match a subset of old_text.
+
+    Each search word is a prefix so a longer word or an extra word can only
+    narrow the result. Words that split into several tokens are phrases
+    which are not handled here.
+    """
+
+    old, new = old_text.split(), new_text.split()
+    if not old or any(len(tokens(x)) != 1 for x in old + new):
+        return False
+    old = [tokens(x)[0] for x in old]
+    new = [tokens(x)[0] for x in new]
+    return all(any(n.startswith(o) for n in new) for o in old)
+
+
+def matches(text, *fields):
+    """True if every word of text prefixes a token of one of the fields.
+
+    Intended for texts that refines has approved.
+    """
+
+    words = [tokens(x)[0] for x in text.split()]
+    have = [t for f in fields for t in tokens(f)]
+    return all(any(t.startswith(w) for t in have) for w in words)
+
+
+class SearchIndex(object):
+    """Song data of one database server, searchable by words.
+
+    Updates arrive on a database accessor thread while searches are made
+    from the main thread so each has its own connection. In WAL mode a
+    search never waits on an update.
+    """
+
+    def __init__(self, pathname, source):
+        """source: identifies the database; a change of source empties it"""
+
+        self._pathname = pathname
+        self._lock = threading.Lock()
+        self._writer = self._reader = None
+
+        try:
+            self._writer = self._open(source)
+            self._reader = sqlite3.connect(pathname, check_same_thread=False)
+        except sqlite3.DatabaseError as e:
+            print("SearchIndex: discarding unusable database:", e)
+            self.close()
+            try:
+                os.unlink(pathname)
+                self._writer = self._open(source)
+                self._reader = sqlite3.connect(pathname,
+                                               check_same_thread=False)
+            except (EnvironmentError, sqlite3.DatabaseError) as e:
+                print("SearchIndex: disabled:", e)
+                self.close()
+
+    def _open(self, source):
+        db = sqlite3.connect(self._pathname, check_same_thread=False)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            version = db.execute("PRAGMA user_version").fetchone()[0]
+            if version == SCHEMA_VERSION:
+                row = db.execute("SELECT value FROM meta WHERE "
+                                 "key='source'").fetchone()
+                if row is None or row[0] != source:
+                    version = 0
+            if version != SCHEMA_VERSION:
+                for table in ("songs_fts", "songs", "catalogs", "meta"):
+                    db.execute("DROP TABLE IF EXISTS %s" % table)
+            db.execute("""CREATE TABLE IF NOT EXISTS meta (
+                            key TEXT PRIMARY KEY,
+                            value TEXT NOT NULL)""")
+            db.execute("""CREATE TABLE IF NOT EXISTS catalogs (
+                            id INTEGER PRIMARY KEY,
+                            synced INTEGER NOT NULL,
+                            cleaned INTEGER NOT NULL)""")
+            db.execute("""CREATE TABLE IF NOT EXISTS songs (
+                            id INTEGER PRIMARY KEY,
+                            artist TEXT,
+                            album TEXT,
+                            tracknumber INTEGER,
+                            title TEXT,
+                            length INTEGER,
+                            bitrate INTEGER,
+                            file TEXT,
+                            disk INTEGER,
+                            catalog INTEGER NOT NULL)""")
+            db.execute("CREATE INDEX IF NOT EXISTS songs_catalog ON "
+                       "songs (catalog)")
+            # Prefixes are indexed to make type-ahead fast.
+            db.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS songs_fts
+                            USING fts5(artist, album, title,
+                            content='songs', content_rowid='id',
+                            prefix='2 3')""")
+            db.execute("INSERT OR REPLACE INTO meta VALUES ('source', ?)",
+                       (source,))
+            db.execute("PRAGMA user_version=%d" % SCHEMA_VERSION)
+            db.commit()
+        except:
+            db.close()
+            raise
+        return db
+
+    @property
+    def available(self):
+        return self._reader is not None
+
+    def synced(self, catalog):
+        """(synced, cleaned) times of the catalog when last updated."""
+
+        with self._lock:
+            if self._writer is None:
+                return None, None
+            row = self._writer.execute("SELECT synced, cleaned FROM catalogs "
+                                       "WHERE id=?", (catalog,)).fetchone()
+        return tuple(row) if row is not None else (None, None)
+
+    def store(self, rows):
+        """Add or replace songs.
+
+        rows: (id, artist, album, tracknumber, title, length, bitrate,
+               file, disk, catalog) tuples
+        """
+
+        with self._lock:
+            db = self._writer
+            if db is None:
+                return
+            for row in rows:
+                # External content tables must be told what they are losing.
+                db.execute("INSERT INTO songs_fts (songs_fts, rowid, artist, "
+                           "album, title) SELECT 'delete', id, artist, album, "
+                           "title FROM songs WHERE id=?", (row[0],))
+                db.execute("INSERT OR REPLACE INTO songs VALUES "
+                           "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+                db.execute("INSERT INTO songs_fts (rowid, artist, album, "
+                           "title) VALUES (?, ?, ?, ?)",
+                           (row[0], row[1], row[2], row[4]))
+            db.commit()
+
+    def retain(self, catalog, ids):
+        """Remove songs of catalog whose id is not among ids."""
+
+        ids = frozenset(ids)
+        with self._lock:
+            db = self._writer
+            if db is None:
+                return 0
+            doomed = [(x,) for x, in db.execute(
+                    "SELECT id FROM songs WHERE catalog=?", (catalog,))
+                    if x not in ids]
+            db.executemany("INSERT INTO songs_fts (songs_fts, rowid, artist, "
+                           "album, title) SELECT 'delete', id, artist, album, "
+                           "title FROM songs WHERE id=?", doomed)
+            db.executemany("DELETE FROM songs WHERE id=?", doomed)
+            db.commit()
+        return len(doomed)
+
+    def mark_synced(self, catalog, synced, cleaned):
+        with self._lock:
+            if self._writer is None:
+                return
+            self._writer.execute("INSERT OR REPLACE INTO catalogs VALUES "
+                                 "(?, ?, ?)", (catalog, synced, cleaned))
+            self._writer.commit()
+
+    @staticmethod
+    def match_expression(text):
+        """An FTS5 query matching every word of text as a prefix."""
+
+        words = text.split()
+        if not words:
+            return None
+        return " ".join('"%s"*' % x.replace('"', '""') for x in words)
+
+    def _where(self, catalogs):
+        return "songs_fts MATCH ? AND catalog IN (%s)" % ",".join(
+                                                "%d" % x for x in catalogs)
+
+    def count(self, text, catalogs):
+        """The number of songs in catalogs matching all the words in text."""
+
+        match = self.match_expression(text)
+        if not self.available or match is None or not catalogs:
+            return 0
+        try:
+            return self._reader.execute(
+                "SELECT COUNT(*) FROM songs_fts JOIN songs ON "
+                "songs.id = songs_fts.rowid WHERE " + self._where(catalogs),
+                (match,)).fetchone()[0]
+        except sqlite3.Error as e:
+            print("SearchIndex: count failed:", e)
+            return 0
+
+    def search(self, text, catalogs, limit, offset):
+        """Rows laid out like those of the remote fuzzy search, best first.
+
+        Play history is not held locally so those columns are blank.
+        """
+
+        match = self.match_expression(text)
+        if not self.available or match is None or not catalogs:
+            return []
+        try:
+            return self._reader.execute(
+                "SELECT songs.artist, songs.album, tracknumber, songs.title, "
+                "length, bitrate, file, disk, catalog, NULL, NULL, 0, '0' "
+                "FROM songs_fts JOIN "
+                "songs ON songs.id = songs_fts.rowid WHERE " +
+                self._where(catalogs) + " ORDER BY rank, songs.id "
+                "LIMIT ? OFFSET ?", (match, limit, offset)).fetchall()
+        except sqlite3.Error as e:
+            print("SearchIndex: search failed:", e)
+            return []
+
+    def close(self):
+        with self._lock:
+            for db in (self._reader, self._writer):
+                if db is not None:
+                    db.close()
+            self._reader = self._writer = None
@@ -0,0 +1,120 @@
+"""Background writing of session files.
+
+Session data is snapshotted on the main thread and turned into file
+content on a worker thread. A file is rewritten only when its content
+has changed and it is replaced atomically so a crash or a reader never
+sees it half written.
+"""
+
+#   Copyright (C) 2026 Stephen Fairchild (s-fairchild@users.sourceforge.net)
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program in the file entitled COPYING.
+#   If not, see <http://www.gnu.org/licenses/>.
+
+
+__all__ = ["SessionStore", "get_session_store", "write_atomic"]
+
+
+import os
+import queue
+import hashlib
+import threading
+import traceback
+
+
+def write_atomic(pathname, data):
+    """Replace the file at pathname with data, which is str or bytes."""
+
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    temp = pathname + ".tmp"
+    with open(temp, "wb") as fh:
+        fh.write(data)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(temp, pathname)
+
+
+class SessionStore(object):
+    """A worker thread that writes session files in the order submitted.
+
+    Jobs must not touch Gtk objects. Anything they need from the user
+    interface has to be copied on the main thread.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._written = {}      # pathname -> digest of the content
+        thread = threading.Thread(target=self._run)
+        thread.daemon = True
+        thread.start()
+
+    def call(self, fn, *args):
+        """Run fn(*args) on the worker thread."""
+
+        self._queue.put((fn, args))
+
+    def write(self, pathname, serialize, *args):
+        """Write serialize(*args) to pathname if it differs from last time.
+
+        The return value of serialize is str or bytes.
+        """
+
+        self.call(self._write, str(pathname), serialize, args)
+
+    def flush(self):
+        """Wait for everything submitted so far to be written."""
+
+        self._queue.join()
+
+    def _write(self, pathname, serialize, args):
+        data = serialize(*args)
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        digest = hashlib.sha1(data).digest()
+        if self._written.get(pathname) == digest and \
+                                                os.path.exists(pathname):
+            return
+
+        try:
+            write_atomic(pathname, data)
+        except EnvironmentError as e:
+            print("SessionStore: failed to write %s: %s" % (pathname, e))
+        else:
+            self._written[pathname] = digest
+
+    def _run(self):
+        while 1:
+            fn, args = self._queue.get()
+            try:
+                fn(*args)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                self._queue.task_done()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_session_store():
+    """The session store shared by all session savers, made on first use."""
+
+    global _store
+
+    with _store_lock:
+        if _store is None:
+            _store = SessionStore()
+        return _store
@@ -26,7 +26,7 @@ import gettext
 import threading
 import json
 from functools import partial, wraps
-from collections import deque, defaultdict
+from collections import deque, defaultdict, OrderedDict
 from contextlib import contextmanager
 from urllib.parse import quote
 
@@ -46,6 +46,10 @@ from idjc import FGlobs
 from .tooltips import set_tip
 from .gtkstuff import threadslock, gdklock, DefaultEntry, NotebookSR
 from .gtkstuff import idle_add, timeout_add, source_remove
+from .generictreemodel import GenericTreeModel
+from .prelims import ProfileManager
+from .searchindex import SearchIndex, FILENAME as SEARCHINDEX_FILENAME
+from .searchindex import refines, matches
 
 
 __all__ = ['MediaPane', 'have_songdb']
@@ -81,36 +85,37 @@ def thread_only(func):
     return inner
 
 
-class DBAccessor(threading.Thread):
-    """A class to hide the intricacies of database access.
+# Priority lanes of the DBAccessor, most urgent first.
+INTERACTIVE, NORMAL, BULK = range(3)
 
-    When the database connection is dropped due to timeout it will silently
-    remake the connection and continue on with its work.
-    """
+# MySQL error raised by a query that has been the target of KILL QUERY.
+ER_QUERY_INTERRUPTED = 1317
 
-    def __init__(self, hostnameport, user, password, database, notify):
-        """The notify function must lock gtk before accessing widgets."""
 
-        threading.Thread.__init__(self)
-        try:
-            hostname, port = hostnameport.rsplit(":", 1)
-            port = int(port)
-        except ValueError:
-            hostname = hostnameport
-            port = 3306  # MySQL uses this as the default port.
+class DBLane(object):
+    """A queue of jobs run in order, one at a time, by a DBAccessor.
 
-        self.hostname = hostname
-        self.port = port
-        self.user = user
-        self.password = password
-        self.database = database
-        self.notify = notify
-        self._handle = None  # No connections made until there is a query.
-        self._cursor = None
+    Each page of the user interface has its own lane so it sees its
+    replies in the order of its requests. Lanes with higher priority get
+    first call on a free connection. While a job runs its lane stands in
+    for the connection that is running it.
+    """
+
+    def __init__(self, pool, priority):
+        self._pool = pool
+        self.priority = priority
         self.jobs = deque()
-        self.semaphore = threading.Semaphore()
-        self.keepalive = True
-        self.start()
+        self.busy = False
+        self.worker = None
+        self.current = None
+
+    @property
+    def keepalive(self):
+        return self._pool.keepalive
+
+    @property
+    def source(self):
+        return self._pool.source
 
     def request(self, sql_query, handler, failhandler=None):
         """Add a request to the job queue.
@@ -121,34 +126,145 @@ class DBAccessor(threading.Thread):
             True: to cancel the job
         """
 
-        self.jobs.append((sql_query, handler, failhandler))
-        self.semaphore.release()
+        self._pool.submit(self, (sql_query, handler, failhandler, time.time()))
 
-    def close(self):
-        """Clean up the worker thread prior to disposal."""
+    def purge_job_queue(self, remain=0, match=None):
+        """Drop queued jobs leaving the most recent.
 
-        if self.is_alive():
-            self.keepalive = False
-            self.semaphore.release()
-            return
+        Given a match function, only jobs for which it returns True are
+        considered and other jobs are left untouched.
+        """
+
+        with self._pool.cond:
+            if match is None:
+                while len(self.jobs) > remain:
+                    self.jobs.popleft()
+            else:
+                doomed = [job for job in self.jobs if match(job)]
+                for job in doomed[:max(0, len(doomed) - remain)]:
+                    self.jobs.remove(job)
+
+    def cancel(self, match=None):
+        """Interrupt the job that is running, if any.
+
+        Given a match function the job is only interrupted if it returns
+        True. The job's failhandler sees error ER_QUERY_INTERRUPTED.
+        """
+
+        with self._pool.cond:
+            job, worker = self.current, self.worker
+            if job is None or worker.thread_id is None or \
+                                        (match is not None and not match(job)):
+                return False
+            worker.kill_target = job
+            thread_id = worker.thread_id
+        self._pool.kill_query(thread_id)
+        return True
+
+    def disconnect(self):
+        self.worker.disconnect()
+
+    def replace_cursor(self, cursor):
+        """Handler may break off the cursor to pass along its data."""
+
+        self.worker.replace_cursor(cursor)
+
+
+class DBConnection(threading.Thread):
+    """One connection of a DBAccessor and the thread that works it.
+
+    When the database connection is dropped due to timeout it will silently
+    remake the connection and continue on with its work.
+    """
+
+    # Seconds of idleness between checks that the connection is alive.
+    PING_INTERVAL = 60.0
+
+    def __init__(self, pool):
+        threading.Thread.__init__(self)
+        self._pool = pool
+        self._handle = None  # No connections made until there is a query.
+        self._cursor = None
+        self.thread_id = None
+        self.kill_target = None
+        self.start()
+
+    def _close(self):
+        try:
+            self._cursor.close()
+        except Exception:
+            pass
+
+        try:
+            self._handle.close()
+        except Exception:
+            pass
+
+        self._cursor = self._handle = self.thread_id = None
+
+    def _ping(self, notify):
+        """Health check an idle connection, dropping it if it has gone bad.
+
+        A failed ping merely defers the reconnect until there is work.
+        """
+
+        if self._handle is not None:
+            try:
+                self._handle.ping()
+            except sql.Error as e:
+                print(e)
+                self._close()
+                notify(_('Connection dropped'))
+
+    def _connect(self, notify, trycount):
+        notify(_('Connecting'))
+        try:
+            self._handle = self._pool.connect()
+            self._cursor = self._handle.cursor()
+            self.thread_id = self._handle.thread_id()
+        except sql.Error as e:
+            notify(_("Connection failed (try %d)") % trycount)
+            print(e)
+            time.sleep(0.5)
+        else:
+            # This causes problems if other
+            # processes try to access the database,
+            # so set autocommit to 1
+            try:
+                self._handle.autocommit(True)
+            except sql.MySQLError:
+                notify(_('Connected: autocommit mode failed'))
+            else:
+                notify(_('Connected: autocommit mode set'))
+        notify(_('Connected'))
 
     def run(self):
         """This is the worker thread."""
 
-        notify = partial(idle_add, threadslock(self.notify))
+        pool = self._pool
+        notify = partial(idle_add, threadslock(pool.notify))
 
         try:
-            while self.keepalive:
-                self.semaphore.acquire()
-                if self.keepalive and self.jobs:
-                    query, handler, failhandler = self.jobs.popleft()
-
+            while pool.keepalive:
+                lane, job = pool.next_job(self, self.PING_INTERVAL)
+                if job is None:
+                    if pool.keepalive:
+                        self._ping(notify)
+                    continue
+
+                query, handler, failhandler, queued = job
+                try:
                     trycount = 0
                     while trycount < 3:
                         try:
                             try:
                                 rows = self._cursor.execute(*query)
                             except sql.Error as e:
+                                if e.args and e.args[0] == \
+                                        ER_QUERY_INTERRUPTED and \
+                                        self.kill_target is not job:
+                                    # Hit by a kill meant for an earlier job.
+                                    continue
                                 if failhandler is not None:
                                     if failhandler(e, notify):
                                         break
@@ -156,93 +272,199 @@ class DBAccessor(threading.Thread):
                                 else:
                                     raise e
                         except (sql.Error, AttributeError) as e:
-                            if not self.keepalive:
+                            if not pool.keepalive:
                                 return
 
                             if isinstance(e, sql.OperationalError):
                                 # Unhandled errors will be treated like
                                 # connection failures.
-                                try:
-                                    self._cursor.close()
-                                except Exception:
-                                    pass
-
-                                try:
-                                    self._handle.close()
-                                except Exception:
-                                    pass
+                                self._close()
 
-                            if not self.keepalive:
+                            if not pool.keepalive:
                                 return
 
-                            notify(_('Connecting'))
                             trycount += 1
-                            try:
-                                self._handle = sql.Connection(
-                                    host=self.hostname, port=self.port,
-                                    user=self.user, passwd=self.password,
-                                    db=self.database, connect_timeout=6,
-                                    charset='utf8',
-                                    compress=True)
-                                self._cursor = self._handle.cursor()
-                            except sql.Error as e:
-                                notify(_("Connection failed (try %d)") %
-                                                                    trycount)
-                                print(e)
-                                time.sleep(0.5)
-                            else:
-                                # This causes problems if other
-                                # processes try to access the database,
-                                # so set autocommit to 1
-                                try:
-                                    self._handle.autocommit(True)
-                                except sql.MySQLError:
-                                    notify(_('Connected: autocommit mode failed'))
-                                else:
-                                    notify(_('Connected: autocommit mode set'))
-                            notify(_('Connected'))
+                            self._connect(notify, trycount)
                         else:
-                            if not self.keepalive:
+                            if not pool.keepalive:
                                 return
-                            handler(self, self.request, self._cursor, notify,
+                            handler(lane, lane.request, self._cursor, notify,
                                                                         rows)
                             break
                     else:
                         notify(_('Job dropped'))
+                finally:
+                    pool.job_done(lane, queued)
         finally:
-            try:
-                self._cursor.close()
-            except Exception:
-                pass
-            try:
-                self._handle.close()
-            except Exception:
-                pass
+            self._close()
             notify(_('Disconnected'))
 
-    @thread_only
-    def purge_job_queue(self, remain=0):
-        while len(self.jobs) > remain:
-            self.jobs.popleft()
-            self.semaphore.acquire()
-
     @thread_only
     def disconnect(self):
         try:
             self._handle.close()
         except sql.Error:
-            idle_add(threadslock(self.notify), _('Problem dropping connection'))
+            idle_add(threadslock(self._pool.notify),
+                                            _('Problem dropping connection'))
         else:
-            idle_add(threadslock(self.notify), _('Connection dropped'))
+            idle_add(threadslock(self._pool.notify), _('Connection dropped'))
 
     @thread_only
     def replace_cursor(self, cursor):
-        """Handler may break off the cursor to pass along its data."""
-
         assert cursor is self._cursor
         self._cursor = self._handle.cursor()
 
 
+class DBAccessor(object):
+    """A class to hide the intricacies of database access.
+
+    A small pool of connections serves a number of priority lanes. Work in
+    the bulk lane never occupies more than one connection, which leaves
+    the rest for interactive use.
+    """
+
+    CONNECTIONS = 2
+
+    # Minimum seconds between metrics reports while work is queued.
+    METRICS_INTERVAL = 0.25
+
+    def __init__(self, hostnameport, user, password, database, notify,
+                                                                metrics=None):
+        """The notify function must lock gtk before accessing widgets.
+
+        The metrics function is called in the main thread with the number
+        of outstanding jobs and the average job latency in seconds.
+        """
+
+        try:
+            hostname, port = hostnameport.rsplit(":", 1)
+            port = int(port)
+        except ValueError:
+            hostname = hostnameport
+            port = 3306  # MySQL uses this as the default port.
+
+        self.hostname = hostname
+        self.port = port
+        self.user = user
+        self.password = password
+        self.database = database
+        self.notify = notify
+        self.metrics = metrics
+        self.keepalive = True
+        self.cond = threading.Condition()
+        self.lanes = [DBLane(self, x) for x in (INTERACTIVE, NORMAL, BULK)]
+        self._latency = 0.0
+        self._last_report = 0.0
+        self._killer = None
+        self._kill_lock = threading.Lock()
+        self._workers = [DBConnection(self) for x in range(self.CONNECTIONS)]
+
+    @property
+    def source(self):
+        """Identifies the database for the purpose of caching its data."""
+
+        return "%s:%d/%s" % (self.hostname, self.port, self.database)
+
+    def lane(self, priority):
+        return self.lanes[priority]
+
+    def request(self, sql_query, handler, failhandler=None):
+        """Add a request to the job queue of the normal lane."""
+
+        self.lanes[NORMAL].request(sql_query, handler, failhandler)
+
+    def connect(self):
+        return sql.Connection(host=self.hostname, port=self.port,
+                              user=self.user, passwd=self.password,
+                              db=self.database, connect_timeout=6,
+                              charset='utf8', compress=True)
+
+    def close(self):
+        """Clean up the worker threads prior to disposal."""
+
+        with self.cond:
+            self.keepalive = False
+            self.cond.notify_all()
+        with self._kill_lock:
+            try:
+                self._killer.close()
+            except Exception:
+                pass
+            self._killer = None
+
+    def kill_query(self, thread_id):
+        """Interrupt what a connection is doing, from another connection."""
+
+        threading.Thread(target=self._kill_query, args=(thread_id,)).start()
+
+    def _kill_query(self, thread_id):
+        with self._kill_lock:
+            for attempt in range(2):
+                if not self.keepalive:
+                    return
+                try:
+                    if self._killer is None:
+                        self._killer = self.connect()
+                    cursor = self._killer.cursor()
+                    cursor.execute("KILL QUERY %d" % thread_id)
+                    cursor.close()
+                except sql.Error as e:
+                    print("kill query failed:", e)
+                    try:
+                        self._killer.close()
+                    except Exception:
+                        pass
+                    self._killer = None
+                else:
+                    return
+
+    def submit(self, lane, job):
+        with self.cond:
+            lane.jobs.append(job)
+            self.cond.notify()
+        self._report()
+
+    def next_job(self, worker, timeout):
+        """Wait for a job to run. Returns (None, None) upon timeout."""
+
+        with self.cond:
+            while self.keepalive:
+                for lane in self.lanes:
+                    if lane.jobs and not lane.busy:
+                        lane.busy = True
+                        lane.worker = worker
+                        lane.current = lane.jobs.popleft()
+                        return lane, lane.current
+                if not self.cond.wait(timeout):
+                    break
+        return None, None
+
+    def job_done(self, lane, queued):
+        with self.cond:
+            lane.worker.kill_target = None
+            lane.busy = False
+            lane.worker = lane.current = None
+            # Exponential moving average of the time to complete a request.
+            self._latency += (time.time() - queued - self._latency) * 0.2
+            # Another worker may be waiting on this lane.
+            self.cond.notify_all()
+        self._report()
+
+    @property
+    def depth(self):
+        """The number of jobs queued or running."""
+
+        return sum(len(x.jobs) + x.busy for x in self.lanes)
+
+    def _report(self):
+        if self.metrics is not None:
+            now = time.time()
+            depth = self.depth
+            if not depth or now > self._last_report + self.METRICS_INTERVAL:
+                self._last_report = now
+                idle_add(threadslock(self.metrics), depth, self._latency)
+
+
 class UseSettings(dict):
     """Holder of data generated while using the database.
 
@@ -431,6 +653,11 @@ class PrefsControls(Gtk.Frame):
         self._statusbar.push(cid, _('Disconnected'))
         hbox.pack_start(self._statusbar, True, True, 0)
 
+        self._metrics_label = Gtk.Label()
+        set_tip(self._metrics_label, _('Database requests outstanding and '
+                                       'the average time taken to serve one.'))
+        hbox.pack_start(self._metrics_label, False, False, 0)
+
         if have_songdb:
             vbox.pack_start(hbox, False, False, 0)
         else:
@@ -477,6 +704,7 @@ class PrefsControls(Gtk.Frame):
                                             self._notebook.get_current_page())
             accdata, usesettings = settings.get_data()
             accdata["notify"] = self._notify
+            accdata["metrics"] = self._metrics
         else:
             accdata = usesettings = None
 
@@ -498,6 +726,7 @@ class PrefsControls(Gtk.Frame):
         else:
             self._connect.set_sensitive(True)
             self._disconnect.set_sensitive(False)
+            self._metrics_label.set_text("")
             for settings_page in self._settings:
                 settings_page.set_sensitive(True)
                 settings_page.show()
@@ -512,6 +741,14 @@ class PrefsControls(Gtk.Frame):
         # To ensure readability of long messages also set the tooltip.
         self._statusbar.set_tooltip_text(message)
 
+    def _metrics(self, depth, latency):
+        """Display the load on the database connection pool."""
+
+        if self.dbtoggle.get_active():
+            # TC: Database job queue depth and average request latency.
+            self._metrics_label.set_text(_('%d queued, %d ms') % (
+                                                depth, int(latency * 1000)))
+
 
 class PageCommon(Gtk.VBox):
     """Base class for all pages."""
@@ -559,11 +796,7 @@ class PageCommon(Gtk.VBox):
         self._usesettings = usesettings
 
     def deactivate(self):
-        while self._update_id:
-            context, namespace = self._update_id.popleft()
-            namespace[0] = True
-            source_remove(context)
-
+        self._kill_updates()
         self._acc = None
         model = self.tree_view.get_model()
         self.tree_view.set_model(None)
@@ -602,13 +835,8 @@ class PageCommon(Gtk.VBox):
         return list_
 
     def _handler(self, acc, request, cursor, notify, rows):
-        # Lock against the very start of the update functions.
         with gdklock():
-            while self._update_id:
-                context, namespace = self._update_id.popleft()
-                source_remove(context)
-                # Idle functions to receive the following and know to clean-up.
-                namespace[0] = True
+            self._kill_updates()
 
         try:
             self._old_cursor.close()
@@ -619,11 +847,24 @@ class PageCommon(Gtk.VBox):
 
         self._old_cursor = cursor
         acc.replace_cursor(cursor)
-        # Scrap intermediate jobs whose output would merely slow down the
-        # user interface responsiveness.
-        namespace = [False, ()]
-        context = idle_add(self._update_1, acc, cursor, rows, namespace)
-        self._update_id.append((context, namespace))
+        self._schedule_update(acc, cursor, rows)
+
+    def _kill_updates(self):
+        while self._update_id:
+            context, namespace = self._update_id.popleft()
+            source_remove(context)
+            # Idle functions to receive the following and know to clean-up.
+            namespace[0] = True
+
+    def _schedule_update(self, *args):
+        """Run _update_1 with args in the main thread, killing earlier runs."""
+
+        # Lock against the very start of the update functions.
+        with gdklock():
+            self._kill_updates()
+            namespace = [False, ()]
+            context = idle_add(self._update_1, *(args + (namespace,)))
+            self._update_id.append((context, namespace))
 
 class ViewerCommon(PageCommon):
     """Base class for TreePage and FlatPage."""
@@ -864,6 +1105,11 @@ class TreePage(ViewerCommon):
                      int, int, int, str, str, int, str
     BLANK_ROW = tuple(x() for x in DATA_SIGNATURE[2:])
 
+    # Rows handled between progress updates.
+    POPULATE_BATCH = 500
+    # Seconds the tree builder runs for per idle callback.
+    POPULATE_SLICE = 0.05
+
     def __init__(self, notebook, catalogs):
         self.controls = Gtk.HBox()
         layout_store = Gtk.ListStore(str, Gtk.TreeStore, GObject.TYPE_PYOBJECT)
@@ -937,6 +1183,7 @@ class TreePage(ViewerCommon):
     def set_loading_view(self, loading):
         if loading:
             self.progress_bar.set_fraction(0.0)
+            self.progress_bar.set_show_text(False)
             self.loading_label.set_text(_('Fetching'))
             self.controls.hide()
             self.scrolled_window.hide()
@@ -1072,10 +1319,6 @@ class TreePage(ViewerCommon):
 
     ###########################################################################
 
-    def _handler(self, acc, request, cursor, notify, rows):
-        PageCommon._handler(self, acc, request, cursor, notify, rows)
-        acc.disconnect()
-
     def _failhandler(self, exception, notify):
         if isinstance(exception, sql.InterfaceError):
             raise exception  # Recover.
@@ -1101,122 +1344,125 @@ class TreePage(ViewerCommon):
         while self._pulse_id:
             source_remove(self._pulse_id.popleft())
 
-        # Clean away old data.
+        # Clean away old data. The stores stay detached from the view until
+        # they are fully built.
         self.tree_view.set_model(None)
         self.artist_store.clear()
         self.album_store.clear()
 
-        namespace = [False, (0.0, None, None, None, {}, None, None, None, None)]
-        do_max = min(max(30, rows / 100), 200)  # Data size to process.
-        total = 2.0 * rows
-        context = idle_add(self._update_2, acc, cursor, total, do_max,
-                                                            [], namespace)
+        namespace = [False, self._populate(cursor, rows)]
+        context = idle_add(self._update_2, acc, namespace)
         self._update_id.append((context, namespace))
         return False
 
     @threadslock
-    def _update_2(self, acc, cursor, total, do_max, store, namespace):
-        kill, (done, iter_l, iter_1, iter_2, letter, artist, album, art_prefix, alb_prefix) = namespace
-        if kill:
-            return False
-
-        r_append = self.artist_store.append
-        l_append = store.append
-        BLANK_ROW = self.BLANK_ROW
+    def _update_2(self, acc, namespace):
+        """Run the tree builder for a slice of time."""
 
-        rows = cursor.fetchmany(do_max)
-        if not rows:
-            store.sort()
-            namespace = [False, (done, ) + (None, ) * 11]
-            context = idle_add(self._update_3, acc, total, do_max,
-                                                        store, namespace)
-            self._update_id.append((context, namespace))
+        kill, builder = namespace
+        if kill:
             return False
 
-        for row in rows:
+        deadline = time.time() + self.POPULATE_SLICE
+        while time.time() < deadline:
             if acc.keepalive == False:
                 return False
 
-            l_append(row)
             try:
-                art_letter = row[7].decode('utf-8')[0].upper()
-            except IndexError:
-                art_letter = ""
+                next(builder)
+            except StopIteration:
+                self.progress_bar.set_show_text(False)
+                self.set_loading_view(False)
+                return False
+
+        return True
+
+    def _populate(self, cursor, rows):
+        """Generator that fills both tree stores a batch at a time.
+
+        The artist tree is built straight from the query results which come
+        in artist order. Meanwhile tracks are gathered by album so the album
+        tree needs only the albums sorting, not the whole result set.
+        """
+
+        total = max(2 * rows, 1)
+        done = 0
+        started = time.time()
+        BLANK_ROW = self.BLANK_ROW
+        NOTHING = object()
+
+        append = self.artist_store.append
+        letters = {}
+        albums = defaultdict(list)
+        artist = art_prefix = album = alb_prefix = NOTHING
+        iter_1 = iter_2 = None
+
+        while 1:
+            batch = cursor.fetchmany(self.POPULATE_BATCH)
+            if not batch:
+                break
+
+            for row in batch:
+                albums[row[0], row[1], row[2]].append(row)
+
+                art_letter = (row[7] or "")[:1].upper()
+                try:
+                    iter_l = letters[art_letter]
+                except KeyError:
+                    iter_l = letters[art_letter] = append(None,
+                                                (-1, art_letter) + BLANK_ROW)
 
-            if art_letter in letter:
-                iter_l = letter[art_letter]
-            else:
-                iter_l = letter[art_letter] = r_append(None, (-1, art_letter) + BLANK_ROW)
-            if album == row[0] and artist == row[7] and \
-                                alb_prefix == row[1] and art_prefix == row[8]:
-                iter_3 = r_append(iter_2, (0, row[6]) + row)
-                continue
-            else:
                 if artist != row[7] or art_prefix != row[8]:
                     artist = row[7]
                     art_prefix = row[8]
-                    iter_1 = r_append(iter_l, (-2, self._join(art_prefix, artist)) + BLANK_ROW)
-                    album = None
+                    iter_1 = append(iter_l,
+                        (-2, self._join(art_prefix, artist)) + BLANK_ROW)
+                    album = NOTHING
                 if album != row[0] or alb_prefix != row[1]:
                     album = row[0]
                     alb_prefix = row[1]
                     year = row[2]
                     if year:
-                        albumtext = "%s (%d)" % (self._join(alb_prefix, album), year)
+                        albumtext = "%s (%d)" % (
+                                        self._join(alb_prefix, album), year)
                     else:
                         albumtext = album
-                    iter_2 = r_append(iter_1, (-3, albumtext) + BLANK_ROW)
-                iter_3 = r_append(iter_2, (0, row[6]) + row)
+                    iter_2 = append(iter_1, (-3, albumtext) + BLANK_ROW)
+                append(iter_2, (0, row[6]) + row)
 
-        done += do_max
-        self.progress_bar.set_fraction(sorted((0.0, done / total, 1.0))[1])
-        namespace[1] = done, iter_l, iter_1, iter_2, letter, artist, album, art_prefix, alb_prefix
-        return True
-
-    @threadslock
-    def _update_3(self, acc, total, do_max, store, namespace):
-        kill, (done, iter_l, iter_1, iter_2, letter, artist, album, art_prefix, alb_prefix, year, disk, album_id) = namespace
-        if kill:
-            return False
+            done += len(batch)
+            self._populate_progress(done, total, started)
+            yield
 
         append = self.album_store.append
-        pop = store.pop
-        BLANK_ROW = self.BLANK_ROW
-        if letter is None: letter = {}
+        letters = {}
+        pending = 0
 
-        for each in range(do_max):
-            if acc.keepalive == False:
-                return False
+        def album_order(key):
+            album, alb_prefix, year = key
+            return album or "", alb_prefix or "", year or 0
 
-            try:
-                row = pop(0)
-            except IndexError:
-                self.set_loading_view(False)
-                return False
+        def track_order(row):
+            return row[3] or 0, row[4] or 0, row[5] or 0, row[6] or ""
 
+        for key in sorted(albums, key=album_order):
+            album, alb_prefix, year = key
+            alb_letter = (album or "")[:1].upper()
             try:
-                alb_letter = row[0].decode('utf-8')[0].upper()
-            except IndexError:
-                alb_letter = ""
+                iter_l = letters[alb_letter]
+            except KeyError:
+                iter_l = letters[alb_letter] = append(None,
+                                                (-1, alb_letter) + BLANK_ROW)
 
-            if alb_letter in letter:
-                iter_l = letter[alb_letter]
-            else:
-                iter_l = letter[alb_letter] = append(None, (-1, alb_letter) + BLANK_ROW)
-            if album_id == row[4]:
-                iter_3 = append(iter_2, (0, row[6]) + row)
-                continue
+            if year:
+                albumtext = "%s (%d)" % (self._join(alb_prefix, album), year)
             else:
-                if album != row[0] or year != row[2] or alb_prefix != row[1]:
-                    album = row[0]
-                    alb_prefix = row[1]
-                    year = row[2]
-                    disk = None
-                    if year:
-                        albumtext = "%s (%d)" % (self._join(alb_prefix, album), year)
-                    else:
-                        albumtext = album
-                    iter_1 = append(iter_l, (-2, albumtext) + BLANK_ROW)
+                albumtext = album
+            iter_1 = append(iter_l, (-2, albumtext) + BLANK_ROW)
+
+            disk = None
+            tracks = albums.pop(key)
+            for row in sorted(tracks, key=track_order):
                 if disk != row[3]:
                     disk = row[3]
                     if disk == 0:
@@ -1224,17 +1470,223 @@ class TreePage(ViewerCommon):
                     else:
                         iter_2 = append(iter_1, (-3, _('Disk %d') % disk)
                                                                 + BLANK_ROW)
-                iter_3 = append(iter_2, (0, row[6]) + row)
+                append(iter_2, (0, row[6]) + row)
+
+            pending += len(tracks)
+            if pending >= self.POPULATE_BATCH:
+                done += pending
+                pending = 0
+                self._populate_progress(done, total, started)
+                yield
 
-        done += do_max
+    def _populate_progress(self, done, total, started):
         self.progress_bar.set_fraction(min(done / total, 1.0))
-        namespace[1] = done, iter_l, iter_1, iter_2, letter, artist, album, art_prefix, alb_prefix, year, disk, album_id
+        elapsed = time.time() - started
+        if elapsed > 0.5:
+            self.progress_bar.set_show_text(True)
+            # TC: Rate at which the database tree view is being built.
+            self.progress_bar.set_text(_('%d rows/s') % (done / elapsed))
+
+
+class PagedResultModel(GenericTreeModel):
+    """A list model over a query result, fetched a page at a time.
+
+    Only the pages the view has asked for recently are held. Rows that
+    have not arrived yet read as blank until row-changed is emitted.
+    The tree view must be in fixed height mode or it will ask for
+    every row in order to measure them.
+    """
+
+    PAGE_SIZE = 200
+    MAX_PAGES = 20
+
+    # index(0), ARTIST(1), ALBUM(2), TRACKNUM(3), TITLE(4), DURATION(5), BITRATE(6),
+    # pathname(7), disk(8), catalog_id(9), max_date_played(10),
+    # played_by(11), played(12), played_by_me(13)
+    column_types = (int, str, str, int, str, int, int,
+                    str, int, int, str,
+                    str, int, str)
+
+    def __init__(self, acc, query, n_rows):
+        super(PagedResultModel, self).__init__()
+        self._acc = acc
+        self._query = query
+        self._n_rows = n_rows
+        self._pages = OrderedDict()
+        self._pending = set()
+        self._closed = False
+
+    def __len__(self):
+        return self._n_rows
+
+    def clear(self):
+        """Disown the result set. Pages still in flight are discarded."""
+
+        self._closed = True
+        self._pages.clear()
+        self.invalidate_iters()
+
+    def get_row(self, index):
+        """The row data at index or None if the page is not to hand."""
+
+        page, offset = divmod(index, self.PAGE_SIZE)
+        try:
+            rows = self._pages[page]
+        except KeyError:
+            self._request(page)
+            try:
+                rows = self._pages[page]
+            except KeyError:
+                return None
+        self._pages.move_to_end(page)
+        try:
+            return (index + 1,) + tuple(rows[offset])
+        except IndexError:
+            return None
+
+    def _request(self, page):
+        if page in self._pending or self._closed:
+            return
+        self._pending.add(page)
+        query = "%s\nLIMIT %d OFFSET %d" % (
+                    self._query[0], self.PAGE_SIZE, page * self.PAGE_SIZE)
+        self._acc.request((query,) + self._query[1:],
+                          partial(self._page_handler, page),
+                          partial(self._page_failhandler, page))
+
+    def _page_handler(self, page, acc, request, cursor, notify, rows):
+        try:
+            data = cursor.fetchall()
+        except sql.Error as e:
+            print(str(e))
+            data = ()
+        idle_add(self._page_arrived, page, data)
+
+    def _page_failhandler(self, page, exception, notify):
+        if exception.args[0] != ER_QUERY_INTERRUPTED:
+            notify(str(exception))
+        if exception.args[0] == 2006:
+            raise
+        idle_add(self._pending.discard, page)
         return True
 
+    def _store(self, page, data):
+        self._pages[page] = data
+        while len(self._pages) > self.MAX_PAGES:
+            self._pages.popitem(last=False)
+
+    @threadslock
+    def _page_arrived(self, page, data):
+        self._pending.discard(page)
+        if self._closed:
+            return False
+
+        self._store(page, data)
+        # Iters hold the row index and the pool of these only needs to
+        # last between updates.
+        self.invalidate_iters()
+        start = page * self.PAGE_SIZE
+        for index in range(start, min(start + len(data), self._n_rows)):
+            path = Gtk.TreePath.new_from_indices((index,))
+            self.row_changed(path, self.get_iter(path))
+        return False
+
+    def on_get_flags(self):
+        return Gtk.TreeModelFlags.LIST_ONLY
+
+    def on_get_n_columns(self):
+        return len(self.column_types)
+
+    def on_get_column_type(self, index):
+        return self.column_types[index]
+
+    def on_get_iter(self, path):
+        return path[0] if path[0] < self._n_rows else None
+
+    def on_get_path(self, index):
+        return (index,)
+
+    def on_iter_next(self, index):
+        index += 1
+        return index if index < self._n_rows else None
+
+    def on_iter_children(self, index):
+        if index is None and self._n_rows:
+            return 0
+        return None
+
+    def on_iter_has_child(self, index):
+        return False
+
+    def on_iter_n_children(self, index):
+        if index is None:
+            return self._n_rows
+        return 0
+
+    def on_iter_nth_child(self, index, n):
+        if index is None and n < self._n_rows:
+            return n
+        return None
+
+    def on_iter_parent(self, index):
+        return None
+
+    def on_get_value(self, index, column):
+        if column == 0:
+            return index + 1
+
+        row = self.get_row(index)
+        if row is None:
+            return 0 if self.column_types[column] is int else ""
+        value = row[column]
+        if value is None:
+            return 0 if self.column_types[column] is int else None
+        if self.column_types[column] is str and not isinstance(value, str):
+            return str(value)
+        return value
+
+
+class LocalResultModel(PagedResultModel):
+    """Search results from the local index, read in as the view needs them.
+
+    Rows may be given when the whole result is already known.
+    """
+
+    def __init__(self, index, text, catalogs, n_rows, rows=None):
+        super(LocalResultModel, self).__init__(None, None, n_rows)
+        self._index = index
+        self.text = text
+        self.catalogs = catalogs
+        if rows is not None:
+            self._store(0, rows)
+
+    def narrow(self, text):
+        """A model for a refinement of this search, if it can be had cheaply.
+
+        That is when the entire result set is in memory.
+        """
+
+        if self._n_rows > self.PAGE_SIZE or 0 not in self._pages or \
+                                                not refines(self.text, text):
+            return None
+        rows = [x for x in self._pages[0] if matches(text, x[0], x[1], x[3])]
+        return LocalResultModel(self._index, text, self.catalogs, len(rows),
+                                                                        rows)
+
+    def _request(self, page):
+        # The local index is quick enough to read from the main thread.
+        if not self._closed:
+            self._store(page, self._index.search(self.text, self.catalogs,
+                                self.PAGE_SIZE, page * self.PAGE_SIZE))
+
 
 class FlatPage(ViewerCommon):
     """Flat list based user interface with a search facility."""
 
+    # Milliseconds of typing inactivity before a fuzzy search is made.
+    SEARCH_DELAY = 300
+    LOCAL_SEARCH_DELAY = 60
+
     def __init__(self, notebook, catalogs):
         # Base class overwrites these values.
         self.scrolled_window = self.tree_view = self.tree_selection = None
@@ -1259,6 +1711,20 @@ class FlatPage(ViewerCommon):
         self.fuzzy_entry = Gtk.Entry()
         self.fuzzy_entry.connect("changed", self._cb_fuzzysearch_changed)
         fuzzy_hbox.pack_start(self.fuzzy_entry, True, True, 0)
+        # TC: Checkbutton text. Search a copy of the database on this computer.
+        self.local_search = Gtk.CheckButton(_('Local'))
+        self.local_search.set_sensitive(False)
+        self.local_search.connect("toggled", self._cb_local_search)
+        set_tip(self.local_search, _('Run the fuzzy search on a copy of the '
+                    'song titles kept on this computer. This is much faster '
+                    'when the database is remote but play history is not '
+                    'shown.'))
+        fuzzy_hbox.pack_start(self.local_search, False, False, 0)
+        self._index = self._index_acc = None
+        self._index_pending = set()
+        self._generation = 0
+        self._search_key = None
+        self._search_timeout = None
 
         where_hbox = Gtk.Box()
         filter_vbox.pack_start(where_hbox, False, False, 0)
@@ -1279,28 +1745,23 @@ class FlatPage(ViewerCommon):
         ViewerCommon.__init__(self, notebook, _("Search"), self.controls,
                                                                     catalogs)
 
-        # Row data specification:
-        # index(0), ARTIST(1), ALBUM(2), TRACKNUM(3), TITLE(4), DURATION(5), BITRATE(6),
-        # pathname(7), disk(8), catalog_id(9), max_date_played(10),
-        # played_by(11), played(12), played_by_me(13)
-        self.list_store = Gtk.ListStore(
-                            int, str, str, int, str, int, int,
-                            str, int, int, str,
-                            str, int, str)
+        # Row data is supplied by PagedResultModel. Every column has a
+        # fixed width so the tree view can run in fixed height mode.
         self.tree_cols = self._make_tv_columns(self.tree_view, (
-            ("(0)", 0, self._cell_ralign, -1, Pango.EllipsizeMode.NONE),
+            ("(0)", 0, self._cell_ralign, 10, Pango.EllipsizeMode.NONE),
             (_('Artist'), (1, 10, 11, 12, 13, 9), self._cell_show_unknown, 100, Pango.EllipsizeMode.END),
             (_('Album'), (2, 10, 11, 12, 13, 9), self._cell_show_unknown, 100, Pango.EllipsizeMode.END),
             (_('Title'), (4, 10, 11, 12, 13, 9), self._cell_show_unknown, 100, Pango.EllipsizeMode.END),
-            (_('Last Played'), (10, 11, 12, 9), self._cell_progress, -1, None, Gtk.CellRendererProgress()),
-            (_('Disk'), 8, self._cell_ralign, -1, Pango.EllipsizeMode.NONE),
-            (_('Track'), 3, self._cell_ralign, -1, Pango.EllipsizeMode.NONE),
-            (_('Duration'), 5, self._cell_secs_to_h_m_s, -1, Pango.EllipsizeMode.NONE),
-            (_('Bitrate'), 6, self._cell_k, -1, Pango.EllipsizeMode.NONE),
+            (_('Last Played'), (10, 11, 12, 9), self._cell_progress, 80, None, Gtk.CellRendererProgress()),
+            (_('Disk'), 8, self._cell_ralign, 0, Pango.EllipsizeMode.NONE),
+            (_('Track'), 3, self._cell_ralign, 0, Pango.EllipsizeMode.NONE),
+            (_('Duration'), 5, self._cell_secs_to_h_m_s, 10, Pango.EllipsizeMode.NONE),
+            (_('Bitrate'), 6, self._cell_k, 0, Pango.EllipsizeMode.NONE),
             (_('Filename'), (9, 7), self._cell_filename, 100, Pango.EllipsizeMode.END),
-            (_('Path'), (9, 7), self._cell_path, -1, Pango.EllipsizeMode.NONE),
+            (_('Path'), (9, 7), self._cell_path, 100, Pango.EllipsizeMode.END),
             ))
 
+        self.tree_view.set_fixed_height_mode(True)
         self.tree_view.set_rules_hint(True)
         self.tree_view.set_rubber_banding(True)
         self.tree_selection.set_mode(Gtk.SelectionMode.MULTIPLE)
@@ -1315,7 +1776,46 @@ class FlatPage(ViewerCommon):
     def deactivate(self):
         self.fuzzy_entry.set_text("")
         self.where_entry.set_text("")
+        self._cancel_typeahead()
         super(FlatPage, self).deactivate()
+        self._index_close()
+        self._search_key = None
+
+    def activate_index(self, accessor):
+        """Keep a local search index of the database fed from accessor.
+
+        Called from an accessor thread.
+        """
+
+        self._index_acc = accessor
+        idle_add(threadslock(self._index_open), accessor.source)
+
+    def _index_open(self, source):
+        if self._acc is None:
+            return  # Deactivated in the meantime.
+
+        index = SearchIndex(ProfileManager().basedir / SEARCHINDEX_FILENAME,
+                                                                        source)
+        if not index.available:
+            return
+        self._index = index
+        self._index_handler_id = self.catalogs.connect("changed",
+                                                        self._index_refresh)
+        self._index_refresh()
+        self.local_search.set_sensitive(True)
+        try:
+            self.local_search.set_active(self._usesettings["local search"])
+        except KeyError:
+            pass
+
+    def _index_close(self):
+        if self._index is not None:
+            self.catalogs.disconnect(self._index_handler_id)
+            self._index.close()
+            self._index = None
+        self._index_acc = None
+        self._index_pending.clear()
+        self.local_search.set_sensitive(False)
 
     def repair_focusability(self):
         PageCommon.repair_focusability(self)
@@ -1373,6 +1873,7 @@ class FlatPage(ViewerCommon):
                           OR MATCH(artist.name) against(%s)
                           OR MATCH(title) against(%s)) AND __catalogs__
                     GROUP BY song.id
+                    ORDER BY song.id
                     """),
 
             WHERE: (DIRTY, """
@@ -1402,7 +1903,28 @@ class FlatPage(ViewerCommon):
     }
     _queries_table[AMPACHE_3_7] = _queries_table[AMPACHE]
 
-    def _cb_update(self, widget):
+    # Song data for the local search index, added or changed since a time.
+    _index_query = """
+                    SELECT song.id,
+                    concat_ws(" ", artist.prefix, artist.name),
+                    concat_ws(" ", album.prefix, album.name),
+                    track, title, time, bitrate, file,
+                    album.disk, song.catalog
+                    FROM song
+                    LEFT JOIN artist ON artist.id = song.artist
+                    LEFT JOIN album ON album.id = song.album
+                    WHERE song.catalog = %s AND
+                    (song.addition_time >= %s OR song.update_time >= %s)
+                    """
+
+    def _cb_update(self, widget, typeahead=False):
+        """Run a search.
+
+        Type-ahead searches that would repeat the last one are skipped.
+        Others are always run as the database may have changed.
+        """
+
+        self._cancel_typeahead()
         self._old_cat_data = self.catalogs.copy_data()
         try:
             table = self._queries_table[self._db_type]
@@ -1411,6 +1933,10 @@ class FlatPage(ViewerCommon):
             return
 
         user_text = self.fuzzy_entry.get_text().strip()
+        if user_text and self._index is not None and \
+                                            self.local_search.get_active():
+            self._local_update(user_text, typeahead)
+            return
         if user_text:
             access_mode, query = table[FUZZY]
         else:
@@ -1418,11 +1944,8 @@ class FlatPage(ViewerCommon):
             user_text = self.where_entry.get_text().strip()
             if not user_text:
                 self.where_entry.set_text("")
-                while self._update_id:
-                    context, namespace = self._update_id.popleft()
-                    source_remove(context)
-                    namespace[0] = True
-                self.list_store.clear()
+                self._new_search(None)
+                self._clear_results()
                 return
 
         query = self._query_cook_common(query)
@@ -1435,16 +1958,65 @@ class FlatPage(ViewerCommon):
             print("unknown database access mode", access_mode)
             return
 
-        self._acc.request(query, self._handler, self._failhandler)
+        if typeahead and query == self._search_key:
+            return
+        self._new_search(query)
+
+        # Only the size of the result is needed up front. The rows are
+        # paged in by the model as the view scrolls over them.
+        count_query = ("SELECT COUNT(*) FROM (%s) AS found" % query[0],) + \
+                                                                    query[1:]
+        self._acc.request(count_query, partial(self._handler, query,
+                                    self._generation), self._failhandler)
         return
 
+    def _new_search(self, key):
+        """Abandon the search in progress in favour of another."""
+
+        # Replies to earlier searches are to be ignored.
+        self._generation += 1
+        self._search_key = key
+        self._kill_updates()
+        # Everything in this lane is now of no use. Queued jobs are dropped
+        # and a running query is stopped at the server.
+        self._acc.purge_job_queue()
+        self._acc.cancel()
+
+    def _local_update(self, user_text, typeahead):
+        catalogs = self.catalogs.ids()
+        key = (tuple(user_text.split()), catalogs)
+        if typeahead and key == self._search_key:
+            return
+        self._new_search(key)
+
+        old_model = self.tree_view.get_model()
+        model = None
+        if typeahead and isinstance(old_model, LocalResultModel) and \
+                                            old_model.catalogs == catalogs:
+            model = old_model.narrow(user_text)
+        self._clear_results()
+        if model is None:
+            n_rows = self._index.count(user_text, catalogs)
+            if n_rows:
+                model = LocalResultModel(self._index, user_text, catalogs,
+                                                                    n_rows)
+        if model is not None and len(model):
+            self.tree_cols[0].set_title("(%s)" % len(model))
+            self.tree_view.set_model(model)
+
     @staticmethod
     def _drag_data(model, paths):
         """Generate tuples of (catalog, pathname) for the given paths."""
 
+        missing = 0
         for path in paths:
-            row = model[path]
-            yield row[9], row[7]
+            row = model.get_row(path.get_indices()[0])
+            if row is None:
+                missing += 1
+            else:
+                yield row[9], row[7]
+        if missing:
+            print("%d rows not dragged: not yet fetched" % missing)
 
     def _cb_fuzzysearch_changed(self, widget):
         if widget.get_text().strip():
@@ -1452,63 +2024,123 @@ class FlatPage(ViewerCommon):
             self.where_entry.set_text("")
         else:
             self.where_entry.set_sensitive(True)
-        self.update_button.clicked()
+
+        # Searching is put off until the typing stops.
+        self._cancel_typeahead()
+        local = self._index is not None and self.local_search.get_active()
+        self._search_timeout = timeout_add(self.LOCAL_SEARCH_DELAY if local
+                        else self.SEARCH_DELAY, self._cb_typeahead_timeout)
+
+    def _cancel_typeahead(self):
+        if self._search_timeout is not None:
+            source_remove(self._search_timeout)
+            self._search_timeout = None
+
+    @threadslock
+    def _cb_typeahead_timeout(self):
+        self._search_timeout = None
+        if self._acc is not None:
+            self._cb_update(None, typeahead=True)
+        return False
+
+    def _cb_local_search(self, widget):
+        self._usesettings["local search"] = widget.get_active()
+        if self.fuzzy_entry.get_text().strip():
+            self.update_button.clicked()
+
+    def _index_refresh(self, *args):
+        """Bring the local search index up to date with the catalogs."""
+
+        for catalog, data in self.catalogs.copy_data().items():
+            if catalog in self._index_pending:
+                continue
+
+            stamp = max(data["last_update"], data["last_add"])
+            cleaned = data["last_clean"]
+            synced, old_cleaned = self._index.synced(catalog)
+            if synced is None or stamp > synced or cleaned != old_cleaned:
+                # Removed songs are found by comparing song ids which is only
+                # needed after a catalog has been cleaned.
+                clean = synced is not None and cleaned != old_cleaned
+                self._index_pending.add(catalog)
+                self._index_acc.request(
+                    (self._index_query, (catalog, synced or 0, synced or 0)),
+                    partial(self._index_handler, self._index, catalog, stamp,
+                                                            cleaned, clean),
+                    partial(self._index_failhandler, catalog))
 
     ###########################################################################
 
-    def _handler(self, acc, *args, **kwargs):
-        PageCommon._handler(self, acc, *args, **kwargs)
-        acc.purge_job_queue(1)
+    def _handler(self, query, generation, acc, request, cursor, notify, rows):
+        # Scrap intermediate searches whose output would merely slow down
+        # the user interface responsiveness.
+        acc.purge_job_queue(1, lambda job: job[2] == self._failhandler)
+        try:
+            n_rows = cursor.fetchone()[0]
+        except (sql.Error, TypeError) as e:
+            print(str(e))
+            n_rows = 0
+        self._schedule_update(acc, query, n_rows, generation)
 
     def _failhandler(self, exception, notify):
+        if exception.args[0] == ER_QUERY_INTERRUPTED:
+            return True  # Superseded by a newer search.
+
         notify(str(exception))
-        if exception[0] == 2006:
+        if exception.args[0] == 2006:
             raise
 
-        idle_add(self.tree_view.set_model, None)
-        idle_add(self.list_store.clear)
+        idle_add(threadslock(self._clear_results))
 
-    ###########################################################################
+    def _clear_results(self):
+        model = self.tree_view.get_model()
+        self.tree_view.set_model(None)
+        if model is not None:
+            model.clear()
 
-    @threadslock
-    def _update_1(self, acc, cursor, rows, namespace):
-        if not namespace[0]:
-            self.tree_view.set_model(None)
-            self.list_store.clear()
-            namespace[1] = (0, )  # found = 0
-            context = idle_add(self._update_2, acc, cursor, namespace)
-            self._update_id.append((context, namespace))
-        return False
+    ###########################################################################
 
-    @threadslock
-    def _update_2(self, acc, cursor, namespace):
-        kill, (found, ) = namespace
-        if kill:
-            return False
+    def _index_handler(self, index, catalog, stamp, cleaned, clean,
+                                    acc, request, cursor, notify, rows):
+        while 1:
+            batch = cursor.fetchmany(1000)
+            if not batch:
+                break
+            index.store(batch)
+
+        if clean:
+            request(("SELECT id FROM song WHERE catalog = %s", (catalog,)),
+                    partial(self._index_clean_handler, index, catalog, stamp,
+                    cleaned), partial(self._index_failhandler, catalog))
+        else:
+            self._index_synced(index, catalog, stamp, cleaned, notify)
 
-        next_row = cursor.fetchone
-        append = self.list_store.append
+    def _index_clean_handler(self, index, catalog, stamp, cleaned,
+                                    acc, request, cursor, notify, rows):
+        index.retain(catalog, (x for x, in cursor.fetchall()))
+        self._index_synced(index, catalog, stamp, cleaned, notify)
 
-        for i in range(100):
-            if acc.keepalive == False:
-                return False
+    def _index_synced(self, index, catalog, stamp, cleaned, notify):
+        index.mark_synced(catalog, stamp, cleaned)
+        idle_add(self._index_pending.discard, catalog)
+        notify(_('Search index updated'))
 
-            try:
-                row = next_row()
-            except sql.Error:
-                return False
+    def _index_failhandler(self, catalog, exception, notify):
+        print(exception)
+        notify(_('Search index update failed'))
+        idle_add(self._index_pending.discard, catalog)
+        return True
 
-            if row:
-                found += 1
-                append((found, ) + row)
-            else:
-                if found:
-                    self.tree_cols[0].set_title("(%s)" % found)
-                    self.tree_view.set_model(self.list_store)
-                return False
+    ###########################################################################
 
-        namespace[1] = (found, )
-        return True
+    @threadslock
+    def _update_1(self, acc, query, n_rows, generation, namespace):
+        if not namespace[0] and generation == self._generation:
+            self._clear_results()
+            if n_rows:
+                self.tree_cols[0].set_title("(%s)" % n_rows)
+                self.tree_view.set_model(PagedResultModel(acc, query, n_rows))
+        return False
 
 
 class CatalogsInterface(GObject.GObject):
@@ -1570,8 +2202,11 @@ class CatalogsInterface(GObject.GObject):
         path = os.path.normpath(self._dict[catalog]["prepend"] + path)
         return os.path.isfile(path), path
 
+    def ids(self):
+        return tuple(self._dict.keys())
+
     def sql(self):
-        ids = tuple(x for x in self._dict.keys())
+        ids = self.ids()
         if not ids:
             return "FALSE"
 
@@ -1878,13 +2513,11 @@ class MediaPane(Gtk.VBox):
         if accdata:
             # Connect and discover the database type.
             self.usesettings = usesettings
-            for i in range(1, 4):
-                setattr(self, "_acc%d" % i, DBAccessor(**accdata))
-            self._acc1.request(('SHOW tables',), self._stage_1, self._fail_1)
+            self._acc = DBAccessor(**accdata)
+            self._acc.request(('SHOW tables',), self._stage_1, self._fail_1)
         else:
             try:
-                for i in range(1, 4):
-                    getattr(self, "_acc%d" % i).close()
+                self._acc.close()
             except AttributeError:
                 pass
             else:
@@ -1903,9 +2536,12 @@ class MediaPane(Gtk.VBox):
         idle_add(threadslock(self.prefs_controls.disconnect))
 
     def _hand_over(self, db_name):
-        self._tree_page.activate(self._acc1, db_name, self.usesettings)
-        self._flat_page.activate(self._acc2, db_name, self.usesettings)
-        self._catalogs_page.activate(self._acc3, db_name, self.usesettings)
+        lane = self._acc.lane
+        self._tree_page.activate(lane(BULK), db_name, self.usesettings)
+        self._flat_page.activate(lane(INTERACTIVE), db_name, self.usesettings)
+        self._catalogs_page.activate(lane(NORMAL), db_name, self.usesettings)
+        if db_name in (AMPACHE, AMPACHE_3_7):
+            self._flat_page.activate_index(lane(BULK))
         idle_add(threadslock(self.show))
 
     def _fail_1(self, exception, notify):
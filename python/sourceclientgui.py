@@ -21,6 +21,7 @@ __all__ = ['SourceClientGui']
 
 import os
 import time
+import struct
 import urllib.request
 import urllib.parse
 import urllib.error
@@ -33,7 +34,6 @@ import xml.etree.ElementTree
 
 from collections import namedtuple
 from threading import Thread
-from contextlib import closing
 
 import dbus
 from gi.repository import Pango
@@ -41,17 +41,19 @@ from gi.repository import Gtk
 from gi.repository import Gdk
 from gi.repository import GdkPixbuf
 from gi.repository import GObject
+from gi.repository import GLib
 
 from idjc import FGlobs, PGlobs
 from .utils import string_multireplace
 from .gtkstuff import DefaultEntry, threadslock, HistoryEntry
 from .gtkstuff import WindowSizeTracker
-from .gtkstuff import timeout_add, source_remove
+from .gtkstuff import timeout_add, source_remove, io_add_watch
 from .dialogs import *
 from .irc import IRCPane
 from .format import FormatControl, FormatCodecMPEG
 from .tooltips import set_tip
 from .prelims import ProfileManager
+from .statscollector import get_stats_collector
 
 
 _ = gettext.translation(
@@ -408,105 +410,6 @@ class ConnectionDialog(Gtk.Dialog):
         if response_id == Gtk.ResponseType.NONE:
             chooser.unselect_all()
 
-class StatsThread(Thread):
-
-    def __init__(self, d):
-        Thread.__init__(self)
-        self.is_shoutcast = d["server_type"] % 2
-        self.host = d["host"]
-        self.port = d["port"]
-        self.mount = d["mount"]
-        if self.is_shoutcast:
-            self.login = "admin"
-        else:
-            self.login = d["login"]
-        self.passwd = d["password"]
-        self.listeners = -2         # preset error code for failed/timeout
-        self.url = "http://%s:%d%s" % (self.host, self.port, self.mount)
-
-    def run(self):
-        class BadXML(ValueError):
-            pass
-        class GoodXML(Exception):
-            pass
-
-        hostport = "%s:%d" % (self.host, self.port)
-        if self.is_shoutcast:
-            stats_url = "http://%s/admin.cgi?mode=viewxml" % hostport
-            realm = "Shoutcast Server"
-        else:
-            stats_url = "http://%s/admin/listclients?mount=%s" % (hostport,
-                                                                  self.mount)
-            realm = "Icecast2 Server"
-        auth_handler = urllib.request.HTTPBasicAuthHandler()
-        auth_handler.add_password(realm, hostport, self.login, self.passwd)
-        opener = urllib.request.build_opener(auth_handler)
-        opener.addheaders = [('User-agent', 'Mozilla/5.0')]
-
-        try:
-            # Logged in method works with Shoutcast 1 and Icecast 2.
-            try:
-                with closing(opener.open(stats_url)) as h:
-                    data = h.read()
-            except IOError:
-                if self.is_shoutcast:
-                    # Shoutcast 2 servers don't require a login.
-                    with closing(urllib2.urlopen("http://%s/statistics" %
-                                                            hostport)) as h:
-                        data = h.read()
-                else:
-                    raise
-        except IOError:
-            print("failed to obtain server stats data for", self.url)
-            return
-
-        try:
-            dom = mdom.parseString(data)
-        except Exception as e:
-            print("server stats data is not valid xml: %s" % e)
-            return
-
-        try:
-            if self.is_shoutcast:
-                if dom.documentElement.tagName == 'SHOUTCASTSERVER':
-                    shoutcastserver = dom.documentElement
-                else:
-                    raise BadXML
-                currentlisteners = shoutcastserver.getElementsByTagName(
-                    'CURRENTLISTENERS')
-                try:
-                    self.listeners = int(
-                        currentlisteners[0]
-                        .firstChild
-                        .wholeText
-                        .strip())
-                except:
-                    raise BadXML
-                else:
-                    raise GoodXML
-            else:
-                if dom.documentElement.tagName == 'icestats':
-                    icestats = dom.documentElement
-                else:
-                    raise BadXML
-                for child in icestats.childNodes:
-                    if child.nodeName == 'source':
-                        if child.getAttribute('mount') == self.mount:
-                            for child in child.childNodes:
-                                if child.nodeName.lower() == 'listeners':
-                                    self.listeners = int(
-                                            child.firstChild.wholeText.strip())
-                                    raise GoodXML
-                else:
-                    raise BadXML
-
-        except GoodXML:
-            print("server", self.url, "has", self.listeners, "listeners")
-        except BadXML:
-            print("unexpected to parse server stats XML file")
-        finally:
-            dom.unlink()
-
 class ActionTimer(object):
 
     def run(self):
@@ -729,29 +632,28 @@ class ConnectionPane(Gtk.VBox):
                     ap = self.tab.admin_password_entry.get_text().strip()
                     if ap:
                         d["password"] = ap
-                stats_thread = StatsThread(d)
-                stats_thread.start()
+                stats = get_stats_collector().request(d)
                 ref = Gtk.TreeRowReference.new(
                     self.liststore,
                     Gtk.TreePath.new_from_indices([i])
                 )
-                self.stats_rows.append((ref, stats_thread))
+                self.stats_rows.append((ref, stats))
             else:
                 row[5] = -1      # sets listeners text to 'unknown'
 
     def stats_collate(self):
         count = 0
-        for ref, thread in self.stats_rows:
+        for ref, stats in self.stats_rows:
             if ref.valid() is False:
                 print(
                     "stats_collate:",
-                    thread.url,
+                    stats.url,
                     "invalidated by its removal from the stats list")
                 continue
             row = ref.get_model()[ref.get_path()[0]]
-            row[5] = thread.listeners
-            if thread.listeners > 0:
-                count += thread.listeners
+            row[5] = stats.listeners
+            if stats.listeners > 0:
+                count += stats.listeners
         self.listeners_display.set_text(str(count))
         self.listeners = count
 
@@ -1256,6 +1158,27 @@ class Troubleshooting(Gtk.VBox):
         for each in (self.sbf_discard_audio, self.sbf_reconnect):
             sbfbox.pack_start(each, True, False, 0)
 
+        frame = Gtk.Frame(
+            label=" %s " % _("Should this stream fall behind the "
+                             "encoder..."))
+        lagbox = Gtk.VBox()
+        lagbox.set_border_width(6)
+        lagbox.set_spacing(1)
+        frame.add(lagbox)
+        self.pack_start(frame, False, False, 0)
+
+        self.lag_skip = Gtk.RadioButton(
+            group=None,
+            label=_("Skip ahead to the live audio."))
+        self.lag_drop = Gtk.RadioButton(
+            group=self.lag_skip,
+            label=_("Discard the oldest audio data."))
+        self.lag_disconnect = Gtk.RadioButton(
+            group=self.lag_skip,
+            label=_("Disconnect from the server."))
+        for each in (self.lag_skip, self.lag_drop, self.lag_disconnect):
+            lagbox.pack_start(each, True, False, 0)
+
         self.show_all()
 
         self.objects = {
@@ -1266,8 +1189,18 @@ class Troubleshooting(Gtk.VBox):
             "reconnection_repeat": (self.reconnection_repeat, "active"),
             "reconnection_quiet": (self.reconnection_quiet, "active"),
             "sbf_reconnect": (self.sbf_reconnect, "active"),
+            "lag_drop": (self.lag_drop, "active"),
+            "lag_disconnect": (self.lag_disconnect, "active"),
         }
 
+    @property
+    def lag_policy(self):
+        if self.lag_drop.get_active():
+            return "drop"
+        if self.lag_disconnect.get_active():
+            return "disconnect"
+        return "skip"
+
     def _on_custom_user_agent(self, widget):
         self.user_agent_entry.set_sensitive(widget.get_active())
 
@@ -1474,6 +1407,7 @@ class StreamTab(Tab):
                 "ca_file=" + d["ca_file"],
                 "client_cert=" + d["client_cert"],
                 "make_public=" + str(bool(self.make_public.get_active())),
+                "lag_policy=" + self.troubleshooting.lag_policy,
                 "command=server_connect\n"))
             self.send(self.connection_string)
             self.is_shoutcast = d["server_type"] == 1
@@ -2498,38 +2432,94 @@ class StreamTabFrame(TabFrame):
         hbox.show()
 
 
+class StateEventReader(object):
+    """Receiving end of the backend state change notifications.
+
+    The streamers and recorders push fixed size records down a FIFO when
+    their state changes. The layout is struct sc_event in c/sourceclient.h.
+    """
+
+    MAGIC = 0x56454353
+    VERSION = 1
+
+    def __init__(self, pathname):
+        self.pathname = pathname
+        self._struct = struct.Struct("=IHHiii")
+        self._fd = self._keepalive_fd = None
+
+    def open(self):
+        try:
+            os.unlink(self.pathname)
+        except OSError:
+            pass
+        try:
+            os.mkfifo(self.pathname, 0o600)
+            self._fd = os.open(self.pathname, os.O_RDONLY | os.O_NONBLOCK)
+            # Holding a write end ourselves means no POLLHUP when the backend
+            # restarts.
+            self._keepalive_fd = os.open(self.pathname, os.O_WRONLY)
+        except OSError as e:
+            print("state event channel unavailable:", e)
+            self.close()
+            return False
+        return True
+
+    def close(self):
+        for fd in (self._fd, self._keepalive_fd):
+            if fd is not None:
+                os.close(fd)
+        self._fd = self._keepalive_fd = None
+
+    def fileno(self):
+        return self._fd
+
+    def read(self):
+        """Drain the FIFO.
+
+        Return value is a list of (device, numeric_id, state, flags).
+        """
+
+        data = b""
+        while 1:
+            try:
+                chunk = os.read(self._fd, self._struct.size * 64)
+            except BlockingIOError:
+                break
+            if not chunk:
+                break
+            data += chunk
+
+        events = []
+        data = data[:len(data) - len(data) % self._struct.size]
+        for magic, version, *event in self._struct.iter_unpack(data):
+            if magic != self.MAGIC or version != self.VERSION:
+                raise ValueError("bad state event")
+            events.append(tuple(event))
+        return events
+
+
 class SourceClientGui(dbus.service.Object):
     unexpected_reply = "unexpected reply from idjcsourceclient"
 
+    # Seconds between reports when the state events leave nothing to do.
+    REPORT_FALLBACK = 5.0
+
     @dbus.service.method(dbus_interface=PGlobs.dbus_bus_basename)
     def new_plugin_started(self):
         print("streamstate_cache purge")
         self._streamstate_cache = {}
         self._recordstate_cache = {}
 
-    def monitor(self):
+    def monitor(self, force=False):
         self.led_alternate = not self.led_alternate
-        streaming = recording = False
-        # update the recorder LED indicators
-        for rectab in self.recordtabframe.tabs:
-            self.send("dev_type=recorder\ntab_id=%d\ncommand=get_report\n" %
-                      rectab.numeric_id)
-            while 1:
-                reply = self.receive()
-                if reply == "succeeded" or reply == "failed":
-                    break
-                if reply.startswith("recorder%dreport=" % rectab.numeric_id):
-                    recorder_state, recorded_seconds = reply.split("=")[
-                        1].split(":")
-                    rectab.show_indicator(("clear", "red", "amber", "clear")[
-                        int(recorder_state)])
-                    rectab.time_indicator.set_value(int(recorded_seconds))
-                    rec_state = recorder_state != "0"
-                    if rec_state:
-                        recording = True
-
-                    self._handle_recordstate(rectab.numeric_id, rec_state,
-                                             rectab.record_buttons.path)
+        # Backend reports are needed continuously only for the gauges of
+        # active streams and recordings. Otherwise state change events
+        # prompt them and polling is a slow fallback.
+        if force or self._reports_active or \
+                self.event_reader.fileno() is None or \
+                time.time() >= self._reports_due:
+            self._update_reports(wait=force)
+
         update_listeners = False
         l_count = 0
         for streamtab in self.streamtabframe.tabs:
@@ -2539,63 +2529,6 @@ class SourceClientGui(dbus.service.Object):
                 update_listeners = True
                 l_count += cp.listeners
 
-            self.send("dev_type=streamer\ntab_id=%d\ncommand=get_report\n" %
-                      streamtab.numeric_id)
-            reply = self.receive()
-            if reply != "failed":
-                self.receive()
-                if reply.startswith(
-                        "streamer%dreport=" % streamtab.numeric_id):
-                    (
-                        streamer_state,
-                        stream_sendbuffer_pc,
-                        brand_new
-                    ) = reply.split("=")[1].split(":")
-                    state = int(streamer_state)
-                    self._handle_streamstate(
-                        streamtab.numeric_id,
-                        int(state > 1), streamtab)
-                    streamtab.show_indicator(
-                        ("clear", "amber", "green", "clear")[state])
-                    streamtab.ircpane.connections_controller.set_stream_active(
-                        state > 1)
-                    mi = self.parent.stream_indicator[streamtab.numeric_id]
-                    if (streamer_state == "2"):
-                        mi.set_active(True)
-                        mi.set_value(int(stream_sendbuffer_pc))
-                        if int(stream_sendbuffer_pc) >= 100 and \
-                                self.led_alternate:
-                            tshoot = streamtab.troubleshooting
-                            if tshoot.sbf_discard_audio.get_active():
-                                streamtab.show_indicator("amber")
-                                mi.set_flash(True)
-                            else:
-                                streamtab.server_connect.set_active(False)
-                                streamtab.server_connect.set_active(True)
-                                print("remade the connection because stream "
-                                      "buffer was full")
-                            del tshoot
-                        else:
-                            mi.set_flash(False)
-                    else:
-                        mi.set_active(False)
-                        mi.set_flash(False)
-                    if brand_new == "1":
-                        # Streamer connected triggers.
-                        streamtab.start_recorder_action.activate()
-                        streamtab.start_player_action.activate()
-                        streamtab.reconnection_dialog.deactivate()
-                    if streamer_state != "0":
-                        streaming = True
-                    elif streamtab.server_connect.get_active():
-                        streamtab.server_connect.set_active(False)
-                        streamtab.reconnection_dialog.activate()
-                else:
-                    print("sourceclientgui.monitor: bad reply for"
-                          " streamer data:", reply)
-            else:
-                print("sourceclientgui.monitor:"
-                      " failed to get a report from the streamer")
             # the connection start/stop timers are processed here
             if streamtab.start_timer.get_active():
                 diff = time.localtime(
@@ -2626,13 +2559,147 @@ class SourceClientGui(dbus.service.Object):
                     streamtab.server_connect.set_active(False)
                     streamtab.stop_timer.check.set_active(False)
                     self.autoshutdown_dialog.present()
-            self.is_streaming = streaming
-            self.is_recording = recording
             streamtab.reconnection_dialog.run()
         if update_listeners:
             self.parent.listener_indicator.set_text(str(l_count))
         return True
 
+    def _update_reports(self, wait=False):
+        """Obtain the state of all recorders and streamers and apply it.
+
+        Unless waiting the reply is applied from the main loop when it
+        arrives. Only one such request is kept outstanding.
+        """
+
+        if not wait and self._reports_request is not None:
+            return
+        self._reports_due = time.time() + self.REPORT_FALLBACK
+        request = self.request("command=get_all_reports\n")
+        if wait:
+            self._reports_request = None
+            self._apply_reports(*self._parse_reports(self._reply_lines(request)))
+        else:
+            self._reports_request = request
+            request.add_done_callback(self._cb_reports)
+
+    def _cb_reports(self, request):
+        if request is self._reports_request:
+            self._reports_request = None
+            self._apply_reports(*self._parse_reports(self._reply_lines(request)))
+
+    def _apply_reports(self, recorder_reports, streamer_reports):
+        streaming = recording = False
+        # update the recorder LED indicators
+        for rectab in self.recordtabframe.tabs:
+            try:
+                recorder_state, recorded_seconds = recorder_reports[
+                    rectab.numeric_id]
+            except (KeyError, ValueError):
+                continue
+            rectab.show_indicator(("clear", "red", "amber", "clear")[
+                int(recorder_state)])
+            rectab.time_indicator.set_value(int(recorded_seconds))
+            rec_state = recorder_state != "0"
+            if rec_state:
+                recording = True
+
+            self._handle_recordstate(rectab.numeric_id, rec_state,
+                                     rectab.record_buttons.path)
+        for streamtab in self.streamtabframe.tabs:
+            try:
+                (
+                    streamer_state,
+                    stream_sendbuffer_pc,
+                    brand_new
+                ) = streamer_reports[streamtab.numeric_id]
+            except (KeyError, ValueError):
+                print("sourceclientgui.monitor:"
+                      " failed to get a report from the streamer")
+            else:
+                state = int(streamer_state)
+                self._handle_streamstate(
+                    streamtab.numeric_id,
+                    int(state > 1), streamtab)
+                streamtab.show_indicator(
+                    ("clear", "amber", "green", "clear")[state])
+                streamtab.ircpane.connections_controller.set_stream_active(
+                    state > 1)
+                mi = self.parent.stream_indicator[streamtab.numeric_id]
+                if (streamer_state == "2"):
+                    mi.set_active(True)
+                    mi.set_value(int(stream_sendbuffer_pc))
+                    if int(stream_sendbuffer_pc) >= 100 and \
+                            self.led_alternate:
+                        tshoot = streamtab.troubleshooting
+                        if tshoot.sbf_discard_audio.get_active():
+                            streamtab.show_indicator("amber")
+                            mi.set_flash(True)
+                        else:
+                            streamtab.server_connect.set_active(False)
+                            streamtab.server_connect.set_active(True)
+                            print("remade the connection because stream "
+                                  "buffer was full")
+                        del tshoot
+                    else:
+                        mi.set_flash(False)
+                else:
+                    mi.set_active(False)
+                    mi.set_flash(False)
+                if brand_new == "1":
+                    # Streamer connected triggers.
+                    streamtab.start_recorder_action.activate()
+                    streamtab.start_player_action.activate()
+                    streamtab.reconnection_dialog.deactivate()
+                if streamer_state != "0":
+                    streaming = True
+                elif streamtab.server_connect.get_active():
+                    streamtab.server_connect.set_active(False)
+                    streamtab.reconnection_dialog.activate()
+        self.is_streaming = streaming
+        self.is_recording = recording
+        self._reports_active = streaming or recording
+
+    @threadslock
+    def _cb_state_event(self, source, condition):
+        try:
+            events = self.event_reader.read()
+        except (ValueError, OSError) as e:
+            print(e)
+            self._events_stop()
+            return False
+        if events:
+            self._update_reports()
+        return True
+
+    def _events_stop(self):
+        """Revert to polling the backend for reports."""
+
+        print("state event channel lost -- polling for reports")
+        source_remove(self._event_watch)
+        self.event_reader.close()
+
+    @staticmethod
+    def _parse_reports(lines):
+        """Report fields of all recorders and streamers.
+
+        Returns two dictionaries keyed by numeric id.
+        """
+
+        recorders = {}
+        streamers = {}
+        for reply in lines:
+            dev, sep, fields = reply.partition("report=")
+            try:
+                if dev.startswith("recorder"):
+                    recorders[int(dev[8:])] = fields.split(":")
+                elif dev.startswith("streamer"):
+                    streamers[int(dev[8:])] = fields.split(":")
+                else:
+                    raise ValueError
+            except ValueError:
+                print("sourceclientgui.monitor: bad report:", reply)
+        return recorders, streamers
+
     def _handle_streamstate(self, numeric_id, connected, streamtab):
         cache = self._streamstate_cache
 
@@ -2683,7 +2750,7 @@ class SourceClientGui(dbus.service.Object):
         self.stop_streaming_all()
         self.stop_irc_all()
         source_remove(self.monitor_source_id)
-        self.monitor()
+        self.monitor(force=True)
 
     def app_exit(self):
         if self.parent.session_loaded:
@@ -2720,6 +2787,41 @@ class SourceClientGui(dbus.service.Object):
         self.parent.mixer_write(string_to_send + "end\n", "sc")
         self.comms_reply_pending = string_to_send
 
+    def request(self, string_to_send):
+        """Send without waiting for the reply.
+
+        The return value is a MixerRequest for (status, lines) where status
+        is "succeeded" or "failed" and lines are the data lines before it,
+        e.g. the reports of get_all_reports.
+        """
+
+        if not "tab_id=" in string_to_send:
+            string_to_send = "tab_id=-1\n" + string_to_send
+        return self.parent.mixer_request(
+            string_to_send + "end\n", self._sc_reply(), "sc",
+            ends=("idjcsc: succeeded\n", "idjcsc: failed\n"))
+
+    @staticmethod
+    def _reply_lines(request):
+        """The data lines of a request, none if its reply was lost."""
+
+        reply = request.result()
+        return reply[1] if reply is not None else []
+
+    def _sc_reply(self):
+        lines = []
+        while 1:
+            reply = yield
+            if reply == "":
+                return "failed", lines
+            if reply.startswith("idjcsc: "):
+                reply = reply[8:-1]
+                if reply == "succeeded" or reply == "failed":
+                    return reply, lines
+                lines.append(reply)
+            else:
+                print(self.unexpected_reply, reply)
+
     def restart_streams_and_recorders(self):
         whichstreams = []
         whichrecorders = []
@@ -2820,6 +2922,11 @@ class SourceClientGui(dbus.service.Object):
             FormatCodecMPEG.aac_enabled = 0
             FormatCodecMPEG.aacpv2_enabled = 0
 
+        if self.event_reader.fileno() is not None:
+            self.send("command=event_channel\n")
+            if self.receive() != "succeeded":
+                self._events_stop()
+
         self.uptime = time.time()
 
     def cb_delete_event(self, widget, event, data=None):
@@ -3149,6 +3256,10 @@ class SourceClientGui(dbus.service.Object):
         self.parent = parent
         parent.server_window = self
         self.source_client_crash_count = 0
+        self.event_reader = StateEventReader(os.environ["be2ui_events"])
+        if self.event_reader.open():
+            self._event_watch = io_add_watch(self.event_reader.fileno(),
+                                             GLib.IO_IN, self._cb_state_event)
         self.source_client_open()
 
         self.window = Gtk.Window(Gtk.WindowType.TOPLEVEL)
@@ -3242,6 +3353,9 @@ class SourceClientGui(dbus.service.Object):
         self.load_previous_session()
         self.is_streaming = False
         self.is_recording = False
+        self._reports_active = False
+        self._reports_due = 0.0
+        self._reports_request = None
         self.led_alternate = False
         self.last_message_time = 0
         self.connection_string = None
@@ -0,0 +1,357 @@
+"""Listener count collection from streaming servers.
+
+One background thread runs an asyncio event loop that serves the stats
+requests of every stream tab. Each server gets a pooled keep-alive
+connection and a single Icecast stats document serves all the mounts on
+it. Unresponsive servers are backed off.
+"""
+
+#   Copyright (C) 2026 Stephen Fairchild (s-fairchild@users.sourceforge.net)
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program in the file entitled COPYING.
+#   If not, see <http://www.gnu.org/licenses/>.
+
+
+__all__ = ["StatsResult", "get_stats_collector"]
+
+
+import time
+import base64
+import asyncio
+import threading
+import urllib.parse
+from xml.etree.ElementTree import XMLPullParser
+
+
+class StatsError(Exception):
+    pass
+
+
+class HTTPStatusError(StatsError):
+    def __init__(self, status):
+        StatsError.__init__(self, "HTTP status %d" % status)
+        self.status = status
+
+
+class _DocParser(object):
+    """Incremental XML parsing that checks the document element."""
+
+    def __init__(self, root_tag):
+        self._parser = XMLPullParser(("start", "end"))
+        self._root_tag = root_tag
+        self._seen_root = False
+
+    def feed(self, data):
+        self._parser.feed(data)
+        return self._events()
+
+    def close(self):
+        self._parser.close()
+        if not self._seen_root:
+            raise StatsError("empty server stats XML")
+        return self._events()
+
+    def _events(self):
+        for event, elem in self._parser.read_events():
+            if not self._seen_root:
+                if elem.tag != self._root_tag:
+                    raise StatsError("unexpected server stats XML")
+                self._seen_root = True
+            yield event, elem
+
+
+class StatsResult(object):
+    """The listener count of one server row, filled in when it arrives.
+
+    listeners: -2 while pending or after failure
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.listeners = -2
+
+
+class _Server(object):
+    """Stats fetching for one server login, shared by all its mounts."""
+
+    # Seconds that an obtained stats document remains good for reuse.
+    MAX_AGE = 5.0
+    # Seconds allowed for a complete fetch.
+    TIMEOUT = 5.0
+    # Backoff after consecutive failures starts here and doubles.
+    BACKOFF = 10.0
+    MAX_BACKOFF = 320.0
+    # Bytes read from the socket at a time.
+    CHUNK = 16384
+
+    def __init__(self, is_shoutcast, host, port, login, password):
+        self.is_shoutcast = is_shoutcast
+        self.host = host
+        self.port = port
+        auth = base64.b64encode(("%s:%s" % (login, password)).encode())
+        self._auth = auth.decode("ascii")
+        self._lock = asyncio.Lock()
+        self._conn = None
+        self._fetched = 0.0
+        self._mounts = {}       # Icecast mount -> listeners
+        self._mount_fetched = {}    # Icecast mount -> time, per mount mode
+        self._listeners = -2    # Shoutcast
+        self._failures = 0
+        self._retry_at = 0.0
+        # Some Icecast logins are not good for the global stats.
+        self._per_mount = False
+
+    async def listeners(self, mount):
+        async with self._lock:
+            now = time.time()
+            if now < self._retry_at:
+                return -2
+
+            if self.is_shoutcast:
+                if now > self._fetched + self.MAX_AGE:
+                    await self._fetch_guarded(self._fetch_shoutcast())
+                return self._listeners
+
+            if self._per_mount:
+                # One login may serve several mounts, each fetched alone.
+                fetched = self._mount_fetched.get(mount, 0.0)
+                if now > fetched + self.MAX_AGE or mount not in self._mounts:
+                    await self._fetch_guarded(self._fetch_mount(mount))
+            elif now > self._fetched + self.MAX_AGE:
+                await self._fetch_guarded(self._fetch_icecast(mount))
+            return self._mounts.get(mount, -2)
+
+    async def _fetch_guarded(self, coro):
+        try:
+            await asyncio.wait_for(coro, self.TIMEOUT)
+        except Exception as e:
+            # Besides StatsError, OSError, TimeoutError, ParseError and
+            # ValueError the stream reader raises LimitOverrunError and
+            # IncompleteReadError. Anything at all must reset the connection.
+            self._close()
+            self._failures += 1
+            backoff = min(self.MAX_BACKOFF,
+                          self.BACKOFF * 2 ** (self._failures - 1))
+            self._retry_at = time.time() + backoff
+            self._mounts.clear()
+            self._mount_fetched.clear()
+            self._listeners = -2
+            print("failed to obtain server stats data for %s:%d: %s "
+                  "(retry in %ds)" % (self.host, self.port,
+                                      str(e) or type(e).__name__, backoff))
+        else:
+            self._failures = 0
+            self._fetched = time.time()
+
+    async def _fetch_icecast(self, mount):
+        try:
+            self._mounts = await self._get_icecast("/admin/stats")
+        except HTTPStatusError as e:
+            if e.status not in (401, 403):
+                raise
+            self._per_mount = True
+            await self._fetch_mount(mount)
+
+    async def _fetch_mount(self, mount):
+        self._mounts.update(await self._get_icecast(
+                "/admin/listclients?mount=" + urllib.parse.quote(mount)))
+        self._mount_fetched[mount] = time.time()
+
+    async def _get_icecast(self, path):
+        mounts = {}
+        parser = _DocParser("icestats")
+
+        def consume(events):
+            for event, elem in events:
+                if event == "end" and elem.tag == "source":
+                    for child in elem:
+                        if child.tag.lower() == "listeners":
+                            mounts[elem.get("mount")] = int(child.text.strip())
+                            break
+                    elem.clear()
+
+        await self._get(path, parser, consume)
+        return mounts
+
+    async def _fetch_shoutcast(self):
+        try:
+            # Logged in method works with Shoutcast 1.
+            self._listeners = await self._get_shoutcast(
+                                                "/admin.cgi?mode=viewxml")
+        except HTTPStatusError:
+            # Shoutcast 2 servers don't require a login.
+            self._listeners = await self._get_shoutcast("/statistics")
+
+    async def _get_shoutcast(self, path):
+        found = []
+        parser = _DocParser("SHOUTCASTSERVER")
+
+        def consume(events):
+            for event, elem in events:
+                if event == "end" and elem.tag == "CURRENTLISTENERS" and \
+                                                                not found:
+                    found.append(int(elem.text.strip()))
+
+        await self._get(path, parser, consume)
+        if not found:
+            raise StatsError("no listener count in server stats XML")
+        return found[0]
+
+    async def _get(self, path, parser, consume):
+        """HTTP GET with the body fed incrementally to the parser."""
+
+        request = ("GET %s HTTP/1.1\r\nHost: %s:%d\r\n"
+                   "Authorization: Basic %s\r\nUser-Agent: Mozilla/5.0\r\n"
+                   "Connection: keep-alive\r\n\r\n" % (
+                   path, self.host, self.port, self._auth)).encode("latin-1")
+
+        for attempt in range(2):
+            reused = self._conn is not None
+            if not reused:
+                self._conn = await asyncio.open_connection(self.host,
+                                                            self.port)
+            reader, writer = self._conn
+            try:
+                writer.write(request)
+                await writer.drain()
+                status, keep_alive = await self._read_response(reader,
+                                                        parser, consume)
+            except (OSError, asyncio.IncompleteReadError) as e:
+                self._close()
+                if reused and attempt == 0:
+                    continue  # The server let an idle connection go.
+                raise StatsError(str(e) or "connection lost")
+            except:
+                self._close()
+                raise
+            if not keep_alive:
+                self._close()
+            if status != 200:
+                raise HTTPStatusError(status)
+            consume(parser.close())
+            return
+
+    async def _read_response(self, reader, parser, consume):
+        line = await reader.readuntil(b"\r\n")
+        try:
+            version, status = line.decode("latin-1").split(None, 2)[:2]
+            status = int(status)
+        except ValueError:
+            raise StatsError("malformed HTTP status line")
+
+        headers = {}
+        while 1:
+            line = await reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            key, sep, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip().lower()
+
+        keep_alive = version == "HTTP/1.1" and \
+                                        headers.get("connection") != "close"
+
+        def feed(data):
+            if status == 200:
+                consume(parser.feed(data))
+
+        if "chunked" in headers.get("transfer-encoding", ""):
+            while 1:
+                size = int((await reader.readuntil(b"\r\n")).split(b";")[0],
+                                                                            16)
+                if not size:
+                    # Skip trailers.
+                    while await reader.readuntil(b"\r\n") != b"\r\n":
+                        pass
+                    break
+                while size:
+                    data = await reader.read(min(size, self.CHUNK))
+                    if not data:
+                        raise asyncio.IncompleteReadError(b"", size)
+                    size -= len(data)
+                    feed(data)
+                await reader.readexactly(2)
+        elif "content-length" in headers:
+            remaining = int(headers["content-length"])
+            while remaining:
+                data = await reader.read(min(remaining, self.CHUNK))
+                if not data:
+                    raise asyncio.IncompleteReadError(b"", remaining)
+                remaining -= len(data)
+                feed(data)
+        else:
+            keep_alive = False
+            while 1:
+                data = await reader.read(self.CHUNK)
+                if not data:
+                    break
+                feed(data)
+
+        return status, keep_alive
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn[1].close()
+            self._conn = None
+
+
+class StatsCollector(object):
+    """Owner of the event loop thread and the servers it talks to."""
+
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        self._servers = {}
+        thread = threading.Thread(target=self._loop.run_forever)
+        thread.daemon = True
+        thread.start()
+
+    def request(self, d):
+        """Obtain listener stats for a server row in dictionary form.
+
+        The returned StatsResult is updated from another thread.
+        """
+
+        is_shoutcast = d["server_type"] % 2
+        login = "admin" if is_shoutcast else d["login"]
+        result = StatsResult("http://%s:%d%s" % (d["host"], d["port"],
+                                                 d["mount"]))
+        key = (is_shoutcast, d["host"], d["port"], login, d["password"])
+        asyncio.run_coroutine_threadsafe(self._resolve(key, d["mount"],
+                                                        result), self._loop)
+        return result
+
+    async def _resolve(self, key, mount, result):
+        try:
+            server = self._servers[key]
+        except KeyError:
+            server = self._servers[key] = _Server(*key)
+
+        listeners = await server.listeners(mount)
+        if listeners >= 0:
+            print("server", result.url, "has", listeners, "listeners")
+        result.listeners = listeners
+
+
+_collector = None
+_collector_lock = threading.Lock()
+
+
+def get_stats_collector():
+    """The stats collector shared by all stream tabs, made on first use."""
+
+    global _collector
+
+    with _collector_lock:
+        if _collector is None:
+            _collector = StatsCollector()
+        return _collector
@@ -0,0 +1,311 @@
+"""Persistent cache of media file tag data.
+
+Reading tags is by far the slowest part of loading a playlist so the
+results are kept in an SQLite database in the profile directory. Entries
+are validated against the modification time and size of the file.
+"""
+
+#   Copyright (C) 2026 Stephen Fairchild (s-fairchild@users.sourceforge.net)
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program in the file entitled COPYING.
+#   If not, see <http://www.gnu.org/licenses/>.
+
+
+__all__ = ["CachedTags", "TagCache", "get_tagcache"]
+
+
+import os
+import time
+import sqlite3
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from .prelims import ProfileManager
+
+
+FILENAME = "tagcache.db"
+
+# Bump whenever the table layout or the meaning of a column changes.
+# Older databases are discarded rather than migrated.
+SCHEMA_VERSION = 1
+
+CachedTags = namedtuple("CachedTags", "artist title album length replaygain")
+
+
+class TagCache(object):
+    """Tag data keyed by pathname and validated by mtime and size.
+
+    All methods are thread safe. Writes are committed in batches so call
+    flush at convenient moments.
+    """
+
+    # Least recently used entries beyond this number are evicted.
+    MAX_ENTRIES = 100000
+    # Hits only refresh the last used time when it is older than this.
+    TOUCH_INTERVAL = 86400
+    # Uncommitted writes are flushed when either limit is reached.
+    COMMIT_WRITES = 200
+    COMMIT_SECONDS = 5.0
+
+    def __init__(self, pathname, max_entries=None):
+        self._pathname = pathname
+        self._max_entries = max_entries or self.MAX_ENTRIES
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._last_commit = time.time()
+        self._db = None
+
+        try:
+            self._db = self._open()
+        except sqlite3.DatabaseError as e:
+            print("TagCache: discarding unreadable database:", e)
+            try:
+                os.unlink(pathname)
+                self._db = self._open()
+            except (EnvironmentError, sqlite3.DatabaseError) as e:
+                print("TagCache: disabled:", e)
+                self._db = None
+
+    def _open(self):
+        db = sqlite3.connect(self._pathname, check_same_thread=False)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            version = db.execute("PRAGMA user_version").fetchone()[0]
+            if version != SCHEMA_VERSION:
+                db.execute("DROP TABLE IF EXISTS tags")
+            db.execute("""CREATE TABLE IF NOT EXISTS tags (
+                            pathname TEXT PRIMARY KEY,
+                            mtime INTEGER NOT NULL,
+                            size INTEGER NOT NULL,
+                            artist TEXT NOT NULL,
+                            title TEXT NOT NULL,
+                            album TEXT NOT NULL,
+                            length REAL NOT NULL,
+                            replaygain TEXT NOT NULL,
+                            used INTEGER NOT NULL)""")
+            db.execute("CREATE INDEX IF NOT EXISTS tags_used ON tags (used)")
+            db.execute("PRAGMA user_version=%d" % SCHEMA_VERSION)
+            db.commit()
+            self._evict(db)
+            db.commit()
+        except:
+            db.close()
+            raise
+        return db
+
+    @property
+    def pathname(self):
+        return self._pathname
+
+    @staticmethod
+    def stat_key(pathname):
+        """The validation key of a file or None if it can't be had."""
+
+        try:
+            st = os.stat(pathname)
+        except EnvironmentError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def lookup(self, pathname, key=None):
+        """CachedTags for pathname or None when absent or out of date."""
+
+        if self._db is None:
+            return None
+        if key is None:
+            key = self.stat_key(pathname)
+            if key is None:
+                return None
+
+        with self._lock:
+            try:
+                row = self._db.execute("SELECT mtime, size, artist, title, "
+                                       "album, length, replaygain, used FROM "
+                                       "tags WHERE pathname=?",
+                                       (pathname,)).fetchone()
+                if row is None or tuple(row[:2]) != key:
+                    return None
+                now = int(time.time())
+                if row[7] < now - self.TOUCH_INTERVAL:
+                    self._db.execute("UPDATE tags SET used=? WHERE "
+                                     "pathname=?", (now, pathname))
+                    self._wrote()
+            except sqlite3.Error as e:
+                print("TagCache: lookup failed:", e)
+                return None
+        return CachedTags(*row[2:7])
+
+    def store(self, pathname, key, artist, title, album, length, replaygain):
+        """Record tag data obtained while the file matched key."""
+
+        if self._db is None or key is None:
+            return
+
+        with self._lock:
+            try:
+                self._db.execute("INSERT OR REPLACE INTO tags VALUES "
+                                 "(?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                 (pathname, key[0], key[1], artist, title,
+                                  album, float(length), replaygain,
+                                  int(time.time())))
+                self._wrote()
+            except sqlite3.Error as e:
+                print("TagCache: store failed:", e)
+
+    def _wrote(self):
+        self._writes += 1
+        if self._writes >= self.COMMIT_WRITES or \
+                time.time() > self._last_commit + self.COMMIT_SECONDS:
+            self._commit()
+
+    def _commit(self):
+        if self._writes:
+            self._db.commit()
+            self._writes = 0
+        self._last_commit = time.time()
+
+    def flush(self):
+        """Commit pending writes to disk."""
+
+        if self._db is not None:
+            with self._lock:
+                try:
+                    self._commit()
+                except sqlite3.Error as e:
+                    print("TagCache: commit failed:", e)
+
+    def _evict(self, db, max_entries=None):
+        """Drop the least recently used entries above the limit."""
+
+        excess = db.execute("SELECT COUNT(*) FROM tags").fetchone()[0] - (
+            max_entries or self._max_entries)
+        if excess > 0:
+            db.execute("DELETE FROM tags WHERE pathname IN (SELECT pathname "
+                       "FROM tags ORDER BY used LIMIT ?)", (excess,))
+            return excess
+        return 0
+
+    def prune(self, max_entries=None, max_age=None, check_files=True):
+        """Remove stale entries and return how many went.
+
+        max_entries: keep no more than this many
+        max_age: remove entries not used in this many days
+        check_files: remove entries whose file changed or disappeared
+        """
+
+        if self._db is None:
+            return 0
+
+        removed = 0
+        with self._lock:
+            if check_files:
+                stale = []
+                for pathname, mtime, size in self._db.execute(
+                        "SELECT pathname, mtime, size FROM tags").fetchall():
+                    if self.stat_key(pathname) != (mtime, size):
+                        stale.append((pathname,))
+                self._db.executemany("DELETE FROM tags WHERE pathname=?",
+                                     stale)
+                removed += len(stale)
+            if max_age is not None:
+                removed += self._db.execute(
+                    "DELETE FROM tags WHERE used<?",
+                    (int(time.time() - max_age * 86400),)).rowcount
+            removed += self._evict(self._db, max_entries)
+            self._commit()
+            self._db.execute("VACUUM")
+        return removed
+
+    def __len__(self):
+        if self._db is None:
+            return 0
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM tags").fetchone()[0]
+
+    def close(self):
+        if self._db is not None:
+            self.flush()
+            with self._lock:
+                self._db.close()
+                self._db = None
+
+
+_tagcache = None
+_tagcache_lock = threading.Lock()
+
+
+def get_tagcache():
+    """The tag cache of the running profile, opened on first use."""
+
+    global _tagcache
+
+    with _tagcache_lock:
+        if _tagcache is None:
+            _tagcache = TagCache(ProfileManager().basedir / FILENAME)
+        return _tagcache
+
+
+def _walk(pathnames):
+    for pathname in pathnames:
+        if os.path.isdir(pathname):
+            for root, dirs, files in os.walk(pathname):
+                dirs.sort()
+                for each in sorted(files):
+                    yield os.path.join(root, each)
+        else:
+            yield pathname
+
+
+def main(args):
+    """Command line access to the tag cache of a profile."""
+
+    cache = get_tagcache()
+
+    if args.tagcache == "info":
+        try:
+            size = os.path.getsize(cache.pathname)
+        except EnvironmentError:
+            size = 0
+        print("%s: %d entries, %d bytes" % (cache.pathname, len(cache), size))
+
+    elif args.tagcache == "prune":
+        removed = cache.prune(
+            max_entries=args.max_entries and args.max_entries[0],
+            max_age=args.max_age and args.max_age[0])
+        print("removed %d entries" % removed)
+
+    elif args.tagcache == "warm":
+        # Importing the player brings in the tag reading code which
+        # caches as a side effect.
+        from .playergui import supported, probe_media
+
+        pathnames = (os.path.realpath(x) for x in _walk(args.pathnames)
+                     if supported.check_media(x) is not False)
+        done = backend = 0
+        with ThreadPoolExecutor(max_workers=(os.cpu_count() or 1) + 2) as ex:
+            for probe in ex.map(probe_media, pathnames):
+                if probe:
+                    done += 1
+                    if probe.backend is not None:
+                        backend += 1
+        cache.flush()
+        print("scanned %d files" % done)
+        if backend:
+            print("%d files need the audio backend and were not cached" %
+                  backend)
+
+    cache.close()
+    return 0
@@ -319,6 +319,29 @@ class LinkUUIDRegistry(dict, metaclass=Singleton):
         self.link_dir = where
 
 
+    def get_link_filenames(self):
+        """Link filenames keyed by UUID from one links directory listing.
+
+        Same result as get_link_filename for every UUID at once.
+        """
+
+        found = {}
+        if self.link_dir is not None:
+            try:
+                filenames = os.listdir(self.link_dir)
+            except EnvironmentError as e:
+                print("LinkUUIDRegistry: link directory listing failed:", e)
+                return found
+
+            for filename in filenames:
+                if filename.startswith("{") and filename[37:39] == "}.":
+                    uuid_ = filename[1:37]
+                    # As with a glob, more than one match is no match.
+                    found[uuid_] = None if uuid_ in found else filename
+
+        return {k: v for k, v in found.items() if v is not None}
+
+
     def get_link_filename(self, uuid_):
         """Check in the links directory for a specific UUID filename."""
 